@@ -5,7 +5,6 @@ import json
 import time  # 添加 time 模块导入
 import uuid  # 添加 uuid 模块导入
 import shutil  # 添加 shutil 模块导入
-import subprocess  # 添加 subprocess 模块导入
 import logging  # 添加 logging 模块导入
 
 # 设置日志
@@ -16,8 +15,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mineru-api")
 
-# 设置处理超时时间
-PROCESS_TIMEOUT = 300  # 5分钟
 
 def patch_magic_pdf():
     """直接修补 magic_pdf 模块"""
@@ -184,22 +181,40 @@ def ensure_config_file():
 # 应用补丁
 patch_magic_pdf()
 
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 import tempfile
 import os
-import subprocess
 import shutil
 import uuid
 import logging
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple, Union
 import json
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, Future
 import asyncio
 from starlette.middleware.base import BaseHTTPMiddleware
 import traceback
+import hashlib
+import mimetypes
+import functools
+import socket
+import ipaddress
+
+from worker_pool import WorkerPool, JobFailed, JobAborted, WorkerCrashed, job_timeout
+from job_queue import QueueFull, PRIORITY_INTERACTIVE, PRIORITY_BULK
+from result_cache import ResultCache
+from task_store import TaskResult, create_task_store
+from streaming import stream_file, stream_json_file, envelope_response, empty_json
+from sharding import SHARD_PAGE_THRESHOLD, plan_shards, merge_results
+from archives import ArchiveTooLarge, is_archive, extract_pdfs, unique_path
+from pipeline import PAGES_FILE, OCR_AUTO, OUTPUTS
+from upload_buffer import Upload, receive_upload, raise_multipart_spool_limit
+from device_monitor import DeviceMonitor
+from preflight import PreflightRejected, preflight
+from image_store import IMAGES_ORIGINAL, IMAGES_REFS, IMAGE_MODES, prune_store
+import metrics
 
 # 配置日志
 logging.basicConfig(
@@ -213,11 +228,16 @@ logging.basicConfig(
 logger = logging.getLogger("mineru-api")
 
 # 创建数据目录
-os.makedirs("/data/results", exist_ok=True)
+RESULTS_DIR = os.environ.get("MINERU_RESULTS_DIR", "/data/results")
+RESULT_RETENTION_HOURS = float(os.environ.get("MINERU_RESULT_RETENTION_HOURS", "1"))
+os.makedirs(RESULTS_DIR, exist_ok=True)
 os.makedirs("/data/uploads", exist_ok=True)
 
 app = FastAPI(title="MinerU API", description="API for processing PDF documents with MinerU")
 
+# 不超过共享内存阈值的上传在 multipart 解析阶段也留在内存，不先落盘再读回
+raise_multipart_spool_limit()
+
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -230,23 +250,115 @@ app.add_middleware(
 # 创建线程池处理PDF任务
 pdf_executor = ThreadPoolExecutor(max_workers=4)  # 增加工作线程数
 
+# 常驻工作进程池，模型只在进程启动时加载一次
+worker_pool = WorkerPool()
+
+# 本进程的实例标识，记录在任务上；多个 uvicorn 进程共享任务存储时只回收自己的任务
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# 工作进程已返回结果、正在合并与落盘的任务（此时已不在进程池中，但不能当作丢失回收）
+finalizing_tasks = set()
+
+# 解析结果缓存，相同 PDF + 参数 + 模型配置直接返回
+result_cache = ResultCache()
+
+# GPU 状态由后台线程定期采样，健康检查直接读缓存
+device_monitor = DeviceMonitor()
+
 # 添加超时设置
 REQUEST_TIMEOUT = 60   # 1分钟请求超时
 
-# 存储任务状态和结果
-class TaskResult:
-    def __init__(self):
-        self.status = "pending"
-        self.markdown = None
-        self.content_list = None
-        self.middle_json = None
-        self.error = None
-        self.created_at = datetime.now()
-        self.processing_time = None  # 添加处理时间记录
-        self.filename = None
-        self.file_path = None
-
-task_results: Dict[str, TaskResult] = {}
+# 逐页流式接口轮询任务进度的间隔（秒）
+STREAM_POLL_INTERVAL = 0.5
+
+# 逐页流式接口在没有新事件时发送心跳的间隔（秒），避免被代理按读超时断开
+STREAM_KEEPALIVE_INTERVAL = 15
+
+# GET /tasks 默认每页条数与上限
+TASK_PAGE_SIZE = 50
+TASK_PAGE_MAX_SIZE = 500
+
+# 批量模式：一个工作进程任务中连续解析的文档数
+BATCH_CHUNK_SIZE = int(os.environ.get("MINERU_BATCH_CHUNK_SIZE", "8"))
+
+# 同步接口超过该页数的文档降为批量优先级，避免长文档占住交互通道
+INTERACTIVE_MAX_PAGES = int(os.environ.get("MINERU_INTERACTIVE_MAX_PAGES", "100"))
+
+# 同步接口的超时上限（秒），不应超过 nginx 对该接口的 proxy_read_timeout
+SYNC_TIMEOUT_MAX = float(os.environ.get("MINERU_SYNC_TIMEOUT_MAX", "3600"))
+
+# 可信反向代理：逗号分隔的 IP、网段或主机名（如 compose 中的 nginx 服务名），
+# 只有来自这些地址的请求才按 X-Real-IP / X-Forwarded-For 分组，直连 8000 端口的请求按对端地址分组
+TRUSTED_PROXIES = os.environ.get("MINERU_TRUSTED_PROXIES", "127.0.0.1,::1")
+
+# 可信代理主机名的重新解析间隔（秒）
+TRUSTED_PROXY_RESOLVE_INTERVAL = 60
+
+# 同步等待结果时检查客户端是否已断开的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 1.0
+
+# 回收卡住的任务前，在硬超时之外再等待的收尾时间（秒）
+RECOVERY_GRACE_SECONDS = 300
+
+async def run_in_pool(job: dict, timeout: float, job_id: str, request: Optional[Request] = None,
+                      **kwargs) -> dict:
+    """
+    提交到工作进程池并在事件循环中等待；超时、请求被取消或客户端断开（传入 request 时，
+    抛出 JobAborted）时中止任务，排队中的直接取消，执行中的杀掉工作进程组，不再占用工作进程
+    """
+    future = asyncio.wrap_future(worker_pool.submit(job, timeout=timeout, job_id=job_id, **kwargs))
+    deadline = time.time() + timeout
+    try:
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            done, _ = await asyncio.wait({future}, timeout=min(remaining, DISCONNECT_POLL_INTERVAL))
+            if done:
+                return future.result()
+            if request is not None and await request.is_disconnected():
+                raise JobAborted("Client disconnected")
+    except (asyncio.TimeoutError, asyncio.CancelledError, JobAborted):
+        worker_pool.abort(job_id)
+        raise
+
+async def run_preflight(file_path: str, upload: Optional[Upload] = None) -> dict:
+    """
+    入队前只读 PDF 结构做预检（页数、加密、页面尺寸、图片体积、文字层），
+    损坏、加密或超过限制的输入直接以 4xx 拒绝，不占用工作进程
+    """
+    try:
+        if upload is not None and upload.in_memory:
+            # 直接在共享内存上打开 PDF，不再复制一份
+            with upload.view() as pdf_bytes:
+                return await asyncio.to_thread(preflight, pdf_bytes=pdf_bytes)
+        return await asyncio.to_thread(preflight, file_path)
+    except PreflightRejected as e:
+        logger.warning(f"Preflight rejected {file_path}: {e.reason}")
+        metrics.PREFLIGHT_REJECTIONS.labels(status=str(e.status_code)).inc()
+        raise HTTPException(status_code=e.status_code, detail={"error": e.reason, "preflight": e.report})
+
+def cleanup_task_files(task_id: str, output_dir: Optional[str]):
+    """任务失败（含超时、被中止）后删除上传文件与不完整的结果目录"""
+    shutil.rmtree(f"/data/uploads/{task_id}", ignore_errors=True)
+    shutil.rmtree(output_dir or os.path.join(RESULTS_DIR, task_id), ignore_errors=True)
+
+# 存储任务状态和结果位置（默认 SQLite，可被多个 uvicorn worker 共享）
+task_store = create_task_store()
+
+def result_headers(task: TaskResult) -> Dict[str, str]:
+    """随结果文件返回的任务元数据"""
+    headers = {"X-Task-Status": task.status}
+    if task.processing_time is not None:
+        headers["X-Processing-Time"] = f"{task.processing_time:.3f}"
+    return headers
+
+def read_text(path: Optional[str]) -> Optional[str]:
+    """读取结果文件，不存在时返回 None"""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
 
 class ErrorHandlingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request, call_next):
@@ -267,51 +379,132 @@ app.add_middleware(ErrorHandlingMiddleware)
 
 @app.post("/upload_and_process_pdf/")
 async def upload_and_process_pdf(
+    request: Request,
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    ocr: bool = True
+    ocr: str = OCR_AUTO,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_ORIGINAL,
+    image_max_side: Optional[int] = None,
+    outputs: str = ",".join(OUTPUTS),
+    split: bool = False,
+    stream: bool = False
 ):
+    ocr = parse_ocr(ocr)
+    images = parse_images(images)
+    outputs = parse_outputs(outputs)
+    upload = None
     try:
         # 上传文件
         task_id = str(uuid.uuid4())
         task_dir = f"/data/uploads/{task_id}"
-        output_dir = f"/data/results/{task_id}"
-        os.makedirs(task_dir, exist_ok=True)
+        output_dir = os.path.join(RESULTS_DIR, task_id)
         os.makedirs(output_dir, exist_ok=True)
         os.makedirs(f"{output_dir}/images", exist_ok=True)
         
-        # 保存文件
+        # 保存文件：小文件留在共享内存直接交给工作进程，边接收边计算 SHA-256
+        upload_start = time.time()
         file_path = os.path.join(task_dir, file.filename)
-        with open(file_path, "wb") as buffer:
-            chunk_size = 4 * 1024 * 1024
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                buffer.write(chunk)
+        upload = await receive_upload(file, file_path)
+        metrics.UPLOAD_SECONDS.observe(time.time() - upload_start)
+        
+        # 预检不通过时直接拒绝，不创建任务
+        try:
+            report = await run_preflight(file_path, upload)
+        except HTTPException:
+            upload.close()
+            shutil.rmtree(task_dir, ignore_errors=True)
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise
+        page_count = report["page_count"]
+        cache_key = result_cache.make_key(upload.sha256, ocr, formula, table, images, image_max_side)
+        
+        # 命中缓存则直接完成，不再排队解析
+        base_name = os.path.splitext(file.filename)[0]
+        cached = await asyncio.to_thread(result_cache.materialize, cache_key, output_dir, base_name)
+        if cached is not None:
+            upload.close()
+            shutil.rmtree(task_dir, ignore_errors=True)
+            task_store.create(
+                task_id,
+                status="completed",
+                filename=file.filename,
+                output_dir=output_dir,
+                ocr=ocr,
+                cache_key=cache_key,
+                processing_time=0,
+                finished_at=datetime.now(),
+                **cached
+            )
+            metrics.record_task("cached", ocr)
+            return {
+                "task_id": task_id,
+                "status": "completed",
+                "cached": True,
+                "preflight": report,
+                "message": "PDF result served from cache"
+            }
+        
+        # 预检页数决定任务超时；分片模式下页数超过阈值时按页码范围拆给多个工作进程（逐页流式模式不分片）
+        shards = None
+        if split and not stream and page_count and page_count > SHARD_PAGE_THRESHOLD:
+            shards = plan_shards(page_count)
         
         # 记录任务
-        task_results[task_id] = TaskResult()
-        task_results[task_id].status = "processing"
-        task_results[task_id].filename = file.filename
-        task_results[task_id].file_path = file_path
+        task_store.create(
+            task_id,
+            status="queued",
+            filename=file.filename,
+            file_path=file_path,
+            output_dir=output_dir,
+            ocr=ocr,
+            cache_key=cache_key,
+            page_count=page_count,
+            owner=INSTANCE_ID
+        )
+        
+        # 入队，队列已满时直接拒绝
+        try:
+            futures = submit_document(task_id, file_path, output_dir, ocr, shards,
+                                      priority=PRIORITY_BULK, group=client_group(request), stream=stream,
+                                      formula=formula, table=table, images=images,
+                                      image_max_side=image_max_side, outputs=outputs, page_count=page_count,
+                                      extra=upload.job_fields())
+        except QueueFull as e:
+            upload.close()
+            task_store.delete(task_id)
+            shutil.rmtree(task_dir, ignore_errors=True)
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise queue_full_error(e)
         
-        # 在后台处理PDF
+        # 在后台等待处理结果
         background_tasks.add_task(
             process_pdf_background, 
             task_id, 
             file_path, 
             output_dir, 
-            ocr,
-            file.filename
+            futures,
+            cache_key,
+            shards,
+            upload
         )
         
         return {
             "task_id": task_id,
-            "status": "processing",
-            "message": "PDF uploaded and processing started"
+            "status": "queued",
+            "queue_position": worker_pool.queue_position(task_id),
+            "shards": len(shards) if shards else 1,
+            "preflight": report,
+            "stream_url": f"/tasks/{task_id}/stream",
+            "message": "PDF uploaded and queued for processing"
         }
+    except HTTPException:
+        raise
     except Exception as e:
+        # 入队之前出错时释放共享内存；入队之后由 process_pdf_background 释放
+        if upload is not None and not background_tasks.tasks:
+            upload.close()
         logger.error(f"Error uploading and processing PDF: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
@@ -321,13 +514,23 @@ async def upload_and_process_pdf(
 @app.post("/process_task/{task_id}")
 async def process_task(
     task_id: str,
+    request: Request,
     background_tasks: BackgroundTasks,
-    ocr: bool = True
+    ocr: str = OCR_AUTO,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_ORIGINAL,
+    image_max_side: Optional[int] = None,
+    outputs: str = ",".join(OUTPUTS),
+    stream: bool = False
 ):
-    if task_id not in task_results:
+    ocr = parse_ocr(ocr)
+    images = parse_images(images)
+    outputs = parse_outputs(outputs)
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = task_results[task_id]
     if task.status != "uploaded":
         return {
             "task_id": task_id,
@@ -336,279 +539,713 @@ async def process_task(
         }
     
     # 创建输出目录
-    output_dir = f"/data/results/{task_id}"
+    output_dir = os.path.join(RESULTS_DIR, task_id)
     os.makedirs(output_dir, exist_ok=True)
     os.makedirs(f"{output_dir}/images", exist_ok=True)
     
+    try:
+        report = await run_preflight(task.file_path)
+    except HTTPException as e:
+        fail_task(task_id, e.detail["error"])
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+    page_count = report["page_count"]
+    task_store.update(task_id, page_count=page_count)
+    try:
+        futures = submit_document(task_id, task.file_path, output_dir, ocr, None,
+                                  priority=PRIORITY_BULK, group=client_group(request), stream=stream,
+                                  formula=formula, table=table, images=images,
+                                  image_max_side=image_max_side, outputs=outputs, page_count=page_count)
+    except QueueFull as e:
+        raise queue_full_error(e)
+    
     # 更新任务状态
-    task.status = "processing"
+    task_store.update(task_id, status="queued", output_dir=output_dir, ocr=ocr, owner=INSTANCE_ID)
     
-    # 在后台处理PDF
+    # 在后台等待处理结果
     background_tasks.add_task(
         process_pdf_background, 
         task_id, 
         task.file_path, 
         output_dir, 
-        ocr,
-        task.filename
+        futures
     )
     
     return {
         "task_id": task_id,
-        "status": "processing",
-        "message": "PDF processing started"
+        "status": "queued",
+        "queue_position": worker_pool.queue_position(task_id),
+        "preflight": report,
+        "stream_url": f"/tasks/{task_id}/stream",
+        "message": "PDF queued for processing"
     }
 
-async def process_pdf_background(task_id: str, file_path: str, output_dir: str, ocr: bool, filename: str):
+def parse_ocr(value: str) -> Union[bool, str]:
+    """
+    ocr 参数：auto（默认，逐页判断是否需要 OCR）、true（全部 OCR）、
+    false（文字模式，整篇判定为扫描件时仍走 OCR）
+    """
+    value = value.strip().lower()
+    if value == OCR_AUTO:
+        return OCR_AUTO
+    if value in ("true", "1", "yes"):
+        return True
+    if value in ("false", "0", "no"):
+        return False
+    raise HTTPException(status_code=400, detail="ocr must be 'auto', 'true' or 'false'")
+
+def parse_outputs(value: str) -> List[str]:
+    """outputs 参数：markdown、content_list、middle_json 的任意组合（逗号分隔），未请求的文件不生成"""
+    outputs = [output.strip().lower() for output in value.split(",") if output.strip()]
+    if not outputs or set(outputs) - set(OUTPUTS):
+        raise HTTPException(status_code=400, detail=f"outputs must be a comma-separated subset of: {', '.join(OUTPUTS)}")
+    return [output for output in OUTPUTS if output in outputs]
+
+def parse_images(value: str) -> str:
+    """
+    images 参数：original（默认，原图）、webp / jpeg（按 image_max_side 缩放后重新编码）、
+    refs（只保留引用不写文件）、none（不输出图片）
+    """
+    value = value.strip().lower()
+    if value not in IMAGE_MODES:
+        raise HTTPException(status_code=400, detail=f"images must be one of: {', '.join(IMAGE_MODES)}")
+    return value
+
+def _parse_trusted_proxies(value: str) -> Tuple[List, List[str]]:
+    """拆分为 IP / 网段与需要解析的主机名"""
+    networks, hostnames = [], []
+    for item in value.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            networks.append(ipaddress.ip_network(item, strict=False))
+        except ValueError:
+            hostnames.append(item)
+    return networks, hostnames
+
+TRUSTED_PROXY_NETWORKS, TRUSTED_PROXY_HOSTNAMES = _parse_trusted_proxies(TRUSTED_PROXIES)
+_proxy_addresses: Tuple[float, frozenset] = (0.0, frozenset())
+
+def _trusted_proxy_addresses() -> frozenset:
+    """解析可信代理的主机名；容器重建后地址会变，定期重新解析（启动时代理可能尚未运行）"""
+    global _proxy_addresses
+    resolved_at, addresses = _proxy_addresses
+    if time.time() - resolved_at < TRUSTED_PROXY_RESOLVE_INTERVAL:
+        return addresses
+    found = set()
+    for hostname in TRUSTED_PROXY_HOSTNAMES:
+        try:
+            found.update(info[4][0] for info in socket.getaddrinfo(hostname, None))
+        except OSError as e:
+            logger.warning(f"Failed to resolve trusted proxy {hostname}: {e}")
+    _proxy_addresses = (time.time(), frozenset(found))
+    return _proxy_addresses[1]
+
+def is_trusted_proxy(host: Optional[str]) -> bool:
+    if not host:
+        return False
     try:
-        task_results[task_id].status = "processing"
-        start_time = datetime.now()
-        
-        # 使用线程池执行PDF处理，添加超时
-        loop = asyncio.get_event_loop()
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    if any(address in network for network in TRUSTED_PROXY_NETWORKS):
+        return True
+    return bool(TRUSTED_PROXY_HOSTNAMES) and host in _trusted_proxy_addresses()
+
+def client_group(request: Request) -> str:
+    """
+    公平调度的分组键：同一客户端的任务在同优先级内与其他客户端轮流执行；
+    经 nginx 转发时 request.client 是代理地址，此时取代理设置的 X-Real-IP / X-Forwarded-For。
+    这两个头可以由客户端伪造，只有对端是 MINERU_TRUSTED_PROXIES 中的代理时才采用
+    """
+    peer = request.client.host if request.client else None
+    if is_trusted_proxy(peer):
+        real_ip = request.headers.get("x-real-ip")
+        if real_ip:
+            return real_ip.strip()
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            # 取最后一跳：代理追加的是它看到的对端地址，前面的部分来自客户端
+            return forwarded.split(",")[-1].strip()
+    return peer or "default"
+
+def queue_full_error(e: QueueFull) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def mark_task_started(task_id: str):
+    task_store.update(task_id, status="processing", started_at=datetime.now(), owner=INSTANCE_ID)
+
+def fail_task(task_id: str, error: str):
+    task_store.update(task_id, status="failed", error=error, finished_at=datetime.now())
+    task = task_store.get(task_id)
+    metrics.record_task("failed", task.ocr if task else None)
+
+def mark_task_progress(task_id: str, progress: dict):
+    task_store.update(task_id, page_count=progress["page_count"], pages_done=progress["pages_done"])
+
+def submit_document(task_id: str, file_path: str, output_dir: str, ocr: Union[bool, str],
+                    shards: Optional[List[Tuple[int, int]]], priority: int = PRIORITY_BULK,
+                    group: str = "default", stream: bool = False, formula: bool = True,
+                    table: bool = True, images: str = IMAGES_ORIGINAL, image_max_side: Optional[int] = None,
+                    outputs: Optional[List[str]] = None, page_count: Optional[int] = None,
+                    extra: Optional[dict] = None) -> List[Future]:
+    """
+    把一个文档（或它的全部分片）原子地放入任务队列；stream 时工作进程逐页输出结果，
+    formula / table 为 False 时工作进程不识别公式 / 表格，也不加载对应模型，
+    images / image_max_side 为图片输出模式，outputs 为要生成的输出文件（None 表示全部），
+    page_count 决定每个任务的超时（分片按最大分片的页数），
+    extra 合并到每个任务参数中（例如共享内存中的 PDF 内容）
+    """
+    if stream:
+        jobs = [{"file_path": file_path, "output_dir": output_dir, "ocr": ocr, "stream_pages": True}]
+    elif not shards:
+        jobs = [{"file_path": file_path, "output_dir": output_dir, "ocr": ocr}]
+    else:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        jobs = [
+            {
+                "file_path": file_path,
+                "output_dir": os.path.join(output_dir, "shards", str(index)),
+                "ocr": ocr,
+                "name": name,
+                "page_range": page_range,
+                "images_dir": os.path.join(output_dir, "images")
+            }
+            for index, page_range in enumerate(shards)
+        ]
+    jobs = [{**job, "formula": formula, "table": table, "images": images, "image_max_side": image_max_side,
+             "outputs": outputs, **(extra or {})} for job in jobs]
+    if shards:
+        page_count = max(end - start + 1 for start, end in shards)
+    return worker_pool.submit_many(
+        jobs,
+        timeout=job_timeout(page_count),
+        priority=priority,
+        group=group,
+        job_id=task_id,
+        on_start=lambda: mark_task_started(task_id),
+        on_progress=lambda progress: mark_task_progress(task_id, progress)
+    )
+
+async def process_pdf_background(task_id: str, file_path: str, output_dir: str, futures: List[Future],
+                                 cache_key: Optional[str] = None, shards: Optional[List[Tuple[int, int]]] = None,
+                                 upload: Optional[Upload] = None):
+    try:
+        # 工作进程负责单个任务的执行超时，这里只等待结果，排队时间不计入超时
         try:
-            await asyncio.wait_for(
-                loop.run_in_executor(pdf_executor, process_pdf_task, task_id, file_path, output_dir, ocr),
-                timeout=PROCESS_TIMEOUT
-            )
-        except asyncio.TimeoutError:
-            task_results[task_id].status = "failed"
-            task_results[task_id].error = "Processing timeout after 5 minutes"
+            results = await asyncio.gather(*[asyncio.wrap_future(future) for future in futures])
+        except (JobFailed, JobAborted, WorkerCrashed, TimeoutError, asyncio.CancelledError) as e:
+            # 任一分片失败则中止其余分片（排队中的取消，执行中的杀掉工作进程）
+            worker_pool.abort(task_id)
+            logger.error(f"Worker failed: {str(e)}")
+            fail_task(task_id, str(e) or type(e).__name__)
+            cleanup_task_files(task_id, output_dir)
             return
-            
-        task_results[task_id].processing_time = (datetime.now() - start_time).total_seconds()
+        
+        # 合并与落盘在线程池中完成，不阻塞事件循环
+        finalizing_tasks.add(task_id)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(pdf_executor, process_pdf_task, task_id, file_path, output_dir,
+                                   results, cache_key, shards)
         
     except Exception as e:
         logger.error(f"Error processing PDF: {str(e)}", exc_info=True)
-        task_results[task_id].status = "failed"
-        task_results[task_id].error = str(e)
+        fail_task(task_id, str(e))
+    finally:
+        finalizing_tasks.discard(task_id)
+        if upload is not None:
+            upload.close()
 
-def process_pdf_task(task_id: str, file_path: str, output_dir: str, ocr: bool):
+def process_pdf_task(task_id: str, file_path: str, output_dir: str, results: List[dict],
+                     cache_key: Optional[str] = None, shards: Optional[List[Tuple[int, int]]] = None):
     try:
-        # 使用Python API处理PDF
-        logger.info(f"Processing PDF: {file_path} with OCR={ocr}")
-        
-        # 创建Python脚本
-        script_path = os.path.join("/data/uploads", f"{task_id}_process.py")
-        with open(script_path, "w") as f:
-            f.write(f"""
-import os
-import sys
-import time
-import json
-from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedDataReader
-from magic_pdf.data.dataset import PymuDocDataset
-from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
-from magic_pdf.config.enums import SupportedPdfParseMethod
-
-# args
-pdf_file_name = "{file_path}"
-name_without_suff = os.path.basename(pdf_file_name).split(".")[0]
-
-# prepare env
-local_image_dir, local_md_dir = "{output_dir}/images", "{output_dir}"
-image_dir = "images"
-
-# read bytes
-reader1 = FileBasedDataReader("")
-pdf_bytes = reader1.read(pdf_file_name)
-
-# Create image writer and md writer
-image_writer = FileBasedDataWriter(local_image_dir)
-md_writer = FileBasedDataWriter(local_md_dir)
-
-# proc
-## Create Dataset Instance
-ds = PymuDocDataset(pdf_bytes)
-
-## inference
-try:
-    if ds.classify() == SupportedPdfParseMethod.OCR or {str(ocr).lower()}:
-        infer_result = ds.apply(doc_analyze, ocr=True)
-        ## pipeline
-        pipe_result = infer_result.pipe_ocr_mode(image_writer)
-    else:
-        infer_result = ds.apply(doc_analyze, ocr=False)
-        ## pipeline
-        pipe_result = infer_result.pipe_txt_mode(image_writer)
-except KeyError as e:
-    # 捕获 KeyError 并尝试修复
-    print(f"捕获到 KeyError: {{e}}")
-    
-    # 修复配置
-    import magic_pdf.model.pdf_extract_kit
-    if hasattr(magic_pdf.model.pdf_extract_kit.CustomPEKModel, '_original_init'):
-        # 已经被修补过
-        pass
-    else:
-        # 保存原始的 __init__ 方法
-        magic_pdf.model.pdf_extract_kit.CustomPEKModel._original_init = magic_pdf.model.pdf_extract_kit.CustomPEKModel.__init__
+        if shards:
+            name = os.path.splitext(os.path.basename(file_path))[0]
+            result = merge_results(list(zip(shards, results)), output_dir, name)
+            shutil.rmtree(os.path.join(output_dir, "shards"), ignore_errors=True)
+            # 各分片的 OCR 页码换算为整篇文档的页码
+            result["page_count"] = sum(r.get("page_count", 0) for r in results)
+            result["ocr_pages"] = [
+                page + start for (start, _), r in zip(shards, results) for page in r.get("ocr_pages", [])
+            ]
+        else:
+            result = results[0]
         
-        # 定义补丁版本
-        def patched_init(self, ocr=False, show_log=False, **kwargs):
-            try:
-                magic_pdf.model.pdf_extract_kit.CustomPEKModel._original_init(self, ocr, show_log, **kwargs)
-            except KeyError as e:
-                if str(e).strip("'") in ["yolo_v8_ft", "yolo_v8_mfd"]:
-                    # 修改 self.configs 添加缺失的配置
-                    if not hasattr(self, 'configs'):
-                        self.configs = {{}}
-                    
-                    if 'weights' not in self.configs:
-                        self.configs['weights'] = {{}}
-                    
-                    self.configs['weights']['yolo_v8_mfd'] = "MFD/YOLO/yolo_v8_mfd.pt"
-                    self.configs['weights']['yolo_v8_ft'] = "MFD/YOLO/yolo_v8_ft.pt"
-                    self.configs['weights']['unimernet_small'] = "MFR/unimernet_small.onnx"
-                    self.configs['weights']['doclayout_yolo'] = "Layout/YOLO/doclayout_yolo.pt"
-                    
-                    # 重新调用原始方法
-                    magic_pdf.model.pdf_extract_kit.CustomPEKModel._original_init(self, ocr, show_log, **kwargs)
-                else:
-                    raise
+        # 处理耗时从工作进程开始处理算起，不含排队时间
+        finished_at = datetime.now()
+        task = task_store.get(task_id)
+        started_at = task.started_at if task and task.started_at else finished_at
         
-        # 替换为补丁版本
-        magic_pdf.model.pdf_extract_kit.CustomPEKModel.__init__ = patched_init
-    
-    # 重新尝试
-    if ds.classify() == SupportedPdfParseMethod.OCR or {str(ocr).lower()}:
-        infer_result = ds.apply(doc_analyze, ocr=True)
-        ## pipeline
-        pipe_result = infer_result.pipe_ocr_mode(image_writer)
-    else:
-        infer_result = ds.apply(doc_analyze, ocr=False)
-        ## pipeline
-        pipe_result = infer_result.pipe_txt_mode(image_writer)
-
-### get markdown content
-md_content = pipe_result.get_markdown(image_dir)
-
-### dump markdown
-pipe_result.dump_md(md_writer, f"{{name_without_suff}}.md", image_dir)
-
-### get content list content
-content_list_content = pipe_result.get_content_list(image_dir)
-
-### dump content list
-pipe_result.dump_content_list(md_writer, f"{{name_without_suff}}_content_list.json", image_dir)
-
-### get middle json
-middle_json_content = pipe_result.get_middle_json()
-
-### dump middle json
-pipe_result.dump_middle_json(md_writer, f'{{name_without_suff}}_middle.json')
-
-# 保存处理时间
-processing_time = time.time() - start_time
-with open("{output_dir}/processing_time.txt", "w") as f:
-    f.write(str(processing_time))
-
-print("Processing completed successfully!")
-sys.exit(0)
-""")
+        # 只记录结果文件位置，内容保留在磁盘上
+        task_store.update(
+            task_id,
+            status="completed",
+            finished_at=finished_at,
+            processing_time=(finished_at - started_at).total_seconds(),
+            markdown_path=result["markdown_path"],
+            content_list_path=result["content_list_path"],
+            middle_json_path=result["middle_json_path"],
+            page_count=result.get("page_count"),
+            ocr_pages=result.get("ocr_pages")
+        )
         
-        # 执行Python脚本
-        cmd = [
-            "/bin/bash", 
-            "-c", 
-            f"source /opt/mineru_venv/bin/activate && python {script_path}"
-        ]
+        metrics.record_task("completed", task.ocr if task else None)
+        if cache_key:
+            result_cache.put(cache_key, result)
         
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True
-        )
+        # 清理上传文件（内存中的上传没有落盘文件）
+        if os.path.exists(file_path):
+            os.remove(file_path)
         
-        # 检查命令是否成功
-        if result.returncode != 0:
-            logger.error(f"Command failed: {result.stderr}")
-            task_results[task_id].status = "failed"
-            task_results[task_id].error = result.stderr
-            return
+    except Exception as e:
+        logger.error(f"Error in PDF task: {str(e)}", exc_info=True)
+        fail_task(task_id, str(e))
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(4 * 1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def mark_tasks_started(task_ids: List[str]):
+    for task_id in task_ids:
+        mark_task_started(task_id)
+
+@app.post("/batch")
+async def create_batch(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    ocr: str = OCR_AUTO,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_ORIGINAL,
+    image_max_side: Optional[int] = None,
+    outputs: str = ",".join(OUTPUTS)
+):
+    ocr = parse_ocr(ocr)
+    images = parse_images(images)
+    outputs = parse_outputs(outputs)
+    batch_id = str(uuid.uuid4())
+    batch_dir = f"/data/uploads/{batch_id}"
+    os.makedirs(batch_dir, exist_ok=True)
+    
+    try:
+        # 保存上传文件，压缩包只取出其中的 PDF
+        pdf_files = []  # (file_path, sha256)
+        for upload in files:
+            upload_start = time.time()
+            file_path = unique_path(batch_dir, upload.filename)
+            hasher = hashlib.sha256()
+            with open(file_path, "wb") as buffer:
+                chunk_size = 4 * 1024 * 1024
+                while True:
+                    chunk = await upload.read(chunk_size)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    buffer.write(chunk)
+            metrics.UPLOAD_SECONDS.observe(time.time() - upload_start)
+            if is_archive(upload.filename):
+                try:
+                    pdf_paths = await asyncio.to_thread(extract_pdfs, file_path, batch_dir)
+                except ArchiveTooLarge as e:
+                    # 还没有创建任务，已解出的文件随上传目录一起删除
+                    shutil.rmtree(batch_dir, ignore_errors=True)
+                    raise HTTPException(status_code=413, detail=f"{upload.filename}: {e}")
+                for pdf_path in pdf_paths:
+                    pdf_files.append((pdf_path, await asyncio.to_thread(file_sha256, pdf_path)))
+                os.remove(file_path)
+            else:
+                pdf_files.append((file_path, hasher.hexdigest()))
         
-        # 读取处理结果并存储在内存中
-        base_name = os.path.splitext(os.path.basename(file_path))[0]
+        if not pdf_files:
+            raise HTTPException(status_code=400, detail="No PDF files found in upload")
         
-        with open(f"{output_dir}/{base_name}.md", 'r', encoding='utf-8') as f:
-            task_results[task_id].markdown = f.read()
-            
-        with open(f"{output_dir}/{base_name}_content_list.json", 'r', encoding='utf-8') as f:
-            task_results[task_id].content_list = f.read()
-            
-        with open(f"{output_dir}/{base_name}_middle.json", 'r', encoding='utf-8') as f:
-            task_results[task_id].middle_json = f.read()
+        # 每个文档一个任务记录，命中缓存的直接完成
+        documents = []  # (task_id, file_path, output_dir, cache_key)
+        page_counts = []  # 与 documents 对应，用于计算每块的超时
+        cached_count = 0
+        rejected_count = 0
+        for file_path, sha256 in pdf_files:
+            task_id = str(uuid.uuid4())
+            output_dir = os.path.join(RESULTS_DIR, task_id)
+            filename = os.path.basename(file_path)
+            # 预检不通过的文档记为失败，不影响同批次的其他文档
+            try:
+                report = await run_preflight(file_path)
+            except HTTPException as e:
+                os.remove(file_path)
+                task_store.create(task_id, status="failed", filename=filename, output_dir=output_dir, ocr=ocr,
+                                  batch_id=batch_id, error=e.detail["error"], finished_at=datetime.now())
+                metrics.record_task("failed", ocr)
+                rejected_count += 1
+                continue
+            cache_key = result_cache.make_key(sha256, ocr, formula, table, images, image_max_side)
+            cached = await asyncio.to_thread(
+                result_cache.materialize, cache_key, output_dir, os.path.splitext(filename)[0]
+            )
+            if cached is not None:
+                os.remove(file_path)
+                task_store.create(task_id, status="completed", filename=filename, output_dir=output_dir,
+                                  ocr=ocr, cache_key=cache_key, batch_id=batch_id, processing_time=0,
+                                  finished_at=datetime.now(), **cached)
+                metrics.record_task("cached", ocr)
+                cached_count += 1
+                continue
+            task_store.create(task_id, status="queued", filename=filename, file_path=file_path,
+                              output_dir=output_dir, ocr=ocr, cache_key=cache_key, batch_id=batch_id,
+                              page_count=report["page_count"], owner=INSTANCE_ID)
+            documents.append((task_id, file_path, output_dir, cache_key))
+            page_counts.append(report["page_count"])
         
-        task_results[task_id].status = "completed"
+        # 按块分组，同一个常驻工作进程连续解析一块中的多个文档
+        chunks = [documents[i:i + BATCH_CHUNK_SIZE] for i in range(0, len(documents), BATCH_CHUNK_SIZE)]
+        jobs = [
+            {"documents": [
+                {"file_path": d[1], "output_dir": d[2], "ocr": ocr, "formula": formula, "table": table,
+                 "images": images, "image_max_side": image_max_side, "outputs": outputs}
+                for d in chunk
+            ]}
+            for chunk in chunks
+        ]
+        # 每块的超时为块内各文档超时之和
+        timeouts = [
+            sum(job_timeout(pages) for pages in page_counts[i:i + BATCH_CHUNK_SIZE])
+            for i in range(0, len(documents), BATCH_CHUNK_SIZE)
+        ]
+        try:
+            futures = worker_pool.submit_many(
+                jobs,
+                timeouts=timeouts,
+                priority=PRIORITY_BULK,
+                group=client_group(request),
+                job_id=batch_id,
+                on_starts=[functools.partial(mark_tasks_started, [d[0] for d in chunk]) for chunk in chunks]
+            )
+        except QueueFull as e:
+            for task in task_store.list(batch_id=batch_id):
+                shutil.rmtree(task.output_dir, ignore_errors=True)
+                task_store.delete(task.task_id)
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            raise queue_full_error(e)
         
-        # 清理临时文件
-        shutil.rmtree(output_dir, ignore_errors=True)
-        os.remove(file_path)
+        background_tasks.add_task(process_batch_background, batch_dir, list(zip(chunks, futures)))
         
+        return {
+            "batch_id": batch_id,
+            "status": "queued" if documents else "completed",
+            "total": len(pdf_files),
+            "cached": cached_count,
+            "rejected": rejected_count,
+            "tasks": [
+                {"task_id": task.task_id, "filename": task.filename, "status": task.status}
+                for task in task_store.list(batch_id=batch_id)
+            ]
+        }
+    except HTTPException:
+        if not os.listdir(batch_dir):
+            shutil.rmtree(batch_dir, ignore_errors=True)
+        raise
     except Exception as e:
-        logger.error(f"Error in PDF task: {str(e)}", exc_info=True)
-        task_results[task_id].status = "failed"
-        task_results[task_id].error = str(e)
+        logger.error(f"Error creating batch: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error creating batch: {str(e)}")
+
+async def process_batch_background(batch_dir: str, chunk_futures: List[Tuple[list, Future]]):
+    async def wait_chunk(chunk: list, future: Future):
+        try:
+            output = await asyncio.wrap_future(future)
+        except Exception as e:
+            # 整块失败（进程崩溃或超时），块内所有文档标记失败并删除不完整的结果
+            logger.error(f"Batch chunk failed: {str(e)}")
+            for task_id, _, output_dir, _ in chunk:
+                fail_task(task_id, str(e) or type(e).__name__)
+                shutil.rmtree(output_dir, ignore_errors=True)
+            return
+        
+        # 块内文档逐个落盘，尚未轮到的文档同样算作收尾中
+        task_ids = [d[0] for d in chunk]
+        finalizing_tasks.update(task_ids)
+        try:
+            loop = asyncio.get_event_loop()
+            for (task_id, file_path, output_dir, cache_key), item in zip(chunk, output["results"]):
+                # 排队期间被删除的文档丢弃结果
+                if task_store.get(task_id) is None:
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                    continue
+                if item["status"] == "ok":
+                    await loop.run_in_executor(pdf_executor, process_pdf_task, task_id, file_path, output_dir,
+                                               [item["result"]], cache_key)
+                else:
+                    fail_task(task_id, item["error"])
+        finally:
+            finalizing_tasks.difference_update(task_ids)
+    
+    try:
+        await asyncio.gather(*[wait_chunk(chunk, future) for chunk, future in chunk_futures])
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+@app.get("/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    tasks = task_store.list(batch_id=batch_id)
+    if not tasks:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    counts: Dict[str, int] = {}
+    for task in tasks:
+        counts[task.status] = counts.get(task.status, 0) + 1
+    done = counts.get("completed", 0) + counts.get("failed", 0)
+    
+    return {
+        "batch_id": batch_id,
+        "status": "completed" if done == len(tasks) else "processing",
+        "total": len(tasks),
+        "counts": counts,
+        "queue_position": worker_pool.queue_position(batch_id),
+        "tasks": [
+            {
+                "task_id": task.task_id,
+                "filename": task.filename,
+                "status": task.status,
+                "processing_time": task.processing_time,
+                "error": task.error
+            }
+            for task in tasks
+        ]
+    }
+
+@app.get("/batch/{batch_id}/results")
+async def get_batch_results(batch_id: str):
+    tasks = task_store.list(batch_id=batch_id)
+    if not tasks:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    # 每行一个文档的 NDJSON，逐个读取结果文件，不把整个批次放进内存
+    def iter_results():
+        for task in tasks:
+            line = {"task_id": task.task_id, "filename": task.filename, "status": task.status}
+            if task.status == "completed":
+                line["markdown"] = read_text(task.markdown_path)
+            elif task.status == "failed":
+                line["error"] = task.error
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(iter_results(), media_type="application/x-ndjson")
 
 @app.get("/tasks/{task_id}")
 async def get_task_status(task_id: str):
-    if task_id not in task_results:
+    task = task_store.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    response = task.to_dict()
+    if task.status == "queued":
+        response["queue_position"] = worker_pool.queue_position(task.batch_id or task_id)
+    return response
+
+def format_keepalive(fmt: str) -> str:
+    """SSE 用注释行，NDJSON 用 keepalive 事件（客户端应忽略未知事件）"""
+    if fmt == "sse":
+        return ": keepalive\n\n"
+    return json.dumps({"event": "keepalive"}) + "\n"
+
+def format_event(event: dict, fmt: str) -> str:
+    data = json.dumps(event, ensure_ascii=False)
+    if fmt == "sse":
+        return f"event: {event['event']}\ndata: {data}\n\n"
+    return data + "\n"
+
+def read_new_lines(path: str, offset: int) -> Tuple[List[str], int]:
+    """从 offset 开始读取已写完的整行，返回 (行列表, 新的 offset)"""
+    if not os.path.exists(path):
+        return [], offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    if end == 0:
+        return [], offset
+    return data[:end].decode("utf-8").splitlines(), offset + end
+
+@app.get("/tasks/{task_id}/stream")
+async def stream_task(task_id: str, format: str = "ndjson"):
+    """
+    逐页推送解析结果（SSE 或 NDJSON），最后发送 summary 事件；长时间没有新页时定期发送心跳
+
+    以 stream=true 提交的任务每完成一页推送一次；其他任务（包括命中缓存的）
+    在完成后把整篇文档作为一个 page 事件推送
+    """
+    if format not in ("ndjson", "sse"):
+        raise HTTPException(status_code=400, detail="format must be 'ndjson' or 'sse'")
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    return task_results[task_id].__dict__
+    async def iter_events():
+        pages_path = os.path.join(task.output_dir or os.path.join(RESULTS_DIR, task_id), PAGES_FILE)
+        offset = 0
+        sent_pages = False
+        last_sent = time.time()
+        while True:
+            # 先取状态再读文件：任务已结束时文件中的页一定已全部写完
+            current = task_store.get(task_id)
+            lines, offset = read_new_lines(pages_path, offset)
+            for line in lines:
+                sent_pages = True
+                last_sent = time.time()
+                yield format_event(json.loads(line), format)
+            if current is None or current.status in ("completed", "failed"):
+                break
+            if time.time() - last_sent >= STREAM_KEEPALIVE_INTERVAL:
+                last_sent = time.time()
+                yield format_keepalive(format)
+            await asyncio.sleep(STREAM_POLL_INTERVAL)
+        
+        if current is not None and current.status == "completed" and not sent_pages:
+            content_list = json.loads(read_text(current.content_list_path) or "[]")
+            yield format_event({
+                "event": "page",
+                "page_start": 0,
+                "page_end": max((block.get("page_idx", 0) for block in content_list), default=0),
+                "markdown": read_text(current.markdown_path),
+                "content_list": content_list
+            }, format)
+        
+        yield format_event({
+            "event": "summary",
+            "task_id": task_id,
+            "status": current.status if current else "deleted",
+            "page_count": current.page_count if current else None,
+            "processing_time": current.processing_time if current else None,
+            "error": current.error if current else None
+        }, format)
+    
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # X-Accel-Buffering: no 让 nginx 不缓冲该响应，每个事件立即转发
+    return StreamingResponse(iter_events(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.get("/tasks")
-async def list_tasks():
-    return list(task_results.values())
+async def list_tasks(
+    status: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    filename: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = TASK_PAGE_SIZE,
+    view: str = "summary"
+):
+    """
+    分页列出任务（最新在前），status 可用逗号分隔多个状态，filename 为子串匹配；
+    view=summary 只返回状态与时间等摘要字段，view=full 返回完整任务记录（不含结果内容）
+    """
+    if view not in ("summary", "full"):
+        raise HTTPException(status_code=400, detail="view must be 'summary' or 'full'")
+    if not 1 <= limit <= TASK_PAGE_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {TASK_PAGE_MAX_SIZE}")
+    statuses = [value.strip() for value in status.split(",") if value.strip()] if status else None
+    try:
+        tasks, next_cursor = await asyncio.to_thread(
+            task_store.list_page, statuses, created_after, created_before, filename, cursor, limit,
+            view == "full"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "tasks": [task.to_dict() if view == "full" else task.summary() for task in tasks],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }
 
 @app.get("/download/{task_id}/{file_path:path}")
-async def download_file(task_id: str, file_path: str):
-    if task_id not in task_results:
+async def download_file(task_id: str, file_path: str, request: Request):
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = task_results[task_id]
-    file_full_path = os.path.join(task["output_dir"], file_path)
+    output_dir = os.path.realpath(task.output_dir or os.path.join(RESULTS_DIR, task_id))
+    file_full_path = os.path.realpath(os.path.join(output_dir, file_path))
     
-    if not os.path.exists(file_full_path):
+    if not file_full_path.startswith(output_dir + os.sep) or not os.path.isfile(file_full_path):
         raise HTTPException(status_code=404, detail="File not found")
     
-    return FileResponse(file_full_path)
+    media_type = mimetypes.guess_type(file_full_path)[0] or "application/octet-stream"
+    return stream_file(request, file_full_path, media_type)
 
 @app.delete("/tasks/{task_id}")
 async def delete_task(task_id: str):
-    if task_id not in task_results:
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    # 批量文档与同块的其他文档在一个工作进程任务中连续解析，不能单独中止；
+    # 排队中的直接删除（删掉上传文件，轮到它时很快失败，结果被丢弃）
+    if task.batch_id and task.status == "processing":
+        raise HTTPException(status_code=409,
+                            detail=f"Task is being processed as part of batch {task.batch_id}, "
+                                   f"delete it after it finishes")
+    if task.batch_id and task.status == "queued":
+        if task.file_path and os.path.exists(task.file_path):
+            os.remove(task.file_path)
+    # 排队或处理中的任务先中止，释放工作进程
+    elif task.status in ("queued", "processing"):
+        worker_pool.abort(task_id)
+    
     # 删除任务文件
-    task = task_results[task_id]
-    shutil.rmtree(f"/data/uploads/{task_id}", ignore_errors=True)
-    shutil.rmtree(task["output_dir"], ignore_errors=True)
+    cleanup_task_files(task_id, task.output_dir)
     
     # 删除任务记录
-    del task_results[task_id]
+    task_store.delete(task_id)
     
     return {"message": "Task deleted successfully"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    就绪探针：至少一个工作进程已加载模型并完成预热，且任务队列仍接收新任务；
+    未就绪时返回 503，负载均衡只把请求转发给就绪的实例
+    """
+    ready_workers = worker_pool.ready_workers
+    accepting = worker_pool.accepting
+    ready = ready_workers > 0 and accepting
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "ready_workers": ready_workers,
+            "worker_pool_size": worker_pool.size,
+            "queue_accepting": accepting,
+            "queue": worker_pool.queue_stats(),
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
 @app.get("/health")
 async def health_check():
+    """存活探针：进程能响应即为 healthy，模型是否可用见 /ready"""
     try:
-        # 检查GPU状态
-        gpu_result = subprocess.run(
-            ["nvidia-smi"], 
-            capture_output=True,
-            text=True,
-            timeout=5  # 添加超时
-        )
-        gpu_available = gpu_result.returncode == 0
+        # 检查GPU状态（后台采样的缓存结果）
+        gpu_available = device_monitor.snapshot()["gpu_available"]
         
         # 检查系统状态
-        active_tasks = len([t for t in task_results.values() if t.status == "processing"])
+        active_tasks = task_store.count("processing")
         
         return {
             "status": "healthy",
             "gpu_available": gpu_available,
             "active_tasks": active_tasks,
-            "worker_pool_size": pdf_executor._max_workers,
+            "worker_pool_size": worker_pool.size,
+            "ready_workers": worker_pool.ready_workers,
+            "busy_workers": worker_pool.busy_workers,
+            "queue": worker_pool.queue_stats(),
+            "result_cache": result_cache.stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -624,109 +1261,132 @@ async def root():
     return {"message": "MinerU API is running. Visit /docs for API documentation."}
 
 @app.get("/get_results/{task_id}")
-async def get_results(task_id: str):
-    if task_id not in task_results:
+async def get_results(task_id: str, request: Request, format: Optional[str] = None):
+    task = task_store.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task = task_results[task_id]
-    if task["status"] != "completed":
+    if task.status != "completed":
         return {
-            "status": task["status"],
+            "status": task.status,
             "message": "Task is still processing"
         }
     
-    base_name = os.path.splitext(task["filename"])[0]
-    result_files = {
-        "markdown": f"{base_name}.md",
-        "content_list": f"{base_name}_content_list.json",
-        "middle_json": f"{base_name}_middle.json"
+    # content_list / middle_json 的文件内容原样嵌入响应，不再作为字符串二次编码
+    fields = {}
+    markdown = read_text(task.markdown_path)
+    if markdown is not None:
+        fields["markdown"] = markdown
+    raw_paths = {
+        key: path
+        for key, path in (("content_list", task.content_list_path), ("middle_json", task.middle_json_path))
+        if path and os.path.exists(path)
     }
-    
-    results = {}
-    for key, filename in result_files.items():
-        file_path = os.path.join(task["output_dir"], filename)
-        if os.path.exists(file_path):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                results[key] = f.read()
-    
-    return JSONResponse(content=results)
+    return envelope_response(request, fields, raw_paths=raw_paths, format=format)
 
 @app.get("/get_markdown/{task_id}")
-async def get_markdown(task_id: str):
+async def get_markdown(task_id: str, request: Request):
     try:
-        if task_id not in task_results:
+        result = task_store.get(task_id)
+        if result is None:
             raise HTTPException(status_code=404, detail="Task not found")
         
-        result = task_results[task_id]
-        
         # 检查任务状态
         if result.status == "failed":
             raise HTTPException(status_code=500, detail=result.error)
-        elif result.status == "processing":
+        elif result.status in ("queued", "processing"):
             return JSONResponse(
                 status_code=202,  # 使用202 Accepted表示正在处理
                 content={
-                    "status": "processing",
+                    "status": result.status,
                     "message": "Task is still processing",
                     "processing_time": result.processing_time
                 }
             )
         elif result.status == "completed":
-            if result.markdown is None:
+            if not result.markdown_path or not os.path.exists(result.markdown_path):
                 raise HTTPException(status_code=500, detail="Markdown content not found")
             
-            return JSONResponse(
-                content={
-                    "status": "completed",
-                    "markdown": result.markdown,
-                    "processing_time": result.processing_time
-                }
+            # 直接从结果目录流式返回，支持 Range 与 gzip
+            return stream_file(
+                request,
+                result.markdown_path,
+                "text/markdown; charset=utf-8",
+                headers=result_headers(result)
             )
         else:
             raise HTTPException(status_code=500, detail=f"Unknown task status: {result.status}")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting markdown for task {task_id}: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/get_content_list/{task_id}")
-async def get_content_list(task_id: str):
-    if task_id not in task_results:
+async def get_content_list(task_id: str, request: Request, format: Optional[str] = None):
+    result = task_store.get(task_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    result = task_results[task_id]
     if result.status == "failed":
         raise HTTPException(status_code=500, detail=result.error)
-    elif result.status == "processing":
-        return {"status": "processing", "message": "Task is still processing"}
+    elif result.status in ("queued", "processing"):
+        return {"status": result.status, "message": "Task is still processing"}
     
-    return JSONResponse(content={"content_list": result.content_list})
+    return stream_json_file(request, result.content_list_path, headers=result_headers(result), format=format)
 
 @app.get("/get_middle_json/{task_id}")
-async def get_middle_json(task_id: str):
-    if task_id not in task_results:
+async def get_middle_json(task_id: str, request: Request, format: Optional[str] = None):
+    result = task_store.get(task_id)
+    if result is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    result = task_results[task_id]
     if result.status == "failed":
         raise HTTPException(status_code=500, detail=result.error)
-    elif result.status == "processing":
-        return {"status": "processing", "message": "Task is still processing"}
+    elif result.status in ("queued", "processing"):
+        return {"status": result.status, "message": "Task is still processing"}
     
-    return JSONResponse(content={"middle_json": result.middle_json})
+    return stream_json_file(request, result.middle_json_path, headers=result_headers(result), format=format)
+
+def recovery_deadline(task: TaskResult) -> datetime:
+    """
+    processing 任务最晚应结束的时间：开始时间 + 按页数计算的硬超时 + 收尾时间；
+    其他实例的任务无法确认是否仍在执行，按最坏情况估计（批量文档按整块的预算，合并推理超时后会逐个重跑）
+    """
+    budget = job_timeout(task.page_count)
+    if task.owner != INSTANCE_ID:
+        budget *= 2 * (BATCH_CHUNK_SIZE if task.batch_id else 1)
+    return task.started_at + timedelta(seconds=budget + RECOVERY_GRACE_SECONDS)
 
 # 添加任务恢复函数
 async def recover_hanging_tasks():
     while True:
         try:
-            current_time = datetime.now()
-            for task_id, task in task_results.items():
-                # 如果任务处理时间超过10分钟，标记为失败
-                if (task.status == "processing" and 
-                    (current_time - task.created_at).total_seconds() > 600):
-                    task.status = "failed"
-                    task.error = "Task recovery: Processing timeout"
-                    logger.warning(f"Recovered hanging task: {task_id}")
+            # 执行超时由工作进程池强制（按页数计算并杀掉进程组），这里只处理超过硬超时仍停留在
+            # processing 的任务（例如重启前正在处理的任务）；本进程的任务仍在进程池中或正在落盘时不回收
+            now = datetime.now()
+            for task in task_store.list(status="processing",
+                                        created_before=now - timedelta(seconds=RECOVERY_GRACE_SECONDS)):
+                if task.started_at is None or now < recovery_deadline(task):
+                    continue
+                if task.owner == INSTANCE_ID and (task.task_id in finalizing_tasks
+                                                 or worker_pool.is_active(task.batch_id or task.task_id)):
+                    continue
+                fail_task(task.task_id, "Task recovery: Worker lost")
+                cleanup_task_files(task.task_id, task.output_dir)
+                logger.warning(f"Recovered hanging task: {task.task_id}")
+            
+            # 重启后内存队列丢失，长时间停留在 queued 的任务不会再被执行；
+            # 其他实例的队列无法查看，等待更久再回收
+            for task in task_store.list(status="queued", created_before=now - timedelta(hours=1)):
+                if task.owner == INSTANCE_ID:
+                    lost = worker_pool.queue_position(task.batch_id or task.task_id) is None
+                else:
+                    lost = task.created_at < now - timedelta(hours=24)
+                if lost:
+                    fail_task(task.task_id, "Task recovery: Lost from queue")
+                    logger.warning(f"Recovered lost queued task: {task.task_id}")
             
             await asyncio.sleep(60)  # 每分钟检查一次
             
@@ -777,6 +1437,12 @@ async def startup_event():
     
     logger.info(f"CUDA acceleration enabled in config: {config_path}")
     
+    # 配置写好后再启动工作进程，确保加载的是更新后的模型配置
+    result_cache.refresh_settings()
+    worker_pool.start()
+    
+    device_monitor.start()
+    
     # 启动其他任务
     asyncio.create_task(recover_hanging_tasks())
     asyncio.create_task(cleanup_old_tasks())
@@ -784,263 +1450,149 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     # 清理资源
-    pass
+    device_monitor.stop()
+    worker_pool.shutdown()
 
 # 单独定义清理任务函数
 async def cleanup_old_tasks():
     while True:
         try:
-            current_time = datetime.now()
-            for task_id in list(task_results.keys()):
-                if (current_time - task_results[task_id].created_at) > timedelta(hours=1):
-                    del task_results[task_id]
-            await asyncio.sleep(3600)  # 每小时清理一次
+            # 保留时间从任务结束（未处理的任务从创建）算起；结束时间不早于创建时间，
+            # 先按 created_at 索引缩小范围，再按结束时间筛选，连同结果文件一起删除
+            cutoff = datetime.now() - timedelta(hours=RESULT_RETENTION_HOURS)
+            for task in task_store.list(created_before=cutoff):
+                if task.status in ("queued", "processing") or (task.finished_at or task.created_at) >= cutoff:
+                    continue
+                shutil.rmtree(f"/data/uploads/{task.task_id}", ignore_errors=True)
+                shutil.rmtree(task.output_dir or os.path.join(RESULTS_DIR, task.task_id), ignore_errors=True)
+                task_store.delete(task.task_id)
+            
+            # 清理没有任务记录的孤立结果目录（例如进程被杀时留下的）
+            for name in os.listdir(RESULTS_DIR):
+                path = os.path.join(RESULTS_DIR, name)
+                if (os.path.isdir(path) and os.path.getmtime(path) < cutoff.timestamp()
+                        and task_store.get(name) is None):
+                    shutil.rmtree(path, ignore_errors=True)
+            
+            # 共享图片目录中不再被任何结果目录引用的图片
+            await asyncio.to_thread(prune_store, RESULT_RETENTION_HOURS)
+            await asyncio.sleep(min(3600, RESULT_RETENTION_HOURS * 3600))  # 每小时清理一次
         except Exception as e:
             logger.error(f"Error in cleanup: {str(e)}")
+            await asyncio.sleep(60)
 
 @app.post("/process_pdf_and_return/")
 async def process_pdf_and_return(
+    request: Request,
     file: UploadFile = File(...),
-    ocr: bool = True
+    ocr: str = OCR_AUTO,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_REFS,
+    image_max_side: Optional[int] = None,
+    outputs: str = ",".join(OUTPUTS),
+    format: Optional[str] = None
 ):
+    # 同步接口只返回文本，默认只保留图片引用，不渲染和写出图片；
+    # content_list / middle_json 以 JSON 对象返回（format=msgpack 时整体为 MessagePack）
+    ocr = parse_ocr(ocr)
+    images = parse_images(images)
+    outputs = parse_outputs(outputs)
     task_id = None
+    upload = None
     try:
         # 1. 上传文件
         task_id = str(uuid.uuid4())
         task_dir = f"/data/uploads/{task_id}"
-        output_dir = f"/data/results/{task_id}"
-        os.makedirs(task_dir, exist_ok=True)
+        output_dir = os.path.join(RESULTS_DIR, task_id)
         os.makedirs(output_dir, exist_ok=True)
         os.makedirs(f"{output_dir}/images", exist_ok=True)
         
-        # 保存文件
+        # 保存文件：小文件留在共享内存直接交给工作进程，边接收边计算 SHA-256
+        upload_start = time.time()
         file_path = os.path.join(task_dir, file.filename)
-        with open(file_path, "wb") as buffer:
-            chunk_size = 4 * 1024 * 1024
-            while True:
-                chunk = await file.read(chunk_size)
-                if not chunk:
-                    break
-                buffer.write(chunk)
-        
-        # 2. 创建处理脚本
-        base_name = os.path.splitext(file.filename)[0]
-        script_path = os.path.join("/data/uploads", f"{task_id}_process.py")
-        
-        # 确保布尔值使用正确的Python语法（大写True/False）
-        ocr_value = "True" if ocr else "False"
-        
-        with open(script_path, "w") as f:
-            f.write(f"""
-import os
-import sys
-import time
-import json
-from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedDataReader
-from magic_pdf.data.dataset import PymuDocDataset
-from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
-from magic_pdf.config.enums import SupportedPdfParseMethod
-
-# 记录开始时间
-start_time = time.time()
-
-# args
-pdf_file_name = "{file_path}"
-name_without_suff = os.path.basename(pdf_file_name).split(".")[0]
-
-# prepare env
-local_image_dir, local_md_dir = "{output_dir}/images", "{output_dir}"
-image_dir = "images"
-
-# read bytes
-reader1 = FileBasedDataReader("")
-pdf_bytes = reader1.read(pdf_file_name)
-
-# Create image writer and md writer
-image_writer = FileBasedDataWriter(local_image_dir)
-md_writer = FileBasedDataWriter(local_md_dir)
-
-# proc
-## Create Dataset Instance
-ds = PymuDocDataset(pdf_bytes)
-
-## inference
-try:
-    if ds.classify() == SupportedPdfParseMethod.OCR or {ocr_value}:
-        infer_result = ds.apply(doc_analyze, ocr=True)
-        ## pipeline
-        pipe_result = infer_result.pipe_ocr_mode(image_writer)
-    else:
-        infer_result = ds.apply(doc_analyze, ocr=False)
-        ## pipeline
-        pipe_result = infer_result.pipe_txt_mode(image_writer)
-except KeyError as e:
-    # 捕获 KeyError 并尝试修复
-    print(f"捕获到 KeyError: {{e}}")
-    
-    # 修复配置
-    import magic_pdf.model.pdf_extract_kit
-    if hasattr(magic_pdf.model.pdf_extract_kit.CustomPEKModel, '_original_init'):
-        # 已经被修补过
-        pass
-    else:
-        # 保存原始的 __init__ 方法
-        magic_pdf.model.pdf_extract_kit.CustomPEKModel._original_init = magic_pdf.model.pdf_extract_kit.CustomPEKModel.__init__
+        upload = await receive_upload(file, file_path)
+        metrics.UPLOAD_SECONDS.observe(time.time() - upload_start)
+        report = await run_preflight(file_path, upload)
+        cache_key = result_cache.make_key(upload.sha256, ocr, formula, table, images, image_max_side)
         
-        # 定义补丁版本
-        def patched_init(self, ocr=False, show_log=False, **kwargs):
-            try:
-                magic_pdf.model.pdf_extract_kit.CustomPEKModel._original_init(self, ocr, show_log, **kwargs)
-            except KeyError as e:
-                if str(e).strip("'") in ["yolo_v8_ft", "yolo_v8_mfd"]:
-                    # 修改 self.configs 添加缺失的配置
-                    if not hasattr(self, 'configs'):
-                        self.configs = {{}}
-                    
-                    if 'weights' not in self.configs:
-                        self.configs['weights'] = {{}}
-                    
-                    self.configs['weights']['yolo_v8_mfd'] = "MFD/YOLO/yolo_v8_mfd.pt"
-                    self.configs['weights']['yolo_v8_ft'] = "MFD/YOLO/yolo_v8_ft.pt"
-                    self.configs['weights']['unimernet_small'] = "MFR/unimernet_small.onnx"
-                    self.configs['weights']['doclayout_yolo'] = "Layout/YOLO/doclayout_yolo.pt"
-                    
-                    # 重新调用原始方法
-                    magic_pdf.model.pdf_extract_kit.CustomPEKModel._original_init(self, ocr, show_log, **kwargs)
-                else:
-                    raise
-        
-        # 替换为补丁版本
-        magic_pdf.model.pdf_extract_kit.CustomPEKModel.__init__ = patched_init
-    
-    # 重新尝试
-    if ds.classify() == SupportedPdfParseMethod.OCR or {ocr_value}:
-        infer_result = ds.apply(doc_analyze, ocr=True)
-        ## pipeline
-        pipe_result = infer_result.pipe_ocr_mode(image_writer)
-    else:
-        infer_result = ds.apply(doc_analyze, ocr=False)
-        ## pipeline
-        pipe_result = infer_result.pipe_txt_mode(image_writer)
-
-### get markdown content
-md_content = pipe_result.get_markdown(image_dir)
-
-### dump markdown
-pipe_result.dump_md(md_writer, f"{{name_without_suff}}.md", image_dir)
-
-### get content list content
-content_list_content = pipe_result.get_content_list(image_dir)
-
-### dump content list
-pipe_result.dump_content_list(md_writer, f"{{name_without_suff}}_content_list.json", image_dir)
-
-### get middle json
-middle_json_content = pipe_result.get_middle_json()
-
-### dump middle json
-pipe_result.dump_middle_json(md_writer, f'{{name_without_suff}}_middle.json')
-
-# 保存处理时间
-processing_time = time.time() - start_time
-with open("{output_dir}/processing_time.txt", "w") as f:
-    f.write(str(processing_time))
-
-print("Processing completed successfully!")
-sys.exit(0)
-""")
+        # 命中缓存则直接返回
+        cached = await asyncio.to_thread(result_cache.get, cache_key)
+        if cached is not None:
+            metrics.record_task("cached", ocr)
+            fields = {"status": "completed", "processing_time": 0, "cached": True, "preflight": report}
+            if "markdown" in outputs:
+                fields["markdown"] = cached["markdown"]
+            raw_json = {output: cached[output] for output in outputs if output != "markdown"}
+            return envelope_response(request, fields, raw_json, format=format)
         
-        # 3. 执行处理脚本
+        # 2. 交给常驻工作进程处理，超时按预检页数计算（不超过代理的读超时），长文档不占交互优先级；
+        # 客户端断开时中止任务
+        timeout = min(job_timeout(report["page_count"]), SYNC_TIMEOUT_MAX)
+        priority = PRIORITY_INTERACTIVE if report["page_count"] <= INTERACTIVE_MAX_PAGES else PRIORITY_BULK
         start_time = time.time()
         
-        # 设置超时
-        process = subprocess.Popen(
-            ["bash", "-c", "source /opt/mineru_venv/bin/activate && python " + script_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
         try:
-            stdout, stderr = process.communicate(timeout=PROCESS_TIMEOUT)
-            if process.returncode != 0:
-                logger.error(f"PDF处理失败: {stderr.decode('utf-8', errors='ignore')}")
-                raise Exception(f"PDF处理失败: {stderr.decode('utf-8', errors='ignore')}")
-        except subprocess.TimeoutExpired:
-            process.kill()
-            raise
+            result = await run_in_pool(
+                {"file_path": file_path, "output_dir": output_dir, "ocr": ocr, "formula": formula,
+                 "table": table, "images": images, "image_max_side": image_max_side, "outputs": outputs,
+                 **upload.job_fields()},
+                timeout=timeout,
+                job_id=task_id,
+                request=request,
+                priority=priority,
+                group=client_group(request)
+            )
+        except QueueFull as e:
+            raise queue_full_error(e)
+        except JobFailed as e:
+            logger.error(f"PDF处理失败: {str(e)}")
+            raise Exception(f"PDF处理失败: {str(e)}")
         
         processing_time = time.time() - start_time
+        metrics.record_task("completed", ocr)
+        await asyncio.to_thread(result_cache.put, cache_key, result)
         
-        # 读取处理结果
-        all_files = os.listdir(output_dir)
-        
-        # 读取Markdown
-        markdown_path = os.path.join(output_dir, f"{base_name}.md")
-        if not os.path.exists(markdown_path):
-            # 尝试查找任何.md文件
-            md_files = [f for f in all_files if f.endswith('.md') and not f.endswith('_model.md') and not f.endswith('_layout.md') and not f.endswith('_spans.md')]
-            if md_files:
-                markdown_path = os.path.join(output_dir, md_files[0])
-                logger.info(f"Using alternative markdown file: {md_files[0]}")
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail="Markdown file not generated"
-                )
-        
-        with open(markdown_path, 'r', encoding='utf-8') as f:
-            markdown_content = f.read()
-        
-        # 读取内容列表
-        content_list_path = os.path.join(output_dir, f"{base_name}_content_list.json")
-        if not os.path.exists(content_list_path):
-            # 尝试查找任何_content_list.json文件
-            content_list_files = [f for f in all_files if f.endswith('_content_list.json')]
-            if content_list_files:
-                content_list_path = os.path.join(output_dir, content_list_files[0])
-                logger.info(f"Using alternative content list file: {content_list_files[0]}")
-        
-        if os.path.exists(content_list_path):
-            with open(content_list_path, 'r', encoding='utf-8') as f:
-                content_list = f.read()
-        else:
-            content_list = "{}"
-            logger.warning(f"Content list file not found: {content_list_path}")
-        
-        # 读取中间JSON
-        middle_json_path = os.path.join(output_dir, f"{base_name}_middle.json")
-        if not os.path.exists(middle_json_path):
-            # 尝试查找任何_middle.json文件
-            middle_json_files = [f for f in all_files if f.endswith('_middle.json')]
-            if middle_json_files:
-                middle_json_path = os.path.join(output_dir, middle_json_files[0])
-                logger.info(f"Using alternative middle json file: {middle_json_files[0]}")
-        
-        if os.path.exists(middle_json_path):
-            with open(middle_json_path, 'r', encoding='utf-8') as f:
-                middle_json = f.read()
-        else:
-            middle_json = "{}"
-            logger.warning(f"Middle JSON file not found: {middle_json_path}")
-        
-        # 4. 返回结果
-        response = {
+        # 3. 只读取请求的输出文件，工作进程返回了各文件的确切路径；
+        # JSON 文件按字节读入并原样嵌入响应（输出目录随后被清理，不能边读边发送）
+        fields = {
             "status": "completed",
             "processing_time": processing_time,
-            "markdown": markdown_content,
-            "content_list": content_list,
-            "middle_json": middle_json
+            "page_count": result.get("page_count"),
+            "ocr_pages": result.get("ocr_pages"),
+            "preflight": report
         }
+        raw_json = {}
+        for output in outputs:
+            path = result.get(f"{output}_path")
+            if not path or not os.path.exists(path):
+                if output == "markdown":
+                    raise HTTPException(status_code=500, detail="Markdown file not generated")
+                logger.warning(f"{output} file not found for task {task_id}")
+                raw_json[output] = empty_json(output)
+            elif output == "markdown":
+                fields["markdown"] = read_text(path)
+            else:
+                with open(path, "rb") as f:
+                    raw_json[output] = f.read()
         
-        return JSONResponse(content=response)
+        return envelope_response(request, fields, raw_json, format=format)
         
-    except subprocess.TimeoutExpired:
-        logger.error(f"PDF processing timeout after {PROCESS_TIMEOUT} seconds")
+    except HTTPException:
+        raise
+    except JobAborted as e:
+        metrics.record_task("failed", ocr)
+        logger.warning(f"PDF processing aborted for task {task_id}: {str(e)}")
+        raise HTTPException(status_code=499, detail=str(e))
+    except (asyncio.TimeoutError, TimeoutError):
+        metrics.record_task("failed", ocr)
+        logger.error(f"PDF processing timeout after {timeout:.0f} seconds")
         raise HTTPException(
             status_code=500,
-            detail=f"PDF processing timeout after {PROCESS_TIMEOUT} seconds"
+            detail=f"PDF processing timeout after {timeout:.0f} seconds"
         )
     except Exception as e:
+        metrics.record_task("failed", ocr)
         logger.error(f"Error processing PDF: {str(e)}", exc_info=True)
         raise HTTPException(
             status_code=500,
@@ -1048,6 +1600,8 @@ sys.exit(0)
         )
     finally:
         # 5. 清理临时文件
+        if upload is not None:
+            upload.close()
         if task_id:
             try:
                 # 删除上传目录
@@ -1055,13 +1609,8 @@ sys.exit(0)
                 if os.path.exists(upload_dir):
                     shutil.rmtree(upload_dir, ignore_errors=True)
                 
-                # 删除处理脚本
-                script_path = os.path.join("/data/uploads", f"{task_id}_process.py")
-                if os.path.exists(script_path):
-                    os.remove(script_path)
-                
                 # 删除结果目录
-                result_dir = f"/data/results/{task_id}"
+                result_dir = os.path.join(RESULTS_DIR, task_id)
                 if os.path.exists(result_dir):
                     shutil.rmtree(result_dir, ignore_errors=True)
                 
@@ -1069,37 +1618,33 @@ sys.exit(0)
             except Exception as e:
                 logger.error(f"Error cleaning up temporary files: {str(e)}")
 
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {**result_cache.stats(), "page_cache": metrics.page_cache_stats()}
+
 @app.get("/gpu_status")
 async def gpu_status():
-    try:
-        # 检查NVIDIA驱动是否可用
-        result = subprocess.run(
-            ["nvidia-smi"], 
-            capture_output=True, 
-            text=True
-        )
-        
-        if result.returncode == 0:
-            # 检查PyTorch是否可以使用CUDA
-            import torch
-            cuda_available = torch.cuda.is_available()
-            device_count = torch.cuda.device_count() if cuda_available else 0
-            device_names = [torch.cuda.get_device_name(i) for i in range(device_count)] if cuda_available else []
-            
-            return {
-                "nvidia_smi": result.stdout,
-                "cuda_available": cuda_available,
-                "device_count": device_count,
-                "device_names": device_names,
-                "torch_version": torch.__version__
-            }
-        else:
-            return {
-                "error": "NVIDIA driver not available",
-                "details": result.stderr
-            }
-    except Exception as e:
+    """返回后台最近一次采样的 GPU 状态，sampled_at 为采样时间"""
+    snapshot = device_monitor.snapshot()
+    if snapshot["gpu_available"]:
         return {
-            "error": "Error checking GPU status",
-            "details": str(e)
+            "nvidia_smi": snapshot["nvidia_smi"],
+            "gpus": snapshot.get("gpus", []),
+            "cuda_available": snapshot["cuda_available"],
+            "device_count": snapshot["device_count"],
+            "device_names": snapshot["device_names"],
+            "torch_version": snapshot["torch_version"],
+            "sampled_at": snapshot["sampled_at"]
         }
+    return {
+        "error": snapshot["error"],
+        "details": snapshot.get("details"),
+        "cuda_available": snapshot.get("cuda_available", False),
+        "torch_version": snapshot.get("torch_version"),
+        "sampled_at": snapshot["sampled_at"]
+    }
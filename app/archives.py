@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# 文件名: app/archives.py
+"""
+批量上传的压缩包解包 - 从 zip / tar(.gz) 中取出 PDF 文件
+"""
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, List
+
+from preflight import MAX_FILE_BYTES
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+# 单个压缩包解出的 PDF 总大小上限（0 表示不限制）；单个 PDF 的上限与预检一致（MINERU_MAX_FILE_MB）
+ARCHIVE_MAX_BYTES = int(os.environ.get("MINERU_ARCHIVE_MAX_MB", "4096")) * 1024 * 1024
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class ArchiveTooLarge(Exception):
+    """解压后的内容超过上限（压缩炸弹），已解出的文件由调用方清理"""
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def unique_path(directory: str, filename: str) -> str:
+    """去掉路径部分，重名时追加序号"""
+    filename = os.path.basename(filename) or "document.pdf"
+    stem, suffix = os.path.splitext(filename)
+    path = os.path.join(directory, filename)
+    index = 1
+    while os.path.exists(path):
+        path = os.path.join(directory, f"{stem}_{index}{suffix}")
+        index += 1
+    return path
+
+
+def extract_pdfs(archive_path: str, target_dir: str, max_total: int = ARCHIVE_MAX_BYTES) -> List[str]:
+    """
+    解出压缩包内所有 .pdf 文件到 target_dir（不保留目录结构），返回文件路径；
+    按实际解出的字节数检查上限（条目头中的大小可以伪造），超过时抛出 ArchiveTooLarge
+    """
+    paths = []
+    written = 0
+    if archive_path.lower().endswith(".zip"):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+                    continue
+                path = unique_path(target_dir, info.filename)
+                with archive.open(info) as src:
+                    written = _copy_limited(src, path, written, max_total)
+                paths.append(path)
+    else:
+        with tarfile.open(archive_path) as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(".pdf"):
+                    continue
+                path = unique_path(target_dir, member.name)
+                with archive.extractfile(member) as src:
+                    written = _copy_limited(src, path, written, max_total)
+                paths.append(path)
+    return paths
+
+
+def _copy_limited(src: BinaryIO, path: str, written: int, max_total: int) -> int:
+    """边解压边计数，超过单文件或总量上限时删除当前文件并抛出 ArchiveTooLarge；返回累计字节数"""
+    size = 0
+    try:
+        with open(path, "wb") as dst:
+            while True:
+                chunk = src.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if MAX_FILE_BYTES and size > MAX_FILE_BYTES:
+                    raise ArchiveTooLarge(
+                        f"{os.path.basename(path)} exceeds {MAX_FILE_BYTES} bytes when extracted")
+                if max_total and written + size > max_total:
+                    raise ArchiveTooLarge(f"Archive exceeds {max_total} bytes when extracted")
+                dst.write(chunk)
+    except ArchiveTooLarge:
+        os.remove(path)
+        raise
+    return written + size
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# 文件名: app/device_monitor.py
+"""
+设备状态采样 - 后台线程按固定间隔运行 nvidia-smi 并缓存结果，
+/health 与 /gpu_status 直接读取内存中的最近一次采样，不再每次请求都 fork 子进程
+
+torch 的 CUDA 信息只在第一次采样时读取一次（同样在后台线程中），
+没有 nvidia-smi 或 torch 的纯 CPU 主机上对应字段为空，不影响接口返回
+"""
+import os
+import shutil
+import logging
+import threading
+import subprocess
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("mineru-api")
+
+# 采样间隔（秒）与单次 nvidia-smi 超时
+DEVICE_SAMPLE_INTERVAL = float(os.environ.get("MINERU_DEVICE_SAMPLE_INTERVAL", "30"))
+NVIDIA_SMI_TIMEOUT = 5
+
+GPU_QUERY_FIELDS = ["index", "name", "memory.used", "memory.total", "utilization.gpu", "temperature.gpu"]
+
+
+def _run_nvidia_smi(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(["nvidia-smi", *args], capture_output=True, text=True, timeout=NVIDIA_SMI_TIMEOUT)
+
+
+def _parse_gpus(csv_text: str) -> List[Dict[str, Any]]:
+    """解析 --query-gpu 的 csv 输出，数值字段转为 int，N/A 等保留为 None"""
+    gpus = []
+    for line in csv_text.strip().splitlines():
+        values = [value.strip() for value in line.split(",")]
+        if len(values) != len(GPU_QUERY_FIELDS):
+            continue
+        gpu: Dict[str, Any] = {}
+        for field, value in zip(GPU_QUERY_FIELDS, values):
+            key = field.replace(".", "_")
+            if field == "name":
+                gpu[key] = value
+            else:
+                try:
+                    gpu[key] = int(float(value))
+                except ValueError:
+                    gpu[key] = None
+        gpus.append(gpu)
+    return gpus
+
+
+def _torch_info() -> Dict[str, Any]:
+    try:
+        import torch
+    except ImportError:
+        return {"cuda_available": False, "device_count": 0, "device_names": [], "torch_version": None}
+    cuda_available = torch.cuda.is_available()
+    device_count = torch.cuda.device_count() if cuda_available else 0
+    return {
+        "cuda_available": cuda_available,
+        "device_count": device_count,
+        "device_names": [torch.cuda.get_device_name(i) for i in range(device_count)],
+        "torch_version": torch.__version__,
+    }
+
+
+class DeviceMonitor:
+    """后台采样线程，snapshot() 返回最近一次结果"""
+
+    def __init__(self, interval: float = DEVICE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._torch: Optional[Dict[str, Any]] = None
+        self._snapshot: Dict[str, Any] = {
+            "gpu_available": False,
+            "error": "Device status not sampled yet",
+            "sampled_at": None,
+        }
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="mineru-device-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while True:
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Device sampling failed: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+    def sample(self) -> Dict[str, Any]:
+        """采样一次并更新缓存"""
+        if self._torch is None:
+            try:
+                self._torch = _torch_info()
+            except Exception as e:
+                logger.warning(f"Failed to read torch CUDA info: {e}")
+                self._torch = {"cuda_available": False, "device_count": 0, "device_names": [],
+                               "torch_version": None}
+
+        snapshot: Dict[str, Any] = {"gpu_available": False, **self._torch}
+        if shutil.which("nvidia-smi") is None:
+            snapshot["error"] = "nvidia-smi not found (CPU-only host)"
+        else:
+            try:
+                result = _run_nvidia_smi()
+                if result.returncode == 0:
+                    snapshot["gpu_available"] = True
+                    snapshot["nvidia_smi"] = result.stdout
+                    query = _run_nvidia_smi(f"--query-gpu={','.join(GPU_QUERY_FIELDS)}",
+                                            "--format=csv,noheader,nounits")
+                    snapshot["gpus"] = _parse_gpus(query.stdout) if query.returncode == 0 else []
+                else:
+                    snapshot["error"] = "NVIDIA driver not available"
+                    snapshot["details"] = result.stderr
+            except (OSError, subprocess.TimeoutExpired) as e:
+                snapshot["error"] = "Error checking GPU status"
+                snapshot["details"] = str(e)
+        snapshot["sampled_at"] = datetime.now().isoformat()
+
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._snapshot)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# 文件名: app/image_store.py
+"""
+图片输出控制 - 替代 FileBasedDataWriter 接收 pipe_*_mode 裁剪出的图片/表格图：
+
+    none      不输出图片，markdown 中去掉图片引用（不再渲染裁剪区域）
+    refs      只保留引用，不写图片文件（不再渲染裁剪区域）
+    original  原样保存 magic_pdf 输出的 JPEG
+    webp/jpeg 按最长边缩放后重新编码
+
+写出的图片按内容哈希命名并保存在共享目录中，文档输出目录下只是硬链接，
+同一文档内、不同文档间相同的图片（徽标、信头等）只编码和存储一次
+"""
+import io
+import os
+import re
+import time
+import shutil
+import hashlib
+import inspect
+import threading
+from typing import Dict, Optional
+
+IMAGES_NONE = "none"
+IMAGES_REFS = "refs"
+IMAGES_ORIGINAL = "original"
+IMAGE_MODES = (IMAGES_NONE, IMAGES_REFS, IMAGES_ORIGINAL, "webp", "jpeg")
+
+IMAGE_STORE_DIR = os.environ.get("MINERU_IMAGE_STORE_DIR", "/data/images")
+# 重新编码时的默认最长边（像素）与质量
+IMAGE_MAX_SIDE = int(os.environ.get("MINERU_IMAGE_MAX_SIDE", "1600"))
+IMAGE_QUALITY = int(os.environ.get("MINERU_IMAGE_QUALITY", "80"))
+
+# magic_pdf 以页码 + bbox 的 SHA-256 命名裁剪图
+_MAGIC_IMAGE_NAME = re.compile(r"[0-9a-f]{64}\.jpg")
+
+
+class _BlankPixmap:
+    def tobytes(self, *args, **kwargs) -> bytes:
+        return b""
+
+
+class _BlankPage:
+    """不渲染的页面替身，cut_image 仍按原逻辑生成图片名"""
+
+    def get_pixmap(self, *args, **kwargs) -> _BlankPixmap:
+        return _BlankPixmap()
+
+
+_patch_lock = threading.Lock()
+
+
+def _patch_cut_image():
+    """
+    none / refs 模式下跳过裁剪区域的渲染与 JPEG 编码；
+    magic_pdf 版本的 cut_image 签名不符合预期时不打补丁，由 ImageWriter 丢弃数据
+    """
+    try:
+        import magic_pdf.pre_proc.cut_image as cut_module
+    except ImportError:
+        return
+    with _patch_lock:
+        original = getattr(cut_module, "cut_image", None)
+        if original is None or getattr(original, "_skips_render", False):
+            return
+        parameters = list(inspect.signature(original).parameters)
+        if "page" not in parameters or "imageWriter" not in parameters:
+            print(f"cut_image 签名不支持跳过渲染: {parameters}")
+            return
+        signature = inspect.signature(original)
+
+        def cut_image(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            if getattr(bound.arguments.get("imageWriter"), "render", True):
+                return original(*args, **kwargs)
+            bound.arguments["page"] = _BlankPage()
+            return original(*bound.args, **bound.kwargs)
+
+        cut_image._skips_render = True
+        cut_module.cut_image = cut_image
+
+
+class ImageWriter:
+    """
+    与 magic_pdf DataWriter 接口一致（write / write_string），
+    mapping 记录 magic_pdf 的图片名 -> 实际输出的文件名（none/refs 模式为空）
+    """
+
+    def __init__(self, images_dir: str, mode: str = IMAGES_ORIGINAL, max_side: Optional[int] = None,
+                 store_dir: str = IMAGE_STORE_DIR):
+        if mode not in IMAGE_MODES:
+            raise ValueError(f"images must be one of {', '.join(IMAGE_MODES)}")
+        self.images_dir = images_dir
+        self.mode = mode
+        self.max_side = max_side if max_side and max_side > 0 else IMAGE_MAX_SIDE
+        self.store_dir = store_dir
+        self.mapping: Dict[str, str] = {}
+        self.render = mode not in (IMAGES_NONE, IMAGES_REFS)
+        if not self.render:
+            _patch_cut_image()
+
+    def _encode(self, data: bytes) -> bytes:
+        if self.mode == IMAGES_ORIGINAL:
+            return data
+        from PIL import Image
+
+        with Image.open(io.BytesIO(data)) as image:
+            image = image.convert("RGB")
+            image.thumbnail((self.max_side, self.max_side))
+            buffer = io.BytesIO()
+            image.save(buffer, format=self.mode.upper(), quality=IMAGE_QUALITY)
+            return buffer.getvalue()
+
+    def _stored_path(self, data: bytes) -> str:
+        """按原始图片内容与输出参数定位共享目录中的文件，不存在时编码写入"""
+        ext = "jpg" if self.mode in (IMAGES_ORIGINAL, "jpeg") else self.mode
+        params = "" if self.mode == IMAGES_ORIGINAL else f":{self.mode}:{self.max_side}:{IMAGE_QUALITY}"
+        digest = hashlib.sha256(data + params.encode("utf-8")).hexdigest()
+        path = os.path.join(self.store_dir, digest[:2], f"{digest}.{ext}")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(self._encode(data))
+            os.replace(tmp_path, path)
+        return path
+
+    def write(self, path: str, data: bytes) -> None:
+        if not self.render:
+            return
+        name = os.path.basename(path)
+        if name in self.mapping:
+            return
+        stored = self._stored_path(data)
+        filename = os.path.basename(stored)
+        target = os.path.join(self.images_dir, filename)
+        if not os.path.exists(target):
+            os.makedirs(self.images_dir, exist_ok=True)
+            try:
+                _link(stored, target)
+            except FileNotFoundError:
+                # prune_store 在检查之后删除了共享文件：重新写入（新文件不会被按时间清理）再链接
+                _link(self._stored_path(data), target)
+        self.mapping[name] = filename
+
+    def write_string(self, path: str, data: str) -> None:
+        self.write(path, data.encode("utf-8"))
+
+    def rewrite_refs(self, markdown_path: str, json_paths):
+        """dump 之后把 markdown / content_list / middle_json 中的图片名替换为实际文件名"""
+        if self.mode == IMAGES_REFS:
+            return
+        if self.mode == IMAGES_NONE:
+            markdown_pattern = re.compile(r"!\[[^\]]*\]\([^)]*" + _MAGIC_IMAGE_NAME.pattern + r"\)\n*")
+            _rewrite(markdown_path, lambda text: markdown_pattern.sub("", text))
+            for path in json_paths:
+                _rewrite(path, lambda text: re.sub(r'"(images/)?' + _MAGIC_IMAGE_NAME.pattern + '"', '""', text))
+            return
+        if not self.mapping:
+            return
+
+        def replace(text: str) -> str:
+            return _MAGIC_IMAGE_NAME.sub(lambda m: self.mapping.get(m.group(0), m.group(0)), text)
+
+        for path in [markdown_path, *json_paths]:
+            _rewrite(path, replace)
+
+
+def _link(source: str, target: str):
+    try:
+        os.link(source, target)
+    except FileExistsError:
+        pass
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _rewrite(path: Optional[str], transform):
+    if not path or not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    updated = transform(text)
+    if updated != text:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(updated)
+
+
+def prune_store(max_age_hours: float, store_dir: str = IMAGE_STORE_DIR) -> int:
+    """删除已没有结果目录引用（硬链接数为 1）且超过保留时间的图片，返回删除数量"""
+    if not os.path.isdir(store_dir):
+        return 0
+    cutoff = time.time() - max_age_hours * 3600
+    removed = 0
+    for prefix in os.listdir(store_dir):
+        prefix_dir = os.path.join(store_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for filename in os.listdir(prefix_dir):
+            path = os.path.join(prefix_dir, filename)
+            try:
+                stat = os.stat(path)
+                if stat.st_nlink <= 1 and stat.st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+    return removed
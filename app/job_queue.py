@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# 文件名: app/job_queue.py
+"""
+有界优先级任务队列 - 超过最大深度时拒绝入队（由 API 返回 503 + Retry-After），
+同步接口的交互任务优先于批量异步任务，同一优先级内按来源轮询保证公平
+"""
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional
+
+# 优先级：数值越小越先执行
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+QUEUE_MAX_DEPTH = int(os.environ.get("MINERU_QUEUE_MAX_DEPTH", "256"))
+# 两类任务都在排队时，每执行多少个交互任务穿插一个批量任务，避免批量任务饿死
+INTERACTIVE_WEIGHT = int(os.environ.get("MINERU_INTERACTIVE_WEIGHT", "4"))
+
+
+class QueueFull(Exception):
+    """队列已满，调用方应稍后重试"""
+
+    def __init__(self, depth: int, retry_after: int = 1):
+        super().__init__(f"Job queue is full ({depth} jobs waiting)")
+        self.depth = depth
+        self.retry_after = retry_after
+
+
+class QueuedJob:
+    """队列中的一个任务"""
+
+    __slots__ = ("job", "timeout", "future", "priority", "group", "job_id", "on_start", "on_progress",
+                 "enqueued_at")
+
+    def __init__(self, job: Dict[str, Any], timeout: Optional[float], future, priority: int = PRIORITY_BULK,
+                 group: str = "default", job_id: Optional[str] = None,
+                 on_start: Optional[Callable[[], None]] = None,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.job = job
+        self.timeout = timeout
+        self.future = future
+        self.priority = priority
+        self.group = group
+        self.job_id = job_id
+        self.on_start = on_start
+        self.on_progress = on_progress
+        self.enqueued_at = time.time()
+
+
+class JobQueue:
+    """线程安全的有界优先级队列"""
+
+    def __init__(self, max_depth: int = QUEUE_MAX_DEPTH, interactive_weight: int = INTERACTIVE_WEIGHT):
+        self.max_depth = max_depth
+        self.interactive_weight = max(1, interactive_weight)
+        self._cond = threading.Condition()
+        # priority -> {group -> deque[QueuedJob]}，group 之间轮询
+        self._lanes: Dict[int, "OrderedDict[str, deque]"] = {
+            PRIORITY_INTERACTIVE: OrderedDict(),
+            PRIORITY_BULK: OrderedDict(),
+        }
+        self._depth = 0
+        self._interactive_streak = 0
+        self._closed = False
+
+    def __len__(self) -> int:
+        return self._depth
+
+    @property
+    def accepting(self) -> bool:
+        """未关闭且还有空位"""
+        return not self._closed and self._depth < self.max_depth
+
+    def put_many(self, entries: List[QueuedJob]):
+        """原子地入队多个任务（例如同一文档的所有分片），容量不足时全部拒绝"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Job queue is closed")
+            if self._depth + len(entries) > self.max_depth:
+                raise QueueFull(self._depth)
+            for entry in entries:
+                lane = self._lanes.setdefault(entry.priority, OrderedDict())
+                lane.setdefault(entry.group, deque()).append(entry)
+            self._depth += len(entries)
+            self._cond.notify(len(entries))
+
+    def put(self, entry: QueuedJob):
+        self.put_many([entry])
+
+    def _pop_lane(self, priority: int) -> Optional[QueuedJob]:
+        lane = self._lanes.get(priority)
+        if not lane:
+            return None
+        # 取队首来源的一个任务，然后把该来源移到末尾
+        group, jobs = next(iter(lane.items()))
+        entry = jobs.popleft()
+        if jobs:
+            lane.move_to_end(group)
+        else:
+            del lane[group]
+        return entry
+
+    def _pop(self) -> Optional[QueuedJob]:
+        has_interactive = bool(self._lanes[PRIORITY_INTERACTIVE])
+        has_bulk = bool(self._lanes[PRIORITY_BULK])
+        if has_interactive and (not has_bulk or self._interactive_streak < self.interactive_weight):
+            self._interactive_streak += 1
+            return self._pop_lane(PRIORITY_INTERACTIVE)
+        # 轮到批量任务（或只有批量任务）
+        self._interactive_streak = 0
+        for priority in sorted(self._lanes, reverse=has_interactive):
+            entry = self._pop_lane(priority)
+            if entry is not None:
+                return entry
+        return None
+
+    def get(self, on_take: Optional[Callable[[QueuedJob], None]] = None) -> Optional[QueuedJob]:
+        """
+        阻塞直到有任务；队列关闭后返回 None
+
+        on_take 在持有队列锁时对取出的任务调用，取出与登记之间不会出现任务既不在队列、
+        也不在执行方的窗口（中止与 position 查询都能看到它）
+        """
+        with self._cond:
+            while not self._closed and self._depth == 0:
+                self._cond.wait()
+            if self._closed:
+                return None
+            entry = self._pop()
+            self._depth -= 1
+            if on_take is not None:
+                on_take(entry)
+            return entry
+
+    def get_more(self, accept: Callable[[QueuedJob], bool], wait: float,
+                 on_take: Optional[Callable[[QueuedJob], None]] = None) -> Optional[QueuedJob]:
+        """
+        凑批用：最多等待 wait 秒取下一个任务，accept 不接受时放回队首并返回 None；
+        超时或队列关闭同样返回 None；on_take 同 get
+        """
+        deadline = time.time() + max(0.0, wait)
+        with self._cond:
+            while not self._closed and self._depth == 0:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self._closed:
+                return None
+            streak = self._interactive_streak
+            entry = self._pop()
+            if not accept(entry):
+                lane = self._lanes[entry.priority]
+                lane.setdefault(entry.group, deque()).appendleft(entry)
+                lane.move_to_end(entry.group, last=False)
+                self._interactive_streak = streak
+                return None
+            self._depth -= 1
+            if on_take is not None:
+                on_take(entry)
+            return entry
+
+    def cancel(self, job_id: str) -> int:
+        """移除并取消某个 job_id 的所有排队任务，返回取消的数量"""
+        cancelled = 0
+        with self._cond:
+            for lane in self._lanes.values():
+                for group in list(lane):
+                    jobs = lane[group]
+                    kept = deque(entry for entry in jobs if entry.job_id != job_id)
+                    for entry in jobs:
+                        if entry.job_id == job_id:
+                            entry.future.cancel()
+                            cancelled += 1
+                    if kept:
+                        lane[group] = kept
+                    else:
+                        del lane[group]
+            self._depth -= cancelled
+        return cancelled
+
+    def position(self, job_id: str) -> Optional[int]:
+        """任务在队列中的大致位置（从 1 开始），不在队列中返回 None"""
+        with self._cond:
+            ahead = 0
+            for priority in sorted(self._lanes):
+                entries = sorted(
+                    (entry for jobs in self._lanes[priority].values() for entry in jobs),
+                    key=lambda entry: entry.enqueued_at
+                )
+                for entry in entries:
+                    ahead += 1
+                    if entry.job_id == job_id:
+                        return ahead
+            return None
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "depth": self._depth,
+                "max_depth": self.max_depth,
+                "interactive": sum(len(jobs) for jobs in self._lanes[PRIORITY_INTERACTIVE].values()),
+                "bulk": sum(len(jobs) for jobs in self._lanes[PRIORITY_BULK].values()),
+            }
+
+    def close(self):
+        """关闭队列，取消所有尚未开始的任务"""
+        with self._cond:
+            self._closed = True
+            for lane in self._lanes.values():
+                for jobs in lane.values():
+                    for entry in jobs:
+                        entry.future.cancel()
+                lane.clear()
+            self._depth = 0
+            self._cond.notify_all()
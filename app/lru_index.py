@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# 文件名: app/lru_index.py
+"""
+磁盘缓存的 LRU 索引 - 记录每个条目的大小与最近使用顺序、命中统计，
+超过容量时给出应淘汰的条目；条目文件的读写与删除由各缓存自己负责
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def scan_entries(cache_dir: str,
+                 inspect: Callable[[str, str], Optional[Tuple[float, str, int]]]) -> List[Tuple[float, str, int]]:
+    """
+    扫描 cache_dir/<前缀>/ 下的条目，inspect(前缀目录, 文件名) 返回 (mtime, key, size)，
+    不是缓存条目时返回 None；临时文件（以 . 开头）直接跳过
+    """
+    found = []
+    for prefix in os.listdir(cache_dir):
+        prefix_dir = os.path.join(cache_dir, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            if name.startswith("."):
+                continue
+            entry = inspect(prefix_dir, name)
+            if entry is not None:
+                found.append(entry)
+    return found
+
+
+class LRUIndex:
+    """线程安全的 LRU 索引，key -> 条目大小，按最近使用排序（末尾最新）"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def load(self, found: Iterable[Tuple[float, str, int]]):
+        """按 mtime 恢复 LRU 顺序，found 为 scan_entries 的结果"""
+        with self._lock:
+            for _, key, size in sorted(found):
+                self.total_bytes -= self._entries.pop(key, 0)
+                self._entries[key] = size
+                self.total_bytes += size
+
+    def touch(self, key: str, size: Callable[[], int]):
+        """标记为最近使用；索引中没有的条目（其他进程写入的）用 size() 补上"""
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = size()
+                self.total_bytes += self._entries[key]
+            self._entries.move_to_end(key)
+
+    def hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def add(self, key: str, size: int) -> List[str]:
+        """记录新写入（或覆盖）的条目，返回超过容量后应删除的最久未用条目"""
+        with self._lock:
+            self.total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.total_bytes += size
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self.total_bytes -= old_size
+                self.evictions += 1
+                evicted.append(old_key)
+        return evicted
+
+    def remove(self, key: str):
+        with self._lock:
+            self.total_bytes -= self._entries.pop(key, 0)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "size_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# 文件名: app/metrics.py
+"""
+Prometheus 指标 - 上传、排队、模型加载及解析各阶段耗时，任务计数与吞吐
+
+各阶段耗时在工作进程内测量，随解析结果的 timings 字段带回父进程后在这里记录
+"""
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+# 解析单个阶段从毫秒级到十几分钟不等
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+# 吞吐统计的滑动窗口（秒）
+THROUGHPUT_WINDOW = 60
+
+UPLOAD_SECONDS = Histogram(
+    "mineru_upload_seconds", "Time spent receiving and storing an upload",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "mineru_queue_wait_seconds", "Time a job waited in the queue before a worker took it",
+    ["priority"], buckets=STAGE_BUCKETS,
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "mineru_model_load_seconds", "Time a worker process spent loading models at startup",
+    buckets=(1, 5, 10, 30, 60, 120, 300, 600),
+)
+STAGE_SECONDS = Histogram(
+    "mineru_stage_seconds", "Time spent in each pipeline stage per document (or shard)",
+    ["stage"], buckets=STAGE_BUCKETS,
+)
+TASKS_TOTAL = Counter(
+    "mineru_tasks_total", "Finished tasks by status and requested OCR mode (true/false/auto)", ["status", "ocr"],
+)
+PAGES_TOTAL = Counter("mineru_pages_processed_total", "Pages parsed by the workers")
+PAGES_PER_SECOND = Gauge(
+    "mineru_pages_per_second", f"Pages parsed per second over the last {THROUGHPUT_WINDOW}s",
+)
+PAGE_CACHE_HITS = Counter("mineru_page_cache_hits_total", "Pages whose model output was served from the page cache")
+PAGE_CACHE_MISSES = Counter("mineru_page_cache_misses_total", "Pages that missed the page cache and ran inference")
+PAGE_CACHE_HIT_RATIO = Gauge("mineru_page_cache_hit_ratio", "Page cache hit ratio since startup")
+JOB_TIMEOUT_SECONDS = Histogram(
+    "mineru_job_timeout_seconds", "Hard timeout assigned to each job (base + per-page budget)",
+    buckets=(60, 120, 300, 600, 900, 1200, 1800, 2700, 3600, 7200),
+)
+JOB_KILLS_TOTAL = Counter(
+    "mineru_job_kills_total", "Worker process groups killed mid-job, by reason (timeout/aborted)", ["reason"],
+)
+PREFLIGHT_REJECTIONS = Counter(
+    "mineru_preflight_rejections_total", "Uploads rejected by the pre-flight PDF inspection, by HTTP status",
+    ["status"],
+)
+QUEUE_DEPTH = Gauge("mineru_queue_depth", "Jobs waiting in the worker pool queue")
+BUSY_WORKERS = Gauge("mineru_busy_workers", "Worker processes currently parsing")
+
+_pages_lock = threading.Lock()
+_recent_pages: deque = deque()  # (timestamp, pages)
+# 页级缓存在各工作进程内，命中数随结果带回后在这里累计
+_page_cache_counts = {"hits": 0, "misses": 0}
+
+
+def _pages_per_second() -> float:
+    cutoff = time.time() - THROUGHPUT_WINDOW
+    with _pages_lock:
+        while _recent_pages and _recent_pages[0][0] < cutoff:
+            _recent_pages.popleft()
+        return sum(pages for _, pages in _recent_pages) / THROUGHPUT_WINDOW
+
+
+PAGES_PER_SECOND.set_function(_pages_per_second)
+
+
+def page_cache_stats() -> Dict[str, Any]:
+    with _pages_lock:
+        hits, misses = _page_cache_counts["hits"], _page_cache_counts["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+PAGE_CACHE_HIT_RATIO.set_function(lambda: page_cache_stats()["hit_rate"])
+
+
+def bind_worker_pool(queue_depth: Callable[[], float], busy_workers: Callable[[], float]):
+    """队列深度与忙碌进程数在抓取时实时读取"""
+    QUEUE_DEPTH.set_function(queue_depth)
+    BUSY_WORKERS.set_function(busy_workers)
+
+
+def observe_result(result: Dict[str, Any]):
+    """记录一次解析结果携带的各阶段耗时、页数与页级缓存命中数"""
+    for stage, seconds in result.get("timings", {}).items():
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    page_cache = result.get("page_cache") or {}
+    if page_cache:
+        PAGE_CACHE_HITS.inc(page_cache.get("hits", 0))
+        PAGE_CACHE_MISSES.inc(page_cache.get("misses", 0))
+        with _pages_lock:
+            _page_cache_counts["hits"] += page_cache.get("hits", 0)
+            _page_cache_counts["misses"] += page_cache.get("misses", 0)
+    pages = result.get("page_count") or 0
+    if pages:
+        PAGES_TOTAL.inc(pages)
+        with _pages_lock:
+            _recent_pages.append((time.time(), pages))
+
+
+def record_task(status: str, ocr):
+    """ocr 为请求的模式：True / False / auto"""
+    label = ocr if isinstance(ocr, str) else str(bool(ocr)).lower()
+    TASKS_TOTAL.labels(status=status, ocr=label).inc()
+
+
+def render():
+    """返回 (body, content_type)"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# 文件名: app/page_cache.py
+"""
+页级推理缓存 - 以单页内容（内容流、图片、XObject、字体）的哈希加 ocr / formula / table 与模型配置为键，
+保存该页 doc_analyze 的输出（版面、OCR、公式、表格），不同文档中相同的页
+（封面、法律声明、附带条款等）不再重复推理
+
+每个工作进程各自维护 LRU 索引，磁盘目录共享，容量上限按单个进程的视角近似执行
+"""
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from lru_index import LRUIndex, scan_entries
+from result_cache import model_settings_fingerprint
+
+logger = logging.getLogger("mineru-api")
+
+PAGE_CACHE_DIR = os.environ.get("MINERU_PAGE_CACHE_DIR", "/data/cache/pages")
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("MINERU_PAGE_CACHE_MAX_MB", "1024")) * 1024 * 1024  # 0 表示关闭
+
+
+def font_digest(doc, font, memo: Optional[Dict[int, bytes]] = None) -> bytes:
+    """
+    字体的哈希：去掉子集前缀的名称、类型、编码、字体程序与 /ToUnicode 映射；
+    名称相同但字形或编码不同的字体（例如不同的子集）渲染和抽取出的文字不同，不能视为同一页。
+    memo 以 xref 缓存同一文档内已计算过的字体
+    """
+    xref = font[0]
+    if memo is not None and xref in memo:
+        return memo[xref]
+    hasher = hashlib.sha256()
+    hasher.update(repr((font[3].split("+")[-1], font[2], font[5])).encode("utf-8"))
+    hasher.update(doc.extract_font(xref)[3] or b"")
+    kind, value = doc.xref_get_key(xref, "ToUnicode")
+    if kind == "xref":
+        hasher.update(doc.xref_stream_raw(int(value.split()[0])) or b"")
+    digest = hasher.digest()
+    if memo is not None:
+        memo[xref] = digest
+    return digest
+
+
+def page_fingerprint(doc, page, font_memo: Optional[Dict[int, bytes]] = None) -> str:
+    """单页内容哈希，font_memo 见 font_digest"""
+    hasher = hashlib.sha256()
+    hasher.update(repr((tuple(page.rect), page.rotation)).encode("utf-8"))
+    hasher.update(page.read_contents())
+    for image in page.get_images(full=True):
+        hasher.update(doc.xref_stream_raw(image[0]) or b"")
+    for xobject in page.get_xobjects():
+        hasher.update(doc.xref_stream_raw(xobject[0]) or b"")
+    for font in page.get_fonts(full=True):
+        hasher.update(font_digest(doc, font, font_memo))
+    return hasher.hexdigest()
+
+
+def page_fingerprints(pdf_bytes: bytes) -> List[str]:
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        font_memo: Dict[int, bytes] = {}
+        return [page_fingerprint(doc, page, font_memo) for page in doc]
+
+
+def select_pages(pdf_bytes: bytes, pages: List[int]) -> bytes:
+    """取出指定页（从 0 开始）生成新的 PDF，用于只对未命中的页推理"""
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        doc.select(pages)
+        return doc.tobytes()
+
+
+class PageCache:
+    """基于本地磁盘的 LRU 页级缓存，每页一个 JSON 文件"""
+
+    def __init__(self, cache_dir: str = PAGE_CACHE_DIR, max_bytes: int = PAGE_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index = LRUIndex(max_bytes)
+        self._settings_fingerprint = model_settings_fingerprint()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """启动时扫描磁盘，按修改时间恢复 LRU 顺序"""
+        def inspect(prefix_dir: str, filename: str):
+            if not filename.endswith(".json"):
+                return None
+            stat = os.stat(os.path.join(prefix_dir, filename))
+            return stat.st_mtime, filename[:-len(".json")], stat.st_size
+
+        found = scan_entries(self.cache_dir, inspect)
+        self._index.load(found)
+        if found:
+            logger.info(f"Page cache loaded {len(found)} entries ({self._index.total_bytes} bytes)")
+
+    def make_key(self, fingerprint: str, ocr: bool, formula: bool = True, table: bool = True) -> str:
+        raw = f"{fingerprint}:{bool(ocr)}:{bool(formula)}:{bool(table)}:{self._settings_fingerprint}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """命中时返回该页的模型输出（layout_dets + page_info）"""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                page = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self._index.remove(key)
+            self._index.miss()
+            return None
+
+        # 索引中没有的是其他工作进程写入的条目
+        self._index.touch(key, lambda: os.path.getsize(path))
+        self._index.hit()
+        return page
+
+    def put(self, key: str, page: Dict[str, Any]):
+        path = self._entry_path(key)
+        tmp_path = os.path.join(os.path.dirname(path), f".{key}.{os.getpid()}.tmp")
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(page, f, ensure_ascii=False)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to cache page {key}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        evicted = self._index.add(key, size)
+        for old_key in evicted:
+            try:
+                os.remove(self._entry_path(old_key))
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        return self._index.stats()
+
+
+_page_cache: Optional[PageCache] = None
+
+
+def get_page_cache() -> PageCache:
+    """工作进程内的单例，首次使用时扫描磁盘"""
+    global _page_cache
+    if _page_cache is None:
+        _page_cache = PageCache()
+    return _page_cache
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# 文件名: app/page_router.py
+"""
+逐页路由 - 解析前用 PyMuPDF 快速检查每页的文字层（字符数、字体、图片覆盖率、乱码比例），
+只有确实需要的页走 OCR，其余页走 pipe_txt_mode
+"""
+import os
+from typing import Any, Dict, List, Tuple
+
+# 少于该字符数视为没有可用文字层
+MIN_TEXT_CHARS = int(os.environ.get("MINERU_ROUTE_MIN_CHARS", "50"))
+# 没有文字层且图片覆盖超过该比例的页需要 OCR（扫描页）
+IMAGE_COVERAGE = float(os.environ.get("MINERU_ROUTE_IMAGE_COVERAGE", "0.5"))
+# 文字层中乱码（替换字符、私用区字符）超过该比例同样走 OCR
+MAX_GARBLED_RATIO = float(os.environ.get("MINERU_ROUTE_MAX_GARBLED", "0.1"))
+# 夹在 OCR 页之间、短于该页数的文字页并入 OCR，避免切出过多小段
+MIN_TXT_RUN = int(os.environ.get("MINERU_ROUTE_MIN_TXT_RUN", "3"))
+
+
+def inspect_page(page) -> Dict[str, Any]:
+    """统计单页文字层与图片覆盖情况"""
+    text = page.get_text("text")
+    chars = [c for c in text if not c.isspace()]
+    garbled = sum(1 for c in chars if c == "\ufffd" or "\ue000" <= c <= "\uf8ff")
+
+    page_area = abs(page.rect) or 1.0
+    image_area = 0.0
+    for image in page.get_image_info():
+        bbox = page.rect & image["bbox"]
+        if not bbox.is_empty:
+            image_area += abs(bbox)
+
+    return {
+        "chars": len(chars),
+        "fonts": len(page.get_fonts()),
+        "image_coverage": min(1.0, image_area / page_area),
+        "garbled_ratio": garbled / len(chars) if chars else 0.0,
+    }
+
+
+def needs_ocr(stats: Dict[str, Any]) -> bool:
+    if stats["fonts"] == 0 or stats["chars"] < MIN_TEXT_CHARS:
+        # 没有文字层：大面积图片的是扫描页，近乎空白的页文字模式即可
+        return stats["image_coverage"] >= IMAGE_COVERAGE
+    return stats["garbled_ratio"] > MAX_GARBLED_RATIO
+
+
+def classify_pages(pdf_bytes: bytes) -> List[bool]:
+    """返回每页是否需要 OCR"""
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+        return [needs_ocr(inspect_page(page)) for page in doc]
+
+
+def plan_routes(decisions: List[bool], min_txt_run: int = MIN_TXT_RUN) -> List[Tuple[Tuple[int, int], bool]]:
+    """
+    把逐页决定合并成连续页段 [((start, end), ocr), ...]，页码从 0 开始且为闭区间
+
+    OCR 页之间过短的文字页段并入 OCR（OCR 也能正确处理文字页，只是更慢）
+    """
+    runs: List[List[Any]] = []
+    for index, ocr in enumerate(decisions):
+        if runs and runs[-1][2] == ocr:
+            runs[-1][1] = index
+        else:
+            runs.append([index, index, ocr])
+
+    for i, run in enumerate(runs):
+        between_ocr = 0 < i < len(runs) - 1
+        if not run[2] and between_ocr and run[1] - run[0] + 1 < min_txt_run:
+            run[2] = True
+
+    merged: List[Tuple[Tuple[int, int], bool]] = []
+    for start, end, ocr in runs:
+        if merged and merged[-1][1] == ocr:
+            merged[-1] = ((merged[-1][0][0], end), ocr)
+        else:
+            merged.append(((start, end), ocr))
+    return merged
@@ -0,0 +1,669 @@
+#!/usr/bin/env python3
+# 文件名: app/pipeline.py
+"""
+MinerU 解析流程 - PymuDocDataset -> doc_analyze -> pipe_ocr_mode/pipe_txt_mode -> dump
+
+可被常驻工作进程直接调用，也可作为命令行工具使用:
+    python pipeline.py input.pdf [more.pdf ...] -o /data/results/manual [--ocr auto|true|false]
+        [--no-formula] [--no-table] [--images none|refs|original|webp|jpeg] [--image-max-side N]
+        [--outputs markdown,content_list,middle_json]
+"""
+import os
+import sys
+import time
+import json
+import shutil
+import inspect
+import argparse
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple, Union, Any
+
+from image_store import IMAGES_ORIGINAL, IMAGE_MODES, ImageWriter
+
+# 跨文档批量推理时每批最多多少页，传给 magic_pdf 的 batch_doc_analyze
+INFER_BATCH_PAGES = int(os.environ.get("MINERU_INFER_BATCH_PAGES", "100"))
+# 逐页流式解析时每段的页数，1 时每个事件正好对应一页
+STREAM_WINDOW_PAGES = int(os.environ.get("MINERU_STREAM_WINDOW_PAGES", "1"))
+# 逐页结果写入输出目录下的该文件，每行一个事件
+PAGES_FILE = "pages.ndjson"
+# ocr 参数取该值时逐页判断是否需要 OCR
+OCR_AUTO = "auto"
+# 工作进程启动时预加载并预热的功能模型（formula,table,ocr 逗号分隔），其余在首个需要的任务到来时加载；
+# 默认与 API 的默认参数一致（formula=true、table=true、ocr=auto 需要文字与 OCR 两种模式）
+PRELOAD_FEATURES = [
+    f.strip() for f in os.environ.get("MINERU_PRELOAD_FEATURES", "formula,table,ocr").split(",") if f.strip()
+]
+
+# 可选的输出文件，outputs 参数为其中任意组合（默认全部）
+OUTPUTS = ("markdown", "content_list", "middle_json")
+
+# 本进程已加载的模型组合 (ocr, formula, table)
+_loaded_models = set()
+
+
+def ensure_models(ocr: bool, formula: bool = True, table: bool = True) -> float:
+    """
+    按需加载某个功能组合的模型，返回本次加载耗时（已加载过时为 0）
+
+    magic_pdf 按 (ocr, formula_enable, table_enable) 缓存 CustomPEKModel，
+    版面、OCR 等原子模型由 AtomModelSingleton 在各组合间共享，只有新启用的功能才真正加载
+    """
+    from magic_pdf.model.doc_analyze_by_custom_model import ModelSingleton
+
+    key = (bool(ocr), bool(formula), bool(table))
+    if key in _loaded_models:
+        return 0.0
+    start = time.time()
+    ModelSingleton().get_model(key[0], False, formula_enable=key[1], table_enable=key[2])
+    _loaded_models.add(key)
+    return time.time() - start
+
+
+def load_models(features: Optional[List[str]] = None):
+    """
+    启动时加载版面模型与 features 中列出的功能（formula / table / ocr，默认即 API 默认参数需要的全部），
+    未列出的功能由 ensure_models 在首个需要它的任务到来时加载
+    """
+    features = PRELOAD_FEATURES if features is None else features
+    formula, table = "formula" in features, "table" in features
+    ensure_models(False, formula, table)
+    if "ocr" in features:
+        ensure_models(True, formula, table)
+
+
+def _warmup_pdf() -> bytes:
+    """预热用的单页 PDF：一段文字加一个简单公式样式的行"""
+    import fitz
+
+    with fitz.open() as doc:
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 96), "MinerU warmup", fontsize=20)
+        page.insert_text((72, 140), "The quick brown fox jumps over the lazy dog.", fontsize=11)
+        page.insert_text((72, 170), "E = mc^2,  a^2 + b^2 = c^2", fontsize=11)
+        return doc.tobytes()
+
+
+def warmup(features: Optional[List[str]] = None) -> float:
+    """
+    在内置的单页 PDF 上跑一遍推理与版面还原，让 CUDA kernel、推理框架的懒初始化
+    在启动阶段完成，首个真实请求不再承担；不经过页级缓存，返回耗时
+    """
+    import tempfile
+    from magic_pdf.data.data_reader_writer import FileBasedDataWriter
+    from magic_pdf.data.dataset import PymuDocDataset
+    from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
+
+    features = PRELOAD_FEATURES if features is None else features
+    formula, table = "formula" in features, "table" in features
+    start = time.time()
+    ds = PymuDocDataset(_warmup_pdf())
+    with tempfile.TemporaryDirectory(prefix="mineru-warmup-") as tmp_dir:
+        writer = FileBasedDataWriter(tmp_dir)
+        for ocr in ([False, True] if "ocr" in features else [False]):
+            infer_result = ds.apply(doc_analyze, ocr=ocr, formula_enable=formula, table_enable=table)
+            pipe_result = infer_result.pipe_ocr_mode(writer) if ocr else infer_result.pipe_txt_mode(writer)
+            pipe_result.get_markdown("images")
+    return time.time() - start
+
+
+def result_paths(output_dir: str, name: str, outputs: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+    """返回某个文档各输出文件的路径，不在 outputs 中的为 None"""
+    paths = {
+        "markdown_path": os.path.join(output_dir, f"{name}.md"),
+        "content_list_path": os.path.join(output_dir, f"{name}_content_list.json"),
+        "middle_json_path": os.path.join(output_dir, f"{name}_middle.json"),
+    }
+    if outputs is None:
+        return paths
+    return {f"{output}_path": paths[f"{output}_path"] if output in outputs else None for output in OUTPUTS}
+
+
+class _StageTimer:
+    """记录各阶段耗时，随结果返回给父进程写入 Prometheus 指标"""
+
+    def __init__(self, timings: Dict[str, float], stage: str):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.time()
+
+    def __exit__(self, *exc):
+        self.timings[self.stage] = self.timings.get(self.stage, 0.0) + time.time() - self.start
+
+
+def _open_document(
+    file_path: str,
+    output_dir: str,
+    ocr: bool = True,
+    name: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+    images_dir: Optional[str] = None,
+    classify: bool = True,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_ORIGINAL,
+    image_max_side: Optional[int] = None,
+    outputs: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """读取 PDF、准备输出目录与 writer，并确定解析模式（classify=False 时不再用 ds.classify() 兜底）"""
+    from magic_pdf.data.data_reader_writer import FileBasedDataWriter, FileBasedDataReader
+    from magic_pdf.data.dataset import PymuDocDataset
+    from magic_pdf.config.enums import SupportedPdfParseMethod
+
+    start_time = time.time()
+    timings: Dict[str, float] = {}
+    if name is None:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+
+    # prepare env（图片目录在写入第一张图片时创建）
+    local_image_dir = images_dir or os.path.join(output_dir, "images")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # read bytes
+    with _StageTimer(timings, "read"):
+        if pdf_bytes is None:
+            pdf_bytes = FileBasedDataReader("").read(file_path)
+        if page_range is not None:
+            from sharding import extract_pages
+            pdf_bytes = extract_pages(pdf_bytes, page_range[0], page_range[1])
+
+        ## Create Dataset Instance
+        ds = PymuDocDataset(pdf_bytes)
+
+    if not ocr and classify:
+        with _StageTimer(timings, "classify"):
+            ocr = ds.classify() == SupportedPdfParseMethod.OCR
+
+    return {
+        "ds": ds,
+        "pdf_bytes": pdf_bytes,
+        "ocr": bool(ocr),
+        "formula": formula,
+        "table": table,
+        "timings": timings,
+        "image_writer": ImageWriter(local_image_dir, images, image_max_side),
+        "md_writer": FileBasedDataWriter(output_dir),
+        "paths": result_paths(output_dir, name, outputs),
+        "start_time": start_time,
+    }
+
+
+def _dump_document(doc: Dict[str, Any], infer_result) -> Dict[str, Any]:
+    """对推理结果做版面还原，只写出请求的 markdown / content_list / middle_json"""
+    image_dir = "images"
+    timings = doc["timings"]
+    if doc["ocr"]:
+        with _StageTimer(timings, "pipe_ocr_mode"):
+            pipe_result = infer_result.pipe_ocr_mode(doc["image_writer"])
+    else:
+        with _StageTimer(timings, "pipe_txt_mode"):
+            pipe_result = infer_result.pipe_txt_mode(doc["image_writer"])
+
+    ### dump markdown / content list / middle json
+    paths = dict(doc["paths"])
+    md_writer = doc["md_writer"]
+    if paths["markdown_path"]:
+        with _StageTimer(timings, "dump_md"):
+            pipe_result.dump_md(md_writer, os.path.basename(paths["markdown_path"]), image_dir)
+    if paths["content_list_path"]:
+        with _StageTimer(timings, "dump_content_list"):
+            pipe_result.dump_content_list(md_writer, os.path.basename(paths["content_list_path"]), image_dir)
+    if paths["middle_json_path"]:
+        with _StageTimer(timings, "dump_middle_json"):
+            pipe_result.dump_middle_json(md_writer, os.path.basename(paths["middle_json_path"]))
+    with _StageTimer(timings, "image_refs"):
+        doc["image_writer"].rewrite_refs(paths["markdown_path"],
+                                         [paths["content_list_path"], paths["middle_json_path"]])
+
+    paths["processing_time"] = time.time() - doc["start_time"]
+    paths["page_count"] = len(doc["ds"])
+    paths["ocr_pages"] = list(range(paths["page_count"])) if doc["ocr"] else []
+    paths["page_cache"] = doc.get("page_cache", {"hits": 0, "misses": 0})
+    paths["timings"] = timings
+    return paths
+
+
+def _analyze(docs: List[Dict[str, Any]], analyze: Callable[[list], list]) -> list:
+    """
+    带页级缓存的推理：先按页指纹查缓存，只把未命中的页组成新的 dataset 交给
+    analyze（datasets -> InferenceResult 列表），再按原页序拼回每个文档的完整结果
+
+    docs 的 ocr / formula / table 必须一致；需要推理时先按需加载对应模型。
+    doc_analyze 耗时按推理页数分摊到各文档，命中/未命中页数记在 doc["page_cache"]
+    """
+    from magic_pdf.data.dataset import PymuDocDataset
+    from page_cache import PAGE_CACHE_MAX_BYTES, get_page_cache, page_fingerprints, select_pages
+    try:
+        from magic_pdf.operators.models import InferenceResult
+    except ImportError:
+        from magic_pdf.model.operators import InferenceResult
+
+    ocr, formula, table = docs[0]["ocr"], docs[0]["formula"], docs[0]["table"]
+    cache = get_page_cache() if PAGE_CACHE_MAX_BYTES > 0 else None
+    plans = []  # (doc, 各页缓存键, 各页缓存内容, 未命中页)
+    datasets = []
+    for doc in docs:
+        page_count = len(doc["ds"])
+        keys, cached, missing = None, [None] * page_count, list(range(page_count))
+        if cache is not None:
+            with _StageTimer(doc["timings"], "page_cache"):
+                try:
+                    keys = [cache.make_key(fingerprint, ocr, formula, table) for fingerprint in page_fingerprints(doc["pdf_bytes"])]
+                except Exception as e:
+                    print(f"页指纹计算失败，跳过页级缓存: {e}")
+                if keys is not None:
+                    cached = [cache.get(key) for key in keys]
+                    missing = [index for index, page in enumerate(cached) if page is None]
+                    if missing and len(missing) < page_count:
+                        datasets.append(PymuDocDataset(select_pages(doc["pdf_bytes"], missing)))
+        if missing and len(missing) == page_count:
+            datasets.append(doc["ds"])
+        plans.append((doc, keys, cached, missing))
+
+    if datasets:
+        load_seconds = ensure_models(ocr, formula, table)
+        if load_seconds:
+            docs[0]["timings"]["model_load"] = load_seconds
+    analyze_start = time.time()
+    infer_results = iter(analyze(datasets) if datasets else [])
+    analyze_seconds = time.time() - analyze_start
+    total_missing = sum(len(missing) for _, _, _, missing in plans) or 1
+
+    outputs = []
+    for doc, keys, cached, missing in plans:
+        timings = doc["timings"]
+        if keys is not None:
+            doc["page_cache"] = {"hits": len(cached) - len(missing), "misses": len(missing)}
+        if not missing:
+            model_list = cached
+        else:
+            timings["doc_analyze"] = timings.get("doc_analyze", 0.0) + analyze_seconds * len(missing) / total_missing
+            infer_result = next(infer_results)
+            if keys is None:
+                outputs.append(infer_result)
+                continue
+            computed = infer_result.get_infer_res()
+            with _StageTimer(timings, "page_cache"):
+                # 在 pipe_*_mode 修改模型输出之前写入缓存
+                for index, page in zip(missing, computed):
+                    cache.put(keys[index], page)
+            if len(missing) == len(cached):
+                outputs.append(infer_result)
+                continue
+            model_list = list(cached)
+            for index, page in zip(missing, computed):
+                model_list[index] = page
+        for index, page in enumerate(model_list):
+            page["page_info"]["page_no"] = index
+        outputs.append(InferenceResult(model_list, doc["ds"]))
+    return outputs
+
+
+def parse_pdf(
+    file_path: str,
+    output_dir: str,
+    ocr: Union[bool, str] = True,
+    name: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+    images_dir: Optional[str] = None,
+    classify: bool = True,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_ORIGINAL,
+    image_max_side: Optional[int] = None,
+    outputs: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    解析单个 PDF 并将 markdown / content_list / middle_json 写入 output_dir
+
+    ocr 为 "auto" 时逐页判断是否需要 OCR（见 parse_pdf_auto）；
+    page_range 为 (start, end) 闭区间时只解析这些页（分片模式），
+    images_dir 可让多个分片共用同一个图片目录；
+    formula / table 为 False 时不识别公式 / 表格，也不加载对应模型；
+    images 为图片输出模式（见 image_store），image_max_side 为重新编码时的最长边；
+    outputs 为要生成的输出文件（OUTPUTS 的子集，None 表示全部），未请求的不序列化也不写盘
+
+    返回各输出文件路径（未请求的为 None）、处理耗时、页数、走 OCR 的页（ocr_pages）
+    """
+    from magic_pdf.model.doc_analyze_by_custom_model import doc_analyze
+
+    if ocr == OCR_AUTO:
+        return parse_pdf_auto(file_path, output_dir, name, pdf_bytes, page_range, images_dir, formula, table,
+                              images, image_max_side, outputs)
+
+    doc = _open_document(file_path, output_dir, ocr, name, pdf_bytes, page_range, images_dir, classify,
+                         formula, table, images, image_max_side, outputs)
+
+    ## inference
+    infer_result = _analyze([doc], lambda datasets: [
+        ds.apply(doc_analyze, ocr=doc["ocr"], formula_enable=formula, table_enable=table) for ds in datasets
+    ])[0]
+    return _dump_document(doc, infer_result)
+
+
+def parse_pdf_auto(
+    file_path: str,
+    output_dir: str,
+    name: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+    page_range: Optional[Tuple[int, int]] = None,
+    images_dir: Optional[str] = None,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_ORIGINAL,
+    image_max_side: Optional[int] = None,
+    outputs: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    逐页路由：先检查每页文字层，连续的文字页走 txt 模式、扫描页走 OCR，
+    混合文档按页段分别解析后合并，ocr_pages 记录实际走 OCR 的页
+    """
+    from page_router import classify_pages, plan_routes
+    from sharding import extract_pages, merge_results
+
+    start_time = time.time()
+    timings: Dict[str, float] = {}
+    if name is None:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+
+    with _StageTimer(timings, "read"):
+        if pdf_bytes is None:
+            with open(file_path, "rb") as f:
+                pdf_bytes = f.read()
+        if page_range is not None:
+            pdf_bytes = extract_pages(pdf_bytes, page_range[0], page_range[1])
+    with _StageTimer(timings, "route"):
+        routes = plan_routes(classify_pages(pdf_bytes))
+
+    if len(routes) <= 1:
+        use_ocr = routes[0][1] if routes else False
+        result = parse_pdf(file_path, output_dir, ocr=use_ocr, name=name, pdf_bytes=pdf_bytes,
+                           images_dir=images_dir, classify=False, formula=formula, table=table,
+                           images=images, image_max_side=image_max_side, outputs=outputs)
+        for stage, seconds in timings.items():
+            result["timings"][stage] = result["timings"].get(stage, 0.0) + seconds
+        result["processing_time"] = time.time() - start_time
+        return result
+
+    shards = []
+    ocr_pages: List[int] = []
+    page_cache = {"hits": 0, "misses": 0}
+    for (start, end), use_ocr in routes:
+        result = parse_pdf(
+            file_path,
+            os.path.join(output_dir, "routes", f"{start}-{end}"),
+            ocr=use_ocr,
+            name=name,
+            pdf_bytes=pdf_bytes,
+            page_range=(start, end),
+            images_dir=images_dir or os.path.join(output_dir, "images"),
+            classify=False,
+            formula=formula,
+            table=table,
+            images=images,
+            image_max_side=image_max_side,
+            outputs=outputs,
+        )
+        shards.append(((start, end), result))
+        ocr_pages.extend(page + start for page in result["ocr_pages"])
+        for stage, seconds in result["timings"].items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+        for field in page_cache:
+            page_cache[field] += result["page_cache"][field]
+
+    paths = merge_results(shards, output_dir, name, outputs)
+    shutil.rmtree(os.path.join(output_dir, "routes"), ignore_errors=True)
+    paths["processing_time"] = time.time() - start_time
+    paths["page_count"] = routes[-1][0][1] + 1
+    paths["ocr_pages"] = ocr_pages
+    paths["page_cache"] = page_cache
+    paths["timings"] = timings
+    return paths
+
+
+def parse_pdf_streaming(
+    file_path: str,
+    output_dir: str,
+    ocr: Union[bool, str] = True,
+    name: Optional[str] = None,
+    pdf_bytes: Optional[bytes] = None,
+    window: int = STREAM_WINDOW_PAGES,
+    report: Optional[Callable[[Dict[str, Any]], None]] = None,
+    formula: bool = True,
+    table: bool = True,
+    images: str = IMAGES_ORIGINAL,
+    image_max_side: Optional[int] = None,
+    outputs: Optional[List[str]] = None,
+) -> Dict[str, Any]:
+    """
+    按页段顺序解析，每完成一段就把该段的 markdown 与 content_list 追加到
+    output_dir/pages.ndjson 并通过 report 上报进度，最后合并为完整结果
+
+    逐页事件总是需要 markdown 与 content_list，outputs 只决定最终合并写出哪些文件；
+    返回值与 parse_pdf 相同，timings 为各页段耗时之和
+    """
+    from sharding import count_pages, plan_shards, merge_results
+
+    start_time = time.time()
+    if name is None:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+    os.makedirs(output_dir, exist_ok=True)
+
+    if pdf_bytes is None:
+        with open(file_path, "rb") as f:
+            pdf_bytes = f.read()
+    page_count = count_pages(pdf_bytes=pdf_bytes)
+    if report is not None:
+        report({"page_count": page_count, "pages_done": 0})
+
+    shards = []
+    timings: Dict[str, float] = {}
+    ocr_pages: List[int] = []
+    page_cache = {"hits": 0, "misses": 0}
+    window_outputs = [output for output in OUTPUTS if output != "middle_json" or output in (outputs or OUTPUTS)]
+    with open(os.path.join(output_dir, PAGES_FILE), "w", encoding="utf-8") as pages_file:
+        for start, end in plan_shards(page_count, window):
+            result = parse_pdf(
+                file_path,
+                os.path.join(output_dir, "shards", f"{start}-{end}"),
+                ocr=ocr,
+                name=name,
+                pdf_bytes=pdf_bytes,
+                page_range=(start, end),
+                images_dir=os.path.join(output_dir, "images"),
+                formula=formula,
+                table=table,
+                images=images,
+                image_max_side=image_max_side,
+                outputs=window_outputs,
+            )
+            shards.append(((start, end), result))
+            ocr_pages.extend(page + start for page in result["ocr_pages"])
+            for stage, seconds in result["timings"].items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+            for field in page_cache:
+                page_cache[field] += result["page_cache"][field]
+
+            with open(result["markdown_path"], "r", encoding="utf-8") as f:
+                markdown = f.read()
+            with open(result["content_list_path"], "r", encoding="utf-8") as f:
+                content_list = json.load(f)
+            for block in content_list:
+                if "page_idx" in block:
+                    block["page_idx"] += start
+            event = {
+                "event": "page",
+                "page_start": start,
+                "page_end": end,
+                "markdown": markdown,
+                "content_list": content_list,
+            }
+            pages_file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            pages_file.flush()
+            if report is not None:
+                report({"page_count": page_count, "pages_done": end + 1})
+
+    paths = merge_results(shards, output_dir, name, outputs)
+    shutil.rmtree(os.path.join(output_dir, "shards"), ignore_errors=True)
+    paths["processing_time"] = time.time() - start_time
+    paths["page_count"] = page_count
+    paths["ocr_pages"] = ocr_pages
+    paths["page_cache"] = page_cache
+    paths["timings"] = timings
+    return paths
+
+
+def _parse_one(document: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return {"status": "ok", "result": parse_pdf(**document)}
+    except Exception as e:
+        return {"status": "error", "error": f"{e}\n{traceback.format_exc()}"}
+
+
+def _batch_analyze(datasets: list, ocr: bool, formula: bool = True, table: bool = True) -> list:
+    """调用 magic_pdf 的 batch_doc_analyze，多个文档的页面合并成大批次跑版面/公式/OCR 模型"""
+    from magic_pdf.model.doc_analyze_by_custom_model import batch_doc_analyze
+
+    # batch_doc_analyze 按该环境变量切分批次
+    os.environ.setdefault("MINERU_MIN_BATCH_INFERENCE_SIZE", str(INFER_BATCH_PAGES))
+    parameters = inspect.signature(batch_doc_analyze).parameters
+    kwargs: Dict[str, Any] = {}
+    if "formula_enable" in parameters:
+        kwargs.update(formula_enable=formula, table_enable=table)
+    elif not (formula and table):
+        raise TypeError("batch_doc_analyze does not support formula_enable/table_enable")
+    # 1.3 起改为 parse_method 参数，早期版本为 ocr 布尔参数
+    if "parse_method" in parameters:
+        return batch_doc_analyze(datasets, parse_method="ocr" if ocr else "txt", **kwargs)
+    return batch_doc_analyze(datasets, ocr=ocr, **kwargs)
+
+
+def _resolve_auto(document: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """ocr=auto 的文档若全部页面结论一致，换成确定的 ocr 参数以便合并推理；混合文档返回 None"""
+    from page_router import classify_pages, plan_routes
+
+    document = dict(document)
+    if document.get("pdf_bytes") is None:
+        with open(document["file_path"], "rb") as f:
+            document["pdf_bytes"] = f.read()
+    if document.get("page_range") is not None:
+        from sharding import extract_pages
+        start, end = document.pop("page_range")
+        document["pdf_bytes"] = extract_pages(document["pdf_bytes"], start, end)
+    routes = plan_routes(classify_pages(document["pdf_bytes"]))
+    if len(routes) > 1:
+        return None
+    document["ocr"] = routes[0][1] if routes else False
+    document["classify"] = False
+    return document
+
+
+def parse_batch(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    合并推理多个文档，documents 中每项为 parse_pdf 的参数
+
+    ocr / formula / table 组合相同的文档合成一批；magic_pdf 不支持批量推理或批量推理出错时
+    退回逐个解析，保证单个坏文档不影响同批其他文档。
+    返回 [{"status": "ok", "result": ...} | {"status": "error", "error": ...}]
+    """
+    try:
+        from magic_pdf.model.doc_analyze_by_custom_model import batch_doc_analyze  # noqa: F401
+    except ImportError:
+        return [_parse_one(document) for document in documents]
+    if len(documents) < 2:
+        return [_parse_one(document) for document in documents]
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(documents)
+    opened = []
+    for index, document in enumerate(documents):
+        try:
+            if document.get("ocr") == OCR_AUTO:
+                document = _resolve_auto(document)
+                if document is None:
+                    # 扫描页与文字页混合的文档按页段单独解析
+                    results[index] = _parse_one(documents[index])
+                    continue
+            opened.append((index, _open_document(**document)))
+        except Exception as e:
+            results[index] = {"status": "error", "error": f"{e}\n{traceback.format_exc()}"}
+
+    groups: Dict[Tuple[bool, bool, bool], list] = {}
+    for index, doc in opened:
+        groups.setdefault((doc["ocr"], doc["formula"], doc["table"]), []).append((index, doc))
+    for (ocr, formula, table), group in groups.items():
+        try:
+            # 各文档未命中页缓存的页合并推理，耗时按页数分摊
+            infer_results = _analyze([doc for _, doc in group],
+                                     lambda datasets: _batch_analyze(datasets, ocr, formula, table))
+        except Exception as e:
+            print(f"批量推理失败，逐个文档重试: {e}")
+            for index, _ in group:
+                results[index] = _parse_one(documents[index])
+            continue
+        for (index, doc), infer_result in zip(group, infer_results):
+            try:
+                results[index] = {"status": "ok", "result": _dump_document(doc, infer_result)}
+            except Exception as e:
+                results[index] = {"status": "error", "error": f"{e}\n{traceback.format_exc()}"}
+    return results
+
+
+def parse_many(file_paths: List[str], output_root: str, ocr: Union[bool, str] = OCR_AUTO,
+               formula: bool = True, table: bool = True, images: str = IMAGES_ORIGINAL,
+               image_max_side: Optional[int] = None,
+               outputs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """批量解析，每个文档输出到 output_root 下以文件名命名的子目录"""
+    results = []
+    for file_path in file_paths:
+        name = os.path.splitext(os.path.basename(file_path))[0]
+        try:
+            result = parse_pdf(file_path, os.path.join(output_root, name), ocr=ocr, formula=formula, table=table,
+                               images=images, image_max_side=image_max_side, outputs=outputs)
+            result["status"] = "completed"
+        except Exception as e:
+            result = {"status": "failed", "error": str(e)}
+        result["file_path"] = file_path
+        results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MinerU PDF 解析")
+    parser.add_argument("files", nargs="+", help="待解析的 PDF 文件")
+    parser.add_argument("-o", "--output", default="output", help="输出目录")
+    parser.add_argument("--ocr", choices=["auto", "true", "false"], default="auto",
+                        help="auto 逐页判断是否需要 OCR；true 全部 OCR；false 使用 txt 模式")
+    parser.add_argument("--no-ocr", action="store_true", help="等同于 --ocr false")
+    parser.add_argument("--no-formula", action="store_true", help="不识别公式，不加载公式模型")
+    parser.add_argument("--no-table", action="store_true", help="不识别表格，不加载表格模型")
+    parser.add_argument("--images", choices=IMAGE_MODES, default=IMAGES_ORIGINAL,
+                        help="图片输出：none 不输出；refs 只保留引用；original 原图；webp/jpeg 缩放后重新编码")
+    parser.add_argument("--image-max-side", type=int, default=None, help="webp/jpeg 模式下图片最长边（像素）")
+    parser.add_argument("--outputs", default=",".join(OUTPUTS),
+                        help="要生成的输出文件，逗号分隔：markdown,content_list,middle_json")
+    args = parser.parse_args(argv)
+
+    import patch_magic_pdf
+    patch_magic_pdf.apply_patch()
+
+    failed = 0
+    ocr = {"auto": OCR_AUTO, "true": True, "false": False}["false" if args.no_ocr else args.ocr]
+    outputs = [output.strip() for output in args.outputs.split(",") if output.strip()]
+    if not outputs or set(outputs) - set(OUTPUTS):
+        parser.error(f"--outputs 只能是 {','.join(OUTPUTS)} 的组合")
+    for result in parse_many(args.files, args.output, ocr=ocr, formula=not args.no_formula, table=not args.no_table,
+                             images=args.images, image_max_side=args.image_max_side, outputs=outputs):
+        if result["status"] == "completed":
+            written = result["markdown_path"] or result["content_list_path"] or result["middle_json_path"]
+            print(f"{result['file_path']}: {written} ({result['processing_time']:.2f}s)")
+        else:
+            failed += 1
+            print(f"{result['file_path']}: 失败 - {result['error']}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# 文件名: app/preflight.py
+"""
+入队前的 PDF 预检 - 只读取 PDF 结构（不渲染、不抽取文字），获取页数、加密状态、页面尺寸、
+嵌入图片体积和文字层估计；超过限制的输入直接拒绝，不占用工作进程
+"""
+import os
+from typing import Any, Dict, Optional, Union
+
+# 拒绝阈值（可通过环境变量覆盖，0 表示不限制）
+MAX_FILE_BYTES = int(os.environ.get("MINERU_MAX_FILE_MB", "512")) * 1024 * 1024
+MAX_PAGES = int(os.environ.get("MINERU_MAX_PAGES", "2000"))
+# 页面长边上限（pt），PDF 规范的页面上限为 14400pt（200 英寸）
+MAX_PAGE_SIDE = float(os.environ.get("MINERU_MAX_PAGE_SIDE_PT", "14400"))
+MAX_IMAGE_BYTES = int(os.environ.get("MINERU_MAX_IMAGE_MB", "1024")) * 1024 * 1024
+# 尺寸与文字层只抽查这么多页（均匀分布），页数很多时预检耗时不随页数增长
+SAMPLE_PAGES = 32
+
+
+class PreflightRejected(Exception):
+    """输入不符合限制，status_code 为建议返回的 HTTP 状态码"""
+
+    def __init__(self, reason: str, status_code: int = 422, report: Optional[Dict[str, Any]] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.report = report or {}
+
+
+def _sample(page_count: int, limit: int = SAMPLE_PAGES):
+    if page_count <= limit:
+        return list(range(page_count))
+    step = page_count / limit
+    return sorted({int(i * step) for i in range(limit)})
+
+
+def _image_bytes(doc) -> int:
+    """所有图片 XObject 的压缩后体积之和（读取 /Length，不解码图片）"""
+    total = 0
+    for xref in range(1, doc.xref_length()):
+        try:
+            if doc.xref_get_key(xref, "Subtype")[1] != "/Image":
+                continue
+            kind, length = doc.xref_get_key(xref, "Length")
+            if kind == "int":
+                total += int(length)
+        except Exception:
+            continue
+    return total
+
+
+def inspect_pdf(file_path: Optional[str] = None,
+                pdf_bytes: Optional[Union[bytes, memoryview]] = None) -> Dict[str, Any]:
+    """
+    返回预检报告: file_size, page_count, encrypted, max_page_width / max_page_height (pt),
+    image_bytes, text_layer_ratio（抽查页中有字体资源的比例）
+
+    无法打开、需要密码或没有页面时抛出 PreflightRejected
+    """
+    import fitz
+
+    file_size = len(pdf_bytes) if pdf_bytes is not None else os.path.getsize(file_path)
+    report: Dict[str, Any] = {"file_size": file_size}
+    try:
+        doc = fitz.open(stream=pdf_bytes, filetype="pdf") if pdf_bytes is not None else fitz.open(file_path)
+    except Exception as e:
+        raise PreflightRejected(f"Malformed PDF: {e}", 400, report)
+
+    with doc:
+        report["encrypted"] = bool(doc.is_encrypted)
+        # 只有所有者密码（无打开密码）的 PDF 可以正常解析
+        if doc.needs_pass:
+            raise PreflightRejected("Encrypted PDF requires a password", 400, report)
+        if not doc.is_pdf:
+            raise PreflightRejected("Not a PDF document", 400, report)
+
+        page_count = doc.page_count
+        report["page_count"] = page_count
+        if page_count == 0:
+            raise PreflightRejected("PDF has no pages", 400, report)
+
+        max_width = max_height = 0.0
+        text_pages = 0
+        sampled = _sample(page_count)
+        try:
+            for index in sampled:
+                page = doc.load_page(index)
+                max_width = max(max_width, page.rect.width)
+                max_height = max(max_height, page.rect.height)
+                if page.get_fonts():
+                    text_pages += 1
+        except Exception as e:
+            raise PreflightRejected(f"Malformed PDF page structure: {e}", 400, report)
+        report["max_page_width"] = round(max_width, 1)
+        report["max_page_height"] = round(max_height, 1)
+        report["text_layer_ratio"] = round(text_pages / len(sampled), 3)
+        report["image_bytes"] = _image_bytes(doc)
+    return report
+
+
+def check_limits(report: Dict[str, Any]):
+    """按配置的限制检查预检报告，超限时抛出 PreflightRejected"""
+    if MAX_FILE_BYTES and report["file_size"] > MAX_FILE_BYTES:
+        raise PreflightRejected(
+            f"File too large: {report['file_size']} bytes (limit {MAX_FILE_BYTES})", 413, report)
+    if MAX_PAGES and report["page_count"] > MAX_PAGES:
+        raise PreflightRejected(f"Too many pages: {report['page_count']} (limit {MAX_PAGES})", 413, report)
+    side = max(report["max_page_width"], report["max_page_height"])
+    if MAX_PAGE_SIDE and side > MAX_PAGE_SIDE:
+        raise PreflightRejected(f"Page too large: {side:.0f}pt (limit {MAX_PAGE_SIDE:.0f}pt)", 422, report)
+    if MAX_IMAGE_BYTES and report["image_bytes"] > MAX_IMAGE_BYTES:
+        raise PreflightRejected(
+            f"Embedded images too large: {report['image_bytes']} bytes (limit {MAX_IMAGE_BYTES})", 413, report)
+
+
+def preflight(file_path: Optional[str] = None, pdf_bytes: Optional[Union[bytes, memoryview]] = None) -> Dict[str, Any]:
+    """预检并检查限制；文件大小超限时不打开 PDF"""
+    if MAX_FILE_BYTES:
+        size = len(pdf_bytes) if pdf_bytes is not None else os.path.getsize(file_path)
+        if size > MAX_FILE_BYTES:
+            raise PreflightRejected(f"File too large: {size} bytes (limit {MAX_FILE_BYTES})", 413,
+                                    {"file_size": size})
+    report = inspect_pdf(file_path, pdf_bytes)
+    check_limits(report)
+    return report
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# 文件名: app/result_cache.py
+"""
+解析结果缓存 - 以 PDF 内容的 SHA-256、ocr / formula / table 参数和模型配置为键，
+命中时直接返回 markdown / content_list / middle_json（以及引用的图片），不再运行解析流程
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+from typing import Dict, Optional
+
+from lru_index import LRUIndex, scan_entries
+
+logger = logging.getLogger("mineru-api")
+
+CACHE_DIR = os.environ.get("MINERU_CACHE_DIR", "/data/cache/results")
+CACHE_MAX_BYTES = int(os.environ.get("MINERU_CACHE_MAX_MB", "2048")) * 1024 * 1024
+MAGIC_PDF_CONFIG = os.path.expanduser("~/magic-pdf.json")
+
+# 影响解析输出的配置项
+MODEL_SETTING_KEYS = [
+    "models-dir",
+    "layout-config",
+    "formula-config",
+    "table-config",
+    "weights",
+    "config_version",
+]
+
+# 缓存条目中的文件名
+ARTIFACT_FILES = {
+    "markdown": "result.md",
+    "content_list": "content_list.json",
+    "middle_json": "middle.json",
+}
+# 条目中的图片目录：硬链接到共享图片目录中的文件，命中时再链接回结果目录
+IMAGES_DIR = "images"
+
+
+def _link(source: str, target: str):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _dir_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names
+    )
+
+
+def model_settings_fingerprint(config_path: str = MAGIC_PDF_CONFIG) -> str:
+    """根据 magic-pdf.json 中与模型相关的配置生成指纹"""
+    try:
+        with open(config_path, "r") as f:
+            config = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        config = {}
+    settings = {key: config.get(key) for key in MODEL_SETTING_KEYS}
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """基于本地磁盘的 LRU 结果缓存"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._index = LRUIndex(max_bytes)
+        self._settings_fingerprint = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self):
+        """启动时扫描磁盘，按访问时间恢复 LRU 顺序"""
+        def inspect(prefix_dir: str, key: str):
+            entry_dir = os.path.join(prefix_dir, key)
+            if not os.path.isdir(entry_dir):
+                return None
+            return os.path.getmtime(entry_dir), key, _dir_size(entry_dir)
+
+        found = scan_entries(self.cache_dir, inspect)
+        self._index.load(found)
+        if found:
+            logger.info(f"Result cache loaded {len(found)} entries ({self._index.total_bytes} bytes)")
+
+    def refresh_settings(self):
+        """magic-pdf.json 更新后重新计算配置指纹"""
+        self._settings_fingerprint = model_settings_fingerprint()
+
+    def make_key(self, pdf_sha256: str, ocr, formula: bool = True, table: bool = True,
+                 images: str = "original", image_max_side: Optional[int] = None) -> str:
+        if self._settings_fingerprint is None:
+            self.refresh_settings()
+        raw = f"{pdf_sha256}:{ocr}:{formula}:{table}:{self._settings_fingerprint}"
+        # 图片模式会改变 markdown 中的图片引用；默认模式不参与，已有缓存条目保持有效
+        if images != "original":
+            raw += f":{images}:{image_max_side}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _touch(self, key: str) -> bool:
+        """更新 LRU 顺序；未命中时计数并返回 False"""
+        entry_dir = self._entry_dir(key)
+        if not os.path.isdir(entry_dir):
+            self._index.remove(key)
+            self._index.miss()
+            return False
+        # 索引中没有的是其他 uvicorn worker 写入的条目
+        self._index.touch(key, lambda: _dir_size(entry_dir))
+        return True
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """命中时返回 markdown / content_list / middle_json 文本"""
+        entry_dir = self._entry_dir(key)
+        if not self._touch(key):
+            return None
+
+        try:
+            result = {}
+            for artifact, filename in ARTIFACT_FILES.items():
+                with open(os.path.join(entry_dir, filename), "r", encoding="utf-8") as f:
+                    result[artifact] = f.read()
+            os.utime(entry_dir)
+        except OSError as e:
+            logger.warning(f"Broken cache entry {key}: {e}")
+            self._remove(key)
+            self._index.miss()
+            return None
+
+        self._index.hit()
+        return result
+
+    def materialize(self, key: str, output_dir: str, name: str) -> Optional[Dict[str, str]]:
+        """
+        命中时把缓存文件链接到 output_dir（图片链接到 output_dir/images），
+        返回与 pipeline.parse_pdf 相同的路径字典
+        """
+        entry_dir = self._entry_dir(key)
+        if not self._touch(key):
+            return None
+
+        paths = {
+            "markdown_path": os.path.join(output_dir, f"{name}.md"),
+            "content_list_path": os.path.join(output_dir, f"{name}_content_list.json"),
+            "middle_json_path": os.path.join(output_dir, f"{name}_middle.json"),
+        }
+        try:
+            # 缓存图片之前写入的条目没有图片目录，视为损坏
+            images_source = os.path.join(entry_dir, IMAGES_DIR)
+            if not os.path.isdir(images_source):
+                raise FileNotFoundError(images_source)
+            os.makedirs(output_dir, exist_ok=True)
+            for artifact, filename in ARTIFACT_FILES.items():
+                _link(os.path.join(entry_dir, filename), paths[f"{artifact}_path"])
+            images_target = os.path.join(output_dir, IMAGES_DIR)
+            os.makedirs(images_target, exist_ok=True)
+            for filename in os.listdir(images_source):
+                target = os.path.join(images_target, filename)
+                if not os.path.exists(target):
+                    _link(os.path.join(images_source, filename), target)
+            os.utime(entry_dir)
+        except OSError as e:
+            logger.warning(f"Broken cache entry {key}: {e}")
+            self._remove(key)
+            self._index.miss()
+            return None
+
+        self._index.hit()
+        return paths
+
+    def put(self, key: str, paths: Dict[str, str]):
+        """
+        保存一次解析结果，paths 为 pipeline.parse_pdf 返回的输出文件路径；只缓存三种文件齐全的结果，
+        结果目录下 images/ 中的图片一并缓存
+        """
+        if not all(paths.get(f"{artifact}_path") for artifact in ARTIFACT_FILES):
+            return
+        entry_dir = self._entry_dir(key)
+        tmp_dir = os.path.join(self.cache_dir, key[:2], f".{key}.tmp")
+        try:
+            os.makedirs(tmp_dir, exist_ok=True)
+            size = 0
+            for artifact, filename in ARTIFACT_FILES.items():
+                target = os.path.join(tmp_dir, filename)
+                _link(paths[f"{artifact}_path"], target)
+                size += os.path.getsize(target)
+            images_source = os.path.join(os.path.dirname(paths["markdown_path"]), IMAGES_DIR)
+            images_target = os.path.join(tmp_dir, IMAGES_DIR)
+            os.makedirs(images_target, exist_ok=True)
+            if os.path.isdir(images_source):
+                for filename in os.listdir(images_source):
+                    target = os.path.join(images_target, filename)
+                    _link(os.path.join(images_source, filename), target)
+                    size += os.path.getsize(target)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            os.rename(tmp_dir, entry_dir)
+        except Exception as e:
+            logger.warning(f"Failed to cache result {key}: {e}")
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        evicted = self._index.add(key, size)
+        for old_key in evicted:
+            shutil.rmtree(self._entry_dir(old_key), ignore_errors=True)
+
+    def _remove(self, key: str):
+        self._index.remove(key)
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def stats(self) -> Dict:
+        return self._index.stats()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# 文件名: app/sharding.py
+"""
+大文档分片 - 按页码范围把一个 PDF 切成多个分片交给不同工作进程，
+完成后合并 markdown / content_list / middle_json 并修正页码
+"""
+import os
+import json
+from typing import Dict, List, Optional, Tuple, Any
+
+from pipeline import OUTPUTS, result_paths
+
+# 超过该页数才拆分，每个分片的页数（可通过环境变量覆盖）
+SHARD_PAGE_THRESHOLD = int(os.environ.get("MINERU_SHARD_PAGE_THRESHOLD", "100"))
+SHARD_SIZE = int(os.environ.get("MINERU_SHARD_SIZE", "50"))
+
+
+def count_pages(file_path: Optional[str] = None, pdf_bytes: Optional[bytes] = None) -> int:
+    """只读取 PDF 结构获取页数，可传文件路径或内存中的内容"""
+    import fitz
+
+    if pdf_bytes is not None:
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            return doc.page_count
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def plan_shards(page_count: int, shard_size: int = SHARD_SIZE) -> List[Tuple[int, int]]:
+    """返回 [(start, end), ...]，页码从 0 开始且为闭区间"""
+    shard_size = max(1, shard_size)
+    return [
+        (start, min(start + shard_size, page_count) - 1)
+        for start in range(0, page_count, shard_size)
+    ]
+
+
+def extract_pages(pdf_bytes: bytes, start: int, end: int) -> bytes:
+    """截取 [start, end] 页生成新的 PDF"""
+    import fitz
+
+    with fitz.open(stream=pdf_bytes, filetype="pdf") as src:
+        if start == 0 and end >= src.page_count - 1:
+            return pdf_bytes
+        with fitz.open() as dst:
+            dst.insert_pdf(src, from_page=start, to_page=end)
+            return dst.tobytes()
+
+
+def merge_results(shards: List[Tuple[Tuple[int, int], Dict[str, Any]]],
+                  output_dir: str, name: str, outputs: Optional[List[str]] = None) -> Dict[str, Optional[str]]:
+    """
+    合并各分片结果写入 output_dir
+
+    shards 为 [((start, end), parse_pdf 返回值), ...]，按 start 排序后合并，
+    content_list 与 middle_json 中的 page_idx 加上分片起始页；
+    只合并各分片都生成了的输出文件，outputs 不为 None 时再限定为其中的文件
+    """
+    shards = sorted(shards, key=lambda item: item[0][0])
+    merged = [
+        output for output in OUTPUTS
+        if (outputs is None or output in outputs) and all(result.get(f"{output}_path") for _, result in shards)
+    ]
+    markdown_parts = []
+    content_list = []
+    middle_json: Dict[str, Any] = {}
+    pdf_info = []
+
+    for (start, _), result in shards:
+        if "markdown" in merged:
+            with open(result["markdown_path"], "r", encoding="utf-8") as f:
+                markdown_parts.append(f.read().strip("\n"))
+
+        if "content_list" in merged:
+            with open(result["content_list_path"], "r", encoding="utf-8") as f:
+                for block in json.load(f):
+                    if "page_idx" in block:
+                        block["page_idx"] += start
+                    content_list.append(block)
+
+        if "middle_json" in merged:
+            with open(result["middle_json_path"], "r", encoding="utf-8") as f:
+                shard_middle = json.load(f)
+            for page in shard_middle.pop("pdf_info", []):
+                if "page_idx" in page:
+                    page["page_idx"] += start
+                pdf_info.append(page)
+            if not middle_json:
+                middle_json = shard_middle
+
+    middle_json["pdf_info"] = pdf_info
+
+    paths = result_paths(output_dir, name, merged)
+    if paths["markdown_path"]:
+        with open(paths["markdown_path"], "w", encoding="utf-8") as f:
+            f.write("\n\n".join(part for part in markdown_parts if part))
+    if paths["content_list_path"]:
+        with open(paths["content_list_path"], "w", encoding="utf-8") as f:
+            json.dump(content_list, f, ensure_ascii=False, indent=4)
+    if paths["middle_json_path"]:
+        with open(paths["middle_json_path"], "w", encoding="utf-8") as f:
+            json.dump(middle_json, f, ensure_ascii=False, indent=4)
+    return paths
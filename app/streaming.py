@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# 文件名: app/streaming.py
+"""
+结果文件的流式响应 - 支持 HTTP Range 和 gzip，文件内容不整体读入内存
+
+content_list / middle_json 已经以 JSON 形式落盘，响应中原样嵌入这些字节，
+不再作为字符串二次转义；内部调用方可选 MessagePack 编码（format=msgpack 或 Accept 头）
+"""
+import os
+import json
+import zlib
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+STREAM_CHUNK_SIZE = 256 * 1024
+GZIP_MIN_SIZE = 1024  # 太小的文件压缩不划算
+GZIP_LEVEL = 6
+
+FORMAT_JSON = "json"
+FORMAT_MSGPACK = "msgpack"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# 结果文件缺失或为空时的占位值，保持各字段的 JSON 类型
+EMPTY_JSON = {"content_list": b"[]", "middle_json": b"{}"}
+
+
+def empty_json(key: str) -> bytes:
+    return EMPTY_JSON.get(key, b"null")
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """解析单段 Range 头，返回闭区间 (start, end)；不支持的格式返回 None"""
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        # 多段 Range 较少见，直接返回完整文件
+        return None
+    start_text, _, end_text = spec.partition("-")
+    try:
+        if start_text == "":
+            # bytes=-N 表示最后 N 个字节
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError
+            start, end = max(size - length, 0), size - 1
+        else:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _iter_file(path: str, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _iter_gzip(path: str) -> Iterator[bytes]:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+    yield compressor.flush()
+
+
+def stream_file(request: Request, path: str, media_type: str,
+                headers: Optional[Dict[str, str]] = None) -> Response:
+    """按请求头选择 Range 分段、gzip 压缩流或直接 sendfile"""
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Result file not found")
+
+    size = os.path.getsize(path)
+    headers = dict(headers or {})
+    headers["Accept-Ranges"] = "bytes"
+
+    byte_range = parse_range(request.headers.get("range"), size)
+    if byte_range is not None:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(_iter_file(path, start, end), status_code=206,
+                                 media_type=media_type, headers=headers)
+
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if "gzip" in accept_encoding and size >= GZIP_MIN_SIZE:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+        return StreamingResponse(_iter_gzip(path), media_type=media_type, headers=headers)
+
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+def response_format(request: Request, format: Optional[str] = None) -> str:
+    """format 参数优先，其次按 Accept 头选择 MessagePack，默认 JSON"""
+    if format is not None:
+        format = format.strip().lower()
+        if format not in (FORMAT_JSON, FORMAT_MSGPACK):
+            raise HTTPException(status_code=400, detail="format must be 'json' or 'msgpack'")
+        return format
+    accept = request.headers.get("accept", "")
+    return FORMAT_MSGPACK if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES) else FORMAT_JSON
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(status_code=406, detail="MessagePack encoding requires the msgpack package")
+    return msgpack
+
+
+def msgpack_file(path: str) -> str:
+    """JSON 结果文件对应的 MessagePack 文件，首次请求时转换一次并保存在旁边"""
+    msgpack = _msgpack()
+    target = f"{path}.msgpack"
+    if not os.path.exists(target) or os.path.getmtime(target) < os.path.getmtime(path):
+        with open(path, "rb") as f:
+            data = msgpack.packb(json.load(f), use_bin_type=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+    return target
+
+
+def stream_json_file(request: Request, path: str, headers: Optional[Dict[str, str]] = None,
+                     format: Optional[str] = None) -> Response:
+    """原样返回 JSON 结果文件，或按需返回其 MessagePack 编码"""
+    if response_format(request, format) == FORMAT_MSGPACK:
+        if not path or not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Result file not found")
+        return stream_file(request, msgpack_file(path), MSGPACK_MEDIA_TYPES[0], headers=headers)
+    return stream_file(request, path, "application/json", headers=headers)
+
+
+def json_envelope(fields: Dict[str, Any], raw_json: Dict[str, Any]) -> bytes:
+    """组装 JSON 对象：fields 正常序列化，raw_json 的值是已序列化的 JSON（str/bytes），原样嵌入"""
+    items = [
+        f"{json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}".encode("utf-8")
+        for key, value in fields.items()
+    ]
+    for key, value in raw_json.items():
+        raw = value.encode("utf-8") if isinstance(value, str) else value
+        if not raw.strip():
+            raw = empty_json(key)
+        items.append(json.dumps(key).encode("utf-8") + b": " + raw)
+    return b"{" + b", ".join(items) + b"}"
+
+
+def _iter_envelope(fields: Dict[str, Any], raw_json: Dict[str, Any], raw_paths: Dict[str, str]) -> Iterator[bytes]:
+    head = json_envelope(fields, raw_json)[:-1]
+    yield head
+    separator = b", " if len(head) > 1 else b""
+    for key, path in raw_paths.items():
+        yield separator + json.dumps(key).encode("utf-8") + b": "
+        size = os.path.getsize(path)
+        if size:
+            yield from _iter_file(path, 0, size - 1)
+        else:
+            yield empty_json(key)
+        separator = b", "
+    yield b"}"
+
+
+def envelope_response(request: Request, fields: Dict[str, Any], raw_json: Optional[Dict[str, Any]] = None,
+                      raw_paths: Optional[Dict[str, str]] = None, format: Optional[str] = None,
+                      headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    返回包含已序列化 JSON 的响应：raw_json 为内存中的 JSON 文本，raw_paths 为 JSON 文件（边读边发送）；
+    MessagePack 需要解析后重新编码
+    """
+    raw_json = raw_json or {}
+    raw_paths = raw_paths or {}
+    if response_format(request, format) == FORMAT_MSGPACK:
+        msgpack = _msgpack()
+        content = dict(fields)
+        for key, value in raw_json.items():
+            content[key] = json.loads(value.strip() or empty_json(key))
+        for key, path in raw_paths.items():
+            with open(path, "rb") as f:
+                content[key] = json.loads(f.read().strip() or empty_json(key))
+        return Response(msgpack.packb(content, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPES[0],
+                        headers=headers)
+    if raw_paths:
+        return StreamingResponse(_iter_envelope(fields, raw_json, raw_paths), media_type="application/json",
+                                 headers=headers)
+    return Response(json_envelope(fields, raw_json), media_type="application/json", headers=headers)
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# 文件名: app/task_store.py
+"""
+任务存储 - 记录任务状态、时间戳、处理耗时和结果文件位置
+
+MINERU_TASK_STORE 选择后端:
+    sqlite:///data/tasks.db   多个 uvicorn worker 共享、重启不丢失（默认）
+    memory                    仅当前进程内存
+"""
+import os
+import json
+import base64
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger("mineru-api")
+
+TASK_STORE_URL = os.environ.get("MINERU_TASK_STORE", "sqlite:///data/tasks.db")
+
+# 持久化的任务字段（顺序即建表顺序）
+TASK_FIELDS = [
+    "task_id",
+    "status",
+    "filename",
+    "file_path",
+    "output_dir",
+    "ocr",
+    "cache_key",
+    "batch_id",
+    "owner",
+    "error",
+    "created_at",
+    "updated_at",
+    "started_at",
+    "finished_at",
+    "processing_time",
+    "page_count",
+    "pages_done",
+    "ocr_pages",
+    "markdown_path",
+    "content_list_path",
+    "middle_json_path",
+]
+
+DATETIME_FIELDS = {"created_at", "updated_at", "started_at", "finished_at"}
+# 以 JSON 文本保存的字段
+JSON_FIELDS = {"ocr_pages"}
+# 任务列表的摘要视图只返回这些字段（不含结果文件路径等）
+SUMMARY_FIELDS = [
+    "task_id",
+    "status",
+    "filename",
+    "ocr",
+    "batch_id",
+    "error",
+    "created_at",
+    "started_at",
+    "finished_at",
+    "processing_time",
+    "page_count",
+    "pages_done",
+]
+
+
+def local_naive(value: Optional[datetime]) -> Optional[datetime]:
+    """任务时间以本地时间（不带时区）保存，带时区的查询参数先换算为本地时间"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def encode_cursor(task: "TaskResult") -> str:
+    """分页游标：最后一条任务的 (created_at, task_id)"""
+    raw = f"{task.created_at.isoformat()}|{task.task_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """解析分页游标，格式不对时抛出 ValueError"""
+    try:
+        created_at, task_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), task_id
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class TaskResult:
+    """单个任务的状态与结果位置"""
+
+    def __init__(self, task_id: str = None, **fields):
+        self.task_id = task_id
+        self.status = "pending"
+        self.filename = None
+        self.file_path = None
+        self.output_dir = None
+        self.ocr = None  # True / False / "auto"
+        self.cache_key = None
+        self.batch_id = None
+        self.owner = None  # 排队/执行该任务的 API 进程实例，共享存储时据此区分各进程的任务
+        self.error = None
+        self.created_at = datetime.now()
+        self.updated_at = self.created_at
+        self.started_at = None  # 工作进程开始处理的时间，排队期间为空
+        self.finished_at = None
+        self.processing_time = None  # 添加处理时间记录
+        self.page_count = None  # 逐页流式解析时的总页数与已完成页数
+        self.pages_done = None
+        self.ocr_pages = None  # 实际走 OCR 的页码列表（从 0 开始）
+        self.markdown_path = None
+        self.content_list_path = None
+        self.middle_json_path = None
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in TASK_FIELDS}
+
+    def summary(self) -> Dict[str, Any]:
+        return {field: getattr(self, field) for field in SUMMARY_FIELDS}
+
+
+class TaskStore:
+    """任务存储接口"""
+
+    def create(self, task_id: str, **fields) -> TaskResult:
+        raise NotImplementedError
+
+    def get(self, task_id: str) -> Optional[TaskResult]:
+        raise NotImplementedError
+
+    def update(self, task_id: str, **fields):
+        raise NotImplementedError
+
+    def delete(self, task_id: str):
+        raise NotImplementedError
+
+    def list(self, status: Optional[str] = None, created_before: Optional[datetime] = None,
+             limit: Optional[int] = None, batch_id: Optional[str] = None) -> List[TaskResult]:
+        """按 created_at 升序列出任务"""
+        raise NotImplementedError
+
+    def list_page(self, statuses: Optional[List[str]] = None, created_after: Optional[datetime] = None,
+                  created_before: Optional[datetime] = None, filename: Optional[str] = None,
+                  cursor: Optional[str] = None, limit: int = 50,
+                  full: bool = False) -> Tuple[List[TaskResult], Optional[str]]:
+        """
+        按 created_at 降序（最新在前）分页列出任务，返回 (任务列表, 下一页游标)
+
+        statuses 为多个状态时取并集；filename 为文件名子串匹配；
+        cursor 为上一页返回的游标，没有更多数据时下一页游标为 None；
+        full 为 False 时后端可以只读取 SUMMARY_FIELDS
+        """
+        raise NotImplementedError
+
+    def count(self, status: Optional[str] = None) -> int:
+        raise NotImplementedError
+
+    def __contains__(self, task_id: str) -> bool:
+        return self.get(task_id) is not None
+
+
+class MemoryTaskStore(TaskStore):
+    """进程内存存储，只适用于单 worker"""
+
+    def __init__(self):
+        self._tasks: Dict[str, TaskResult] = {}
+        # status -> {task_id -> TaskResult}，按状态查询时不必遍历全部任务
+        self._by_status: Dict[str, Dict[str, TaskResult]] = {}
+        self._lock = threading.Lock()
+
+    def create(self, task_id: str, **fields) -> TaskResult:
+        task = TaskResult(task_id, **fields)
+        with self._lock:
+            old = self._tasks.get(task_id)
+            if old is not None:
+                self._by_status.get(old.status, {}).pop(task_id, None)
+            self._tasks[task_id] = task
+            self._by_status.setdefault(task.status, {})[task_id] = task
+        return task
+
+    def get(self, task_id: str) -> Optional[TaskResult]:
+        return self._tasks.get(task_id)
+
+    def update(self, task_id: str, **fields):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return
+            old_status = task.status
+            for key, value in fields.items():
+                setattr(task, key, value)
+            task.updated_at = datetime.now()
+            if task.status != old_status:
+                self._by_status.get(old_status, {}).pop(task_id, None)
+                self._by_status.setdefault(task.status, {})[task_id] = task
+
+    def delete(self, task_id: str):
+        with self._lock:
+            task = self._tasks.pop(task_id, None)
+            if task is not None:
+                self._by_status.get(task.status, {}).pop(task_id, None)
+
+    def list(self, status: Optional[str] = None, created_before: Optional[datetime] = None,
+             limit: Optional[int] = None, batch_id: Optional[str] = None) -> List[TaskResult]:
+        with self._lock:
+            tasks = [
+                t for t in self._tasks.values()
+                if (status is None or t.status == status)
+                and (created_before is None or t.created_at < created_before)
+                and (batch_id is None or t.batch_id == batch_id)
+            ]
+        tasks.sort(key=lambda t: t.created_at)
+        return tasks[:limit] if limit else tasks
+
+    def list_page(self, statuses: Optional[List[str]] = None, created_after: Optional[datetime] = None,
+                  created_before: Optional[datetime] = None, filename: Optional[str] = None,
+                  cursor: Optional[str] = None, limit: int = 50,
+                  full: bool = False) -> Tuple[List[TaskResult], Optional[str]]:
+        created_after, created_before = local_naive(created_after), local_naive(created_before)
+        after = decode_cursor(cursor) if cursor else None
+        with self._lock:
+            if statuses:
+                candidates = [t for status in statuses for t in self._by_status.get(status, {}).values()]
+            else:
+                candidates = list(self._tasks.values())
+        tasks = [
+            t for t in candidates
+            if (created_after is None or t.created_at >= created_after)
+            and (created_before is None or t.created_at < created_before)
+            and (filename is None or (t.filename is not None and filename in t.filename))
+            and (after is None or (t.created_at, t.task_id) < after)
+        ]
+        tasks.sort(key=lambda t: (t.created_at, t.task_id), reverse=True)
+        page = tasks[:limit]
+        next_cursor = encode_cursor(page[-1]) if len(tasks) > limit else None
+        return page, next_cursor
+
+    def count(self, status: Optional[str] = None) -> int:
+        if status is None:
+            return len(self._tasks)
+        return len(self._by_status.get(status, {}))
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite（WAL 模式）存储，多个进程可共享同一个数据库文件"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                {", ".join(f"{field} {self._column_type(field)}" for field in TASK_FIELDS[1:])}
+            )
+        """)
+        # 旧数据库缺少的新字段直接补列
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}
+        for field in TASK_FIELDS:
+            if field not in existing:
+                conn.execute(f"ALTER TABLE tasks ADD COLUMN {field} {self._column_type(field)}")
+        # 列表分页按 (created_at, task_id) 排序，按状态筛选时走 (status, created_at, task_id) 索引
+        conn.execute("DROP INDEX IF EXISTS idx_tasks_status")
+        conn.execute("DROP INDEX IF EXISTS idx_tasks_created_at")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks (status, created_at, task_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks (created_at, task_id)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_batch_id ON tasks (batch_id)")
+        conn.commit()
+
+    @staticmethod
+    def _column_type(field: str) -> str:
+        if field == "processing_time":
+            return "REAL"
+        if field in ("ocr", "page_count", "pages_done"):
+            return "INTEGER"
+        return "TEXT"
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程共享，每个线程一个连接
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _encode(field: str, value):
+        if field in DATETIME_FIELDS and isinstance(value, datetime):
+            return value.isoformat()
+        if field in JSON_FIELDS and value is not None:
+            return json.dumps(value)
+        return value
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> TaskResult:
+        fields = {}
+        for field in row.keys():
+            value = row[field]
+            if field in DATETIME_FIELDS and value is not None:
+                value = datetime.fromisoformat(value)
+            elif field in JSON_FIELDS and value is not None:
+                value = json.loads(value)
+            elif field == "ocr" and value is not None and value != "auto":
+                value = bool(value)
+            fields[field] = value
+        return TaskResult(**fields)
+
+    def create(self, task_id: str, **fields) -> TaskResult:
+        task = TaskResult(task_id, **fields)
+        values = [self._encode(field, getattr(task, field)) for field in TASK_FIELDS]
+        conn = self._conn()
+        conn.execute(
+            f"INSERT INTO tasks ({', '.join(TASK_FIELDS)}) VALUES ({', '.join('?' * len(TASK_FIELDS))})",
+            values
+        )
+        conn.commit()
+        return task
+
+    def get(self, task_id: str) -> Optional[TaskResult]:
+        row = self._conn().execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def update(self, task_id: str, **fields):
+        fields["updated_at"] = datetime.now()
+        columns = ", ".join(f"{field} = ?" for field in fields)
+        values = [self._encode(field, value) for field, value in fields.items()]
+        conn = self._conn()
+        conn.execute(f"UPDATE tasks SET {columns} WHERE task_id = ?", values + [task_id])
+        conn.commit()
+
+    def delete(self, task_id: str):
+        conn = self._conn()
+        conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+        conn.commit()
+
+    def list(self, status: Optional[str] = None, created_before: Optional[datetime] = None,
+             limit: Optional[int] = None, batch_id: Optional[str] = None) -> List[TaskResult]:
+        where, params = [], []
+        if batch_id is not None:
+            where.append("batch_id = ?")
+            params.append(batch_id)
+        if status is not None:
+            where.append("status = ?")
+            params.append(status)
+        if created_before is not None:
+            where.append("created_at < ?")
+            params.append(created_before.isoformat())
+        sql = "SELECT * FROM tasks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._decode(row) for row in self._conn().execute(sql, params).fetchall()]
+
+    def list_page(self, statuses: Optional[List[str]] = None, created_after: Optional[datetime] = None,
+                  created_before: Optional[datetime] = None, filename: Optional[str] = None,
+                  cursor: Optional[str] = None, limit: int = 50,
+                  full: bool = False) -> Tuple[List[TaskResult], Optional[str]]:
+        created_after, created_before = local_naive(created_after), local_naive(created_before)
+        where, params = [], []
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if created_after is not None:
+            where.append("created_at >= ?")
+            params.append(created_after.isoformat())
+        if created_before is not None:
+            where.append("created_at < ?")
+            params.append(created_before.isoformat())
+        if filename:
+            where.append("filename LIKE ? ESCAPE '\\'")
+            escaped = filename.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            params.append(f"%{escaped}%")
+        if cursor:
+            created_at, task_id = decode_cursor(cursor)
+            where.append("(created_at < ? OR (created_at = ? AND task_id < ?))")
+            params.extend([created_at.isoformat(), created_at.isoformat(), task_id])
+        # 默认只取摘要字段，多取一条判断是否还有下一页
+        sql = f"SELECT {'*' if full else ', '.join(SUMMARY_FIELDS)} FROM tasks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, task_id DESC LIMIT ?"
+        params.append(limit + 1)
+        tasks = [self._decode(row) for row in self._conn().execute(sql, params).fetchall()]
+        page = tasks[:limit]
+        next_cursor = encode_cursor(page[-1]) if len(tasks) > limit else None
+        return page, next_cursor
+
+    def count(self, status: Optional[str] = None) -> int:
+        if status is None:
+            row = self._conn().execute("SELECT COUNT(*) FROM tasks").fetchone()
+        else:
+            row = self._conn().execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)).fetchone()
+        return row[0]
+
+
+def create_task_store(url: str = TASK_STORE_URL) -> TaskStore:
+    """根据配置创建任务存储"""
+    if url == "memory":
+        return MemoryTaskStore()
+    if url.startswith("sqlite:///"):
+        # sqlite:///data/tasks.db -> /data/tasks.db
+        db_path = "/" + url[len("sqlite:///"):].lstrip("/")
+        logger.info(f"Using SQLite task store: {db_path}")
+        return SQLiteTaskStore(db_path)
+    raise ValueError(f"Unsupported task store: {url}")
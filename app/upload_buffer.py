@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# 文件名: app/upload_buffer.py
+"""
+上传缓冲 - 接收上传时增量计算 SHA-256，小文件留在内存并通过共享内存交给工作进程，
+超过单文件阈值或内存总预算时才落盘，避免 "写磁盘 -> 工作进程再读回" 的往返
+"""
+import os
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger("mineru-api")
+
+# 单个上传超过该大小直接写磁盘
+UPLOAD_SPOOL_MAX_BYTES = int(os.environ.get("MINERU_UPLOAD_SPOOL_MB", "64")) * 1024 * 1024
+# 所有驻留在共享内存中的上传（含排队中的任务）总上限，超过后新上传落盘
+UPLOAD_MEMORY_BUDGET = int(os.environ.get("MINERU_UPLOAD_MEMORY_MB", "512")) * 1024 * 1024
+CHUNK_SIZE = 4 * 1024 * 1024
+
+_budget_lock = threading.Lock()
+_budget_used = 0
+
+
+def _reserve(size: int) -> bool:
+    global _budget_used
+    with _budget_lock:
+        if _budget_used + size > UPLOAD_MEMORY_BUDGET:
+            return False
+        _budget_used += size
+        return True
+
+
+def _release(size: int):
+    global _budget_used
+    with _budget_lock:
+        _budget_used -= size
+
+
+class Upload:
+    """
+    接收完成的上传：内存中的 (shm) 或磁盘上的 (path) 二选一
+
+    job_fields() 给出传给工作进程的参数；close() 释放共享内存，
+    必须在使用它的所有任务结束后调用
+    """
+
+    def __init__(self, file_path: str, sha256: str, size: int,
+                 shm: Optional[shared_memory.SharedMemory] = None):
+        self.file_path = file_path
+        self.sha256 = sha256
+        self.size = size
+        self.shm = shm
+
+    @property
+    def in_memory(self) -> bool:
+        return self.shm is not None
+
+    @contextmanager
+    def view(self) -> Iterator[memoryview]:
+        """共享内存中内容的视图（不复制），只用于 in_memory 的上传；退出时释放，之后才能 close()"""
+        with self.shm.buf[:self.size] as view:
+            yield view
+
+    def job_fields(self) -> Dict[str, Any]:
+        if self.shm is not None:
+            return {"pdf_shm": (self.shm.name, self.size)}
+        return {}
+
+    def persist(self):
+        """需要真实文件时（例如分页检查、解压）把内存中的内容写到 file_path"""
+        if self.shm is None:
+            return
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        with open(self.file_path, "wb") as f:
+            f.write(self.shm.buf[:self.size])
+        self.close()
+
+    def close(self):
+        if self.shm is None:
+            return
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to release upload buffer {self.shm.name}: {e}")
+        _release(self.size)
+        self.shm = None
+
+
+def raise_multipart_spool_limit():
+    """
+    Starlette 的 multipart 解析器把超过 1MB 的文件先写入 SpooledTemporaryFile 的磁盘文件，
+    receive_upload 再从磁盘读回；把该阈值提高到 UPLOAD_SPOOL_MAX_BYTES，
+    不超过阈值的上传在解析阶段也只留在内存
+    """
+    try:
+        from starlette.formparsers import MultiPartParser
+    except ImportError:
+        return
+    # 新版本 Starlette 改名为 spool_max_size（max_part_size 是非文件字段的上限，不能改）
+    attr = "spool_max_size" if hasattr(MultiPartParser, "spool_max_size") else "max_file_size"
+    if getattr(MultiPartParser, attr, 0) < UPLOAD_SPOOL_MAX_BYTES:
+        setattr(MultiPartParser, attr, UPLOAD_SPOOL_MAX_BYTES)
+
+
+async def receive_upload(file, file_path: str) -> Upload:
+    """
+    读取 UploadFile，同时计算 SHA-256；不超过阈值且内存预算充足时放入共享内存，
+    否则写入 file_path（需先调用 raise_multipart_spool_limit，否则解析阶段已落盘）
+    """
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    spill = None
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            size += len(chunk)
+            if spill is None and size > UPLOAD_SPOOL_MAX_BYTES:
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                spill = open(file_path, "wb")
+                spill.write(buffer)
+                buffer = bytearray()
+            if spill is not None:
+                spill.write(chunk)
+            else:
+                buffer.extend(chunk)
+    finally:
+        if spill is not None:
+            spill.close()
+
+    if spill is None:
+        if size > 0 and _reserve(size):
+            try:
+                shm = shared_memory.SharedMemory(create=True, size=size)
+            except OSError as e:
+                # /dev/shm 空间不足等情况退回磁盘
+                logger.warning(f"Shared memory unavailable, spooling upload to disk: {e}")
+                _release(size)
+            else:
+                shm.buf[:size] = buffer
+                return Upload(file_path, hasher.hexdigest(), size, shm)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(buffer)
+    return Upload(file_path, hasher.hexdigest(), size)
+
+
+def read_shared(name: str, size: int) -> bytes:
+    """工作进程中读取父进程放入共享内存的 PDF 内容"""
+    # spawn 出的工作进程与父进程共用同一个 resource_tracker，附加时的重复登记无副作用，
+    # 共享内存只由父进程 unlink
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+
+
+def budget_stats() -> Tuple[int, int]:
+    """(已用字节, 总预算)"""
+    return _budget_used, UPLOAD_MEMORY_BUDGET
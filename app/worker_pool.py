@@ -0,0 +1,546 @@
+#!/usr/bin/env python3
+# 文件名: app/worker_pool.py
+"""
+常驻工作进程池 - 每个工作进程启动时加载一次 magic_pdf 模型，之后循环处理任务，
+避免每个文档都重新导入 torch/paddle 并重建 CustomPEKModel
+"""
+import os
+import math
+import time
+import shutil
+import signal
+import logging
+import threading
+import traceback
+import multiprocessing
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Any
+
+import metrics
+from job_queue import JobQueue, QueuedJob, QueueFull, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+logger = logging.getLogger("mineru-api")
+
+# 进程池配置（可通过环境变量覆盖）
+POOL_SIZE = int(os.environ.get("MINERU_POOL_SIZE", "2"))
+MAX_JOBS_PER_WORKER = int(os.environ.get("MINERU_MAX_JOBS_PER_WORKER", "100"))  # 0 表示不回收
+WORKER_START_TIMEOUT = int(os.environ.get("MINERU_WORKER_START_TIMEOUT", "600"))
+# 单个任务的硬超时 = 基础时间 + 每页预算，不超过上限；超时后杀掉工作进程所在的整个进程组
+JOB_TIMEOUT_BASE = float(os.environ.get("MINERU_JOB_TIMEOUT_BASE", "120"))
+JOB_TIMEOUT_PER_PAGE = float(os.environ.get("MINERU_JOB_TIMEOUT_PER_PAGE", "10"))
+JOB_TIMEOUT_MAX = float(os.environ.get("MINERU_JOB_TIMEOUT_MAX", "3600"))
+# 模型加载后在内置单页 PDF 上跑一次推理预热，完成后才算就绪（0 表示不预热）
+WORKER_WARMUP = os.environ.get("MINERU_WARMUP", "1") not in ("0", "false", "no")
+# 跨文档批量推理：所有工作进程都忙时，一次最多从队列凑多少个文档、最多等待多久
+INFER_BATCH_MAX_DOCS = int(os.environ.get("MINERU_INFER_BATCH_MAX_DOCS", "4"))  # 1 表示不凑批
+INFER_BATCH_MAX_WAIT = float(os.environ.get("MINERU_INFER_BATCH_MAX_WAIT_MS", "50")) / 1000
+
+
+class WorkerCrashed(Exception):
+    """工作进程在处理任务期间异常退出"""
+
+
+class JobFailed(Exception):
+    """工作进程内处理任务时抛出异常"""
+
+
+class JobAborted(Exception):
+    """任务被调用方中止（例如同步请求超时或任务被删除），工作进程已被杀掉"""
+
+
+def job_timeout(page_count: Optional[int]) -> float:
+    """按页数计算任务超时；页数未知时使用上限"""
+    if not page_count:
+        return JOB_TIMEOUT_MAX
+    return min(JOB_TIMEOUT_MAX, JOB_TIMEOUT_BASE + JOB_TIMEOUT_PER_PAGE * page_count)
+
+
+def _load_shared(job: Dict[str, Any]) -> Dict[str, Any]:
+    """把 pdf_shm（父进程共享内存中的 PDF）换成 pdf_bytes"""
+    if "pdf_shm" not in job:
+        return job
+    from upload_buffer import read_shared
+    job = dict(job)
+    job["pdf_bytes"] = read_shared(*job.pop("pdf_shm"))
+    return job
+
+
+def _run_job(pipeline, job: Dict[str, Any], report: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """
+    执行单个文档任务，或一组文档合并推理（批量模式，单个失败不影响其他文档）；
+    stream_pages 任务逐页解析，每完成一段通过 report 上报进度；
+    pdf_shm 表示 PDF 内容在父进程的共享内存中，不必从磁盘读取
+    """
+    if "documents" in job:
+        return {"results": pipeline.parse_batch([_load_shared(document) for document in job["documents"]])}
+    job = _load_shared(job)
+    if job.get("stream_pages"):
+        kwargs = {key: value for key, value in job.items() if key != "stream_pages"}
+        return pipeline.parse_pdf_streaming(**kwargs, report=report)
+    return pipeline.parse_pdf(**job)
+
+
+def _observe(output: Dict[str, Any]):
+    """把工作进程带回的阶段耗时与页数写入指标"""
+    if "results" in output:
+        for item in output["results"]:
+            if item["status"] == "ok":
+                metrics.observe_result(item["result"])
+    else:
+        metrics.observe_result(output)
+
+
+def _batchable(entry: QueuedJob) -> bool:
+    """普通单文档任务才能合并，/batch 的文档组本身已是一批，逐页流式任务需要单独执行"""
+    return "documents" not in entry.job and not entry.job.get("stream_pages")
+
+
+def _worker_main(conn, worker_id: int, warmup: bool = WORKER_WARMUP):
+    """工作进程入口：加载模型并预热后循环接收任务"""
+    # 独立进程组，超时时连同推理框架派生的子进程一起杀掉
+    try:
+        os.setsid()
+    except OSError:
+        pass
+    import patch_magic_pdf
+    import pipeline
+    patch_magic_pdf.apply_patch()
+
+    load_start = time.time()
+    try:
+        pipeline.load_models()
+    except Exception as e:
+        # 预加载失败不致命，首个任务会再次尝试加载
+        print(f"[worker {worker_id}] 模型预加载失败: {e}")
+
+    load_seconds = time.time() - load_start
+
+    # 预热失败同样不致命，但该进程不计入就绪（/ready）
+    warmup_seconds = None
+    if warmup:
+        try:
+            warmup_seconds = pipeline.warmup()
+        except Exception as e:
+            print(f"[worker {worker_id}] 预热失败: {e}")
+
+    conn.send(("ready", os.getpid(), load_seconds, warmup_seconds))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if job is None:
+            break
+        try:
+            conn.send(("ok", _run_job(pipeline, job, lambda progress: conn.send(("progress", progress)))))
+        except Exception as e:
+            conn.send(("error", f"{e}\n{traceback.format_exc()}"))
+
+    conn.close()
+
+
+class _WorkerSlot:
+    """父进程中的一个槽位：独占一个工作进程，从共享队列取任务并转发"""
+
+    def __init__(self, pool: "WorkerPool", index: int):
+        self.pool = pool
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.jobs_done = 0
+        self.busy = False
+        # 正在执行的任务的 job_id，以及其中被要求中止的 job_id
+        self.current_job_ids: set = set()
+        self.aborted_job_ids: set = set()
+        # 模型已加载且预热完成（或未开启预热）
+        self.ready = False
+        self.thread = threading.Thread(target=self._run, name=f"mineru-worker-{index}", daemon=True)
+
+    def start_process(self):
+        ctx = self.pool.ctx
+        parent_conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, self.index, self.pool.warmup),
+                                   daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.conn = parent_conn
+        self.jobs_done = 0
+
+        # 等待模型加载完成
+        deadline = time.time() + WORKER_START_TIMEOUT
+        while time.time() < deadline:
+            if self.conn.poll(1.0):
+                _, pid, load_seconds, warmup_seconds = self.conn.recv()
+                metrics.MODEL_LOAD_SECONDS.observe(load_seconds)
+                if warmup_seconds is not None:
+                    metrics.STAGE_SECONDS.labels(stage="warmup").observe(warmup_seconds)
+                    logger.info(f"Worker {self.index} ready (pid={pid}, models loaded in {load_seconds:.1f}s, "
+                                f"warmed up in {warmup_seconds:.1f}s)")
+                elif self.pool.warmup:
+                    logger.warning(f"Worker {self.index} started without warmup (pid={pid}), not counted as ready")
+                else:
+                    logger.info(f"Worker {self.index} ready (pid={pid}, models loaded in {load_seconds:.1f}s)")
+                self.ready = warmup_seconds is not None or not self.pool.warmup
+                return
+            if not self.process.is_alive():
+                raise WorkerCrashed(f"Worker {self.index} exited during startup (code={self.process.exitcode})")
+        raise WorkerCrashed(f"Worker {self.index} did not become ready in {WORKER_START_TIMEOUT}s")
+
+    def stop_process(self, kill: bool = False):
+        self.ready = False
+        if self.process is None:
+            return
+        try:
+            if kill:
+                self._kill_group()
+            else:
+                self.conn.send(None)
+            self.process.join(timeout=10)
+            if self.process.is_alive():
+                self._kill_group()
+                self.process.join(timeout=5)
+        except Exception as e:
+            logger.warning(f"Error stopping worker {self.index}: {e}")
+        finally:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.process = None
+            self.conn = None
+
+    def _kill_group(self):
+        """杀掉工作进程及其进程组内的所有子进程"""
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+        if self.process.is_alive():
+            self.process.kill()
+
+    def _ensure_process(self):
+        if self.process is not None and self.process.is_alive():
+            return
+        if self.process is not None:
+            logger.warning(f"Worker {self.index} died (code={self.process.exitcode}), restarting")
+            self.stop_process(kill=True)
+        self.start_process()
+
+    def _run(self):
+        # 启动时即加载模型，第一个任务不再承担冷启动开销
+        try:
+            self._ensure_process()
+        except Exception as e:
+            logger.error(f"Failed to start worker {self.index}: {e}")
+
+        while True:
+            entry = self.pool._jobs.get(on_take=self._claim)
+            if entry is None:
+                break
+            self._handle(entry)
+
+            # 处理一定数量任务后回收进程，释放可能泄漏的显存/内存
+            if self.pool.max_jobs_per_worker and self.jobs_done >= self.pool.max_jobs_per_worker:
+                logger.info(f"Recycling worker {self.index} after {self.jobs_done} jobs")
+                self.stop_process()
+            # 崩溃或超时被杀掉的进程立即替换，保持池内进程常热
+            try:
+                self._ensure_process()
+            except Exception as e:
+                logger.error(f"Failed to restart worker {self.index}: {e}")
+
+        self.stop_process()
+
+    def _claim(self, entry: QueuedJob):
+        """在队列锁内登记刚取出的任务，此后 abort / is_active 都能在本槽位找到它"""
+        if entry.job_id:
+            self.current_job_ids.add(entry.job_id)
+
+    def _handle(self, first: QueuedJob):
+        """执行取出的任务（可能与队列中的其他任务合并），结果回填各自的 Future"""
+        entries = [e for e in self._gather(first) if e.future.set_running_or_notify_cancel()]
+        if not entries:
+            self.current_job_ids = set()
+            self.aborted_job_ids = set()
+            return
+        for entry in entries:
+            priority = "interactive" if entry.priority == PRIORITY_INTERACTIVE else "bulk"
+            metrics.QUEUE_WAIT_SECONDS.labels(priority=priority).observe(time.time() - entry.enqueued_at)
+            if entry.on_start is not None:
+                try:
+                    entry.on_start()
+                except Exception as e:
+                    logger.warning(f"Job start callback failed: {e}")
+        self.busy = True
+        started = time.time()
+        try:
+            # 凑批与开始回调期间已被中止的任务不再执行
+            entries = [entry for entry in entries if not self._aborted(entry)]
+            if len(entries) == 1:
+                output = self._execute(entries[0].job, entries[0].timeout, entries[0].on_progress,
+                                       self.current_job_ids)
+                _observe(output)
+                entries[0].future.set_result(output)
+            elif entries:
+                self._execute_batch(entries)
+        except Exception as e:
+            for entry in entries:
+                if not entry.future.done():
+                    entry.future.set_exception(e)
+        finally:
+            self.busy = False
+            self.current_job_ids = set()
+            self.aborted_job_ids = set()
+            self.pool._record_duration((time.time() - started) / max(1, len(entries)))
+
+    def _gather(self, first: QueuedJob) -> List[QueuedJob]:
+        """
+        其他工作进程都在忙时，从队列再取几个单文档任务与 first 合并推理，
+        让 GPU 一次处理多个文档的页面；有空闲进程时不凑批，避免抢走它们的任务
+        """
+        pool = self.pool
+        if pool.batch_max_docs <= 1 or not _batchable(first):
+            return [first]
+        if any(not slot.busy for slot in pool._slots if slot is not self):
+            return [first]
+
+        # 只合并同一优先级的任务，交互式请求不会被拖进批量上传的批次
+        def accept(entry: QueuedJob) -> bool:
+            return _batchable(entry) and entry.priority == first.priority
+
+        entries = [first]
+        deadline = time.time() + pool.batch_max_wait
+        while len(entries) < pool.batch_max_docs:
+            entry = pool._jobs.get_more(accept, deadline - time.time(), on_take=self._claim)
+            if entry is None:
+                break
+            entries.append(entry)
+        return entries
+
+    def _execute_batch(self, entries: List[QueuedJob]):
+        """
+        合并执行多个单文档任务，结果分别回填各自的 Future
+
+        合并推理的超时取各文档预算中最小的一个；超时后逐个重跑，每个文档只用预算的剩余部分
+        （从合并推理开始算起，含重启进程与前面文档重跑的时间），预算已用完的直接以 TimeoutError 结束，
+        任何文档的硬超时都不会因合并而放宽
+
+        只有批内所有任务都被中止时才杀掉进程；部分中止时其余文档照常完成，
+        被中止文档的结果丢弃
+        """
+        timeouts = [entry.timeout for entry in entries if entry.timeout]
+        timeout = min(timeouts) if timeouts else None
+        # 批内有不可中止（没有 job_id）的任务时永远不杀进程
+        job_ids = self.current_job_ids if all(entry.job_id for entry in entries) else None
+        started = time.time()
+        try:
+            output = self._execute({"documents": [entry.job for entry in entries]}, timeout, job_ids=job_ids)
+        except TimeoutError:
+            logger.warning(f"Worker {self.index} batch of {len(entries)} documents timed out after "
+                           f"{timeout:.0f}s, retrying one by one")
+            for entry in entries:
+                if self._aborted(entry):
+                    continue
+                try:
+                    # 被杀掉的进程先补上，重新加载模型的时间同样计入该文档的预算
+                    self._ensure_process()
+                    remaining = entry.timeout - (time.time() - started) if entry.timeout else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(f"Processing timeout after {entry.timeout:.0f} seconds")
+                    output = self._execute(entry.job, remaining, entry.on_progress,
+                                           {entry.job_id} - {None})
+                    _observe(output)
+                    entry.future.set_result(output)
+                except Exception as e:
+                    entry.future.set_exception(e)
+            return
+        for entry, item in zip(entries, output["results"]):
+            if self._aborted(entry):
+                continue
+            if item["status"] == "ok":
+                metrics.observe_result(item["result"])
+                entry.future.set_result(item["result"])
+            else:
+                entry.future.set_exception(JobFailed(item["error"]))
+
+    def _aborted(self, entry: QueuedJob) -> bool:
+        """批内单个任务已被中止：以 JobAborted 结束其 Future 并删除它的输出目录"""
+        if not entry.job_id or entry.job_id not in self.aborted_job_ids:
+            return False
+        entry.future.set_exception(JobAborted(f"Worker {self.index} job {entry.job_id} aborted"))
+        output_dir = entry.job.get("output_dir")
+        if output_dir:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        return True
+
+    def _execute(self, job: Dict[str, Any], timeout: Optional[float],
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                 job_ids: Optional[set] = None) -> Dict[str, Any]:
+        """job_ids 中的任务全部被中止时杀掉进程组"""
+        self._ensure_process()
+        self.conn.send(job)
+        deadline = time.time() + timeout if timeout else None
+        if timeout:
+            metrics.JOB_TIMEOUT_SECONDS.observe(timeout)
+
+        while True:
+            try:
+                if self.conn.poll(1.0):
+                    status, payload = self.conn.recv()
+                    if status != "progress":
+                        break
+                    # 逐页进度，转交给提交方后继续等待最终结果
+                    if on_progress is not None:
+                        try:
+                            on_progress(payload)
+                        except Exception as e:
+                            logger.warning(f"Job progress callback failed: {e}")
+                    continue
+            except (EOFError, OSError):
+                self.stop_process(kill=True)
+                raise WorkerCrashed(f"Worker {self.index} connection lost")
+            if not self.process.is_alive():
+                code = self.process.exitcode
+                self.stop_process(kill=True)
+                raise WorkerCrashed(f"Worker {self.index} crashed (code={code})")
+            if job_ids and job_ids <= self.aborted_job_ids:
+                self.stop_process(kill=True)
+                metrics.JOB_KILLS_TOTAL.labels(reason="aborted").inc()
+                raise JobAborted(f"Worker {self.index} job aborted")
+            if deadline and time.time() > deadline:
+                self.stop_process(kill=True)
+                metrics.JOB_KILLS_TOTAL.labels(reason="timeout").inc()
+                raise TimeoutError(f"Processing timeout after {timeout:.0f} seconds")
+
+        self.jobs_done += 1
+        if status != "ok":
+            raise JobFailed(payload)
+        return payload
+
+
+class WorkerPool:
+    """常驻工作进程池"""
+
+    def __init__(self, size: int = POOL_SIZE, max_jobs_per_worker: int = MAX_JOBS_PER_WORKER,
+                 batch_max_docs: int = INFER_BATCH_MAX_DOCS, batch_max_wait: float = INFER_BATCH_MAX_WAIT,
+                 warmup: bool = WORKER_WARMUP):
+        self.size = size
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.warmup = warmup
+        self.batch_max_docs = batch_max_docs
+        self.batch_max_wait = batch_max_wait
+        # 使用 spawn，避免 fork 后 CUDA 上下文不可用
+        self.ctx = multiprocessing.get_context("spawn")
+        self._jobs = JobQueue()
+        metrics.bind_worker_pool(lambda: len(self._jobs), lambda: self.busy_workers)
+        self._slots = [_WorkerSlot(self, i) for i in range(size)]
+        self._started = False
+        # 任务耗时的指数滑动平均，用于估算 Retry-After
+        self.avg_job_seconds = 30.0
+
+    def start(self):
+        if self._started:
+            return
+        for slot in self._slots:
+            slot.thread.start()
+        self._started = True
+        logger.info(f"Worker pool started with {self.size} workers")
+
+    def submit(self, job: Dict[str, Any], timeout: Optional[float] = None, priority: int = PRIORITY_BULK,
+               group: str = "default", job_id: Optional[str] = None,
+               on_start: Optional[Callable[[], None]] = None,
+               on_progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Future:
+        """提交任务，返回 concurrent.futures.Future；队列已满时抛出 QueueFull"""
+        return self.submit_many([job], timeout, priority, group, job_id, on_start,
+                                on_progress=on_progress)[0]
+
+    def submit_many(self, jobs: List[Dict[str, Any]], timeout: Optional[float] = None,
+                    priority: int = PRIORITY_BULK, group: str = "default", job_id: Optional[str] = None,
+                    on_start: Optional[Callable[[], None]] = None,
+                    on_starts: Optional[List[Callable[[], None]]] = None,
+                    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    timeouts: Optional[List[float]] = None) -> List[Future]:
+        """
+        原子地提交一组任务（例如同一文档的分片），要么全部入队要么全部拒绝
+
+        on_start 只在第一个任务开始时调用；on_starts 为每个任务分别指定回调；
+        on_progress 在工作进程上报逐页进度时调用（在槽位线程中执行）；
+        timeouts 为每个任务分别指定超时（覆盖 timeout）
+        """
+        if on_starts is None:
+            on_starts = [on_start] + [None] * (len(jobs) - 1)
+        if timeouts is None:
+            timeouts = [timeout] * len(jobs)
+        entries = [
+            QueuedJob(job, job_timeout_seconds, Future(), priority, group, job_id, callback, on_progress)
+            for job, callback, job_timeout_seconds in zip(jobs, on_starts, timeouts)
+        ]
+        try:
+            self._jobs.put_many(entries)
+        except QueueFull as e:
+            e.retry_after = self.retry_after()
+            raise
+        return [entry.future for entry in entries]
+
+    def run(self, job: Dict[str, Any], timeout: Optional[float] = None, **kwargs) -> Dict[str, Any]:
+        """提交任务并阻塞等待结果"""
+        return self.submit(job, timeout, **kwargs).result()
+
+    def _record_duration(self, seconds: float):
+        self.avg_job_seconds = 0.8 * self.avg_job_seconds + 0.2 * seconds
+
+    def retry_after(self) -> int:
+        """按当前排队深度和平均耗时估算客户端应等待的秒数"""
+        return max(1, math.ceil(len(self._jobs) * self.avg_job_seconds / max(1, self.size)))
+
+    def abort(self, job_id: str) -> bool:
+        """
+        中止某个 job_id 的全部任务：排队中的直接取消；执行中的由槽位线程杀掉工作进程组
+        （槽位随后补上新进程），与其他任务合并执行时只丢弃它的结果，不影响同批任务；
+        返回是否有任务被中止
+        """
+        cancelled = self._jobs.cancel(job_id)
+        running = False
+        for slot in self._slots:
+            if job_id in slot.current_job_ids:
+                slot.aborted_job_ids.add(job_id)
+                running = True
+        return bool(cancelled) or running
+
+    def is_active(self, job_id: str) -> bool:
+        """job_id 的任务仍在排队或正在执行"""
+        if self._jobs.position(job_id) is not None:
+            return True
+        return any(job_id in slot.current_job_ids for slot in self._slots)
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        return self._jobs.position(job_id)
+
+    def queue_stats(self) -> Dict[str, int]:
+        return self._jobs.stats()
+
+    @property
+    def busy_workers(self) -> int:
+        return sum(1 for slot in self._slots if slot.busy)
+
+    @property
+    def alive_workers(self) -> int:
+        return sum(1 for slot in self._slots if slot.process is not None and slot.process.is_alive())
+
+    @property
+    def ready_workers(self) -> int:
+        return sum(1 for slot in self._slots
+                   if slot.ready and slot.process is not None and slot.process.is_alive())
+
+    @property
+    def accepting(self) -> bool:
+        """队列未满且未关闭"""
+        return self._started and self._jobs.accepting
+
+    def shutdown(self):
+        self._jobs.close()
+        for slot in self._slots:
+            if slot.thread.is_alive():
+                slot.thread.join(timeout=15)
+        self._started = False
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+# 文件名: tests/benchmark.py
+"""
+基准测试与压测工具 - 生成合成 PDF 语料，直接通过工作进程池（pipeline 模式）
+或通过 HTTP 接口（http 模式）按指定并发解析，输出 JSON 结果便于跨提交对比
+
+默认 CPU 模式，不访问外网:
+    python tests/benchmark.py --docs 8 --pages 4 --concurrency 2 -o bench.json
+    python tests/benchmark.py --mode http --serve --endpoint async --baseline bench.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+APP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app")
+
+WORDS = (
+    "analysis model layout document page table formula revenue market report quarter "
+    "growth result method system data value index risk capital policy region sector"
+).split()
+
+
+# ---------------------------------------------------------------- 语料生成
+
+def page_text(rng: random.Random, title: str) -> str:
+    paragraphs = [title]
+    for _ in range(rng.randint(4, 7)):
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 80))) + ".")
+    return "\n\n".join(paragraphs)
+
+
+def make_pdf(path: str, pages: int, kind: str, rng: random.Random, nonce: str):
+    """
+    kind=text 生成带文字层的 PDF；kind=scanned 把排好版的页面栅格化成图片，
+    没有文字层，会走 OCR
+    """
+    import fitz
+
+    doc = fitz.open()
+    for index in range(pages):
+        page = doc.new_page(width=595, height=842)  # A4
+        text = page_text(rng, f"Section {index + 1} ({nonce})")
+        if kind == "text":
+            page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=11)
+        else:
+            with fitz.open() as scratch:
+                scratch_page = scratch.new_page(width=595, height=842)
+                scratch_page.insert_textbox(fitz.Rect(50, 50, 545, 792), text, fontsize=11)
+                pixmap = scratch_page.get_pixmap(dpi=150)
+            page.insert_image(page.rect, pixmap=pixmap)
+    doc.save(path)
+    doc.close()
+
+
+def build_corpus(workdir: str, docs: int, pages: int, kinds: List[str], seed: int) -> List[Dict[str, Any]]:
+    """生成语料；每次运行带不同 nonce，避免命中结果缓存"""
+    rng = random.Random(seed)
+    nonce = uuid.uuid4().hex[:8]
+    corpus_dir = os.path.join(workdir, "corpus")
+    os.makedirs(corpus_dir, exist_ok=True)
+    corpus = []
+    for index in range(docs):
+        kind = kinds[index % len(kinds)]
+        path = os.path.join(corpus_dir, f"{kind}_{index:03d}.pdf")
+        make_pdf(path, pages, kind, rng, nonce)
+        corpus.append({"path": path, "kind": kind, "pages": pages})
+    return corpus
+
+
+# ---------------------------------------------------------------- 内存采样
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def _tree_pids(root: int) -> List[int]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+    pids, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+class RssSampler(threading.Thread):
+    """定期采样进程树（含工作进程）的 RSS 总和，记录峰值"""
+
+    def __init__(self, root_pid: int, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.root_pid = root_pid
+        self.interval = interval
+        self.peak = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.peak = max(self.peak, sum(_rss_bytes(pid) for pid in _tree_pids(self.root_pid)))
+            self._stop_event.wait(self.interval)
+
+    def stop(self) -> int:
+        self._stop_event.set()
+        self.join(timeout=5)
+        return self.peak
+
+
+# ---------------------------------------------------------------- 负载执行
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    # nearest-rank
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def latency_summary(values: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": sum(values) / len(values) if values else None,
+        "max": max(values) if values else None,
+    }
+
+
+def run_load(corpus: List[Dict[str, Any]], concurrency: int,
+             process: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+    """闭环压测：concurrency 个客户端各自串行提交文档"""
+    samples = []
+    errors = []
+    lock = threading.Lock()
+
+    def one(doc: Dict[str, Any]):
+        start = time.time()
+        try:
+            process(doc)
+        except Exception as e:
+            with lock:
+                errors.append(f"{os.path.basename(doc['path'])}: {e}")
+            return
+        with lock:
+            samples.append((doc, time.time() - start))
+
+    wall_start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, corpus))
+    wall = time.time() - wall_start
+
+    latencies = [seconds for _, seconds in samples]
+    pages = sum(doc["pages"] for doc, _ in samples)
+    by_kind = {}
+    for kind in sorted({doc["kind"] for doc in corpus}):
+        by_kind[kind] = latency_summary([seconds for doc, seconds in samples if doc["kind"] == kind])
+    return {
+        "wall_seconds": wall,
+        "completed": len(samples),
+        "errors": errors,
+        "latency_seconds": latency_summary(latencies),
+        "latency_by_kind": by_kind,
+        "docs_per_sec": len(samples) / wall if wall else None,
+        "pages_per_sec": pages / wall if wall else None,
+    }
+
+
+def use_cpu():
+    """magic_pdf 优先读取 MINERU_DEVICE_MODE，同时对 torch 隐藏 GPU"""
+    os.environ["MINERU_DEVICE_MODE"] = "cpu"
+    os.environ["CUDA_VISIBLE_DEVICES"] = ""
+
+
+def bench_pipeline(warmup: List[Dict[str, Any]], corpus: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """不经过 HTTP，直接使用常驻工作进程池"""
+    sys.path.insert(0, APP_DIR)
+    from worker_pool import WorkerPool, WORKER_START_TIMEOUT
+
+    output_root = os.path.join(args.workdir, "results")
+    pool = WorkerPool(size=args.concurrency)
+    sampler = RssSampler(os.getpid())
+    sampler.start()
+
+    startup = time.time()
+    pool.start()
+    deadline = time.time() + WORKER_START_TIMEOUT
+    while pool.ready_workers < args.concurrency and time.time() < deadline:
+        time.sleep(0.5)
+    startup = time.time() - startup
+
+    def process(doc: Dict[str, Any]):
+        name = os.path.splitext(os.path.basename(doc["path"]))[0]
+        job = {
+            "file_path": doc["path"],
+            "output_dir": os.path.join(output_root, f"{name}_{uuid.uuid4().hex[:6]}"),
+            "ocr": args.force_ocr or doc["kind"] == "scanned",
+        }
+        pool.run(job, timeout=args.timeout)
+
+    try:
+        for doc in warmup:
+            process(doc)
+        report = run_load(corpus, args.concurrency, process)
+    finally:
+        pool.shutdown()
+    report["startup_seconds"] = startup
+    report["peak_rss_mb"] = sampler.stop() / (1024 * 1024)
+    return report
+
+
+def _request(url: str, data: Optional[bytes] = None, headers: Optional[Dict[str, str]] = None,
+             timeout: float = 600) -> Dict[str, Any]:
+    """发送请求；503 时按 Retry-After 等待后重试"""
+    while True:
+        request = urllib.request.Request(url, data=data, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code != 503:
+                raise RuntimeError(f"HTTP {e.code}: {e.read()[:200]!r}")
+            time.sleep(float(e.headers.get("Retry-After", "1")))
+
+
+def _post_pdf(url: str, path: str, timeout: float) -> Dict[str, Any]:
+    boundary = uuid.uuid4().hex
+    with open(path, "rb") as f:
+        content = f.read()
+    body = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{os.path.basename(path)}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + content + f"\r\n--{boundary}--\r\n".encode()
+    headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+    return _request(url, body, headers, timeout)
+
+
+def start_server(args) -> subprocess.Popen:
+    """在本机启动 API 服务（继承当前环境变量，包括 CPU 模式设置）"""
+    host, port = "127.0.0.1", str(args.port)
+    args.url = f"http://{host}:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", host, "--port", port, "--workers", "1"],
+        cwd=APP_DIR,
+    )
+    deadline = time.time() + args.timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}")
+        # /ready 在工作进程完成模型加载与预热前返回 503
+        try:
+            with urllib.request.urlopen(f"{args.url}/ready", timeout=5):
+                return server
+        except Exception:
+            time.sleep(1)
+    server.terminate()
+    raise RuntimeError("Server did not become ready in time")
+
+
+def bench_http(warmup: List[Dict[str, Any]], corpus: List[Dict[str, Any]], args) -> Dict[str, Any]:
+    """通过 HTTP 接口压测；sync 使用 /process_pdf_and_return/，async 上传后轮询 /tasks/{id}"""
+    server = start_server(args) if args.serve else None
+    root_pid = server.pid if server else args.server_pid
+    sampler = RssSampler(root_pid) if root_pid else None
+    if sampler:
+        sampler.start()
+
+    def process(doc: Dict[str, Any]):
+        ocr = "true" if args.force_ocr or doc["kind"] == "scanned" else "false"
+        if args.endpoint == "sync":
+            result = _post_pdf(f"{args.url}/process_pdf_and_return/?ocr={ocr}", doc["path"], args.timeout)
+            if result.get("status") != "completed":
+                raise RuntimeError(result)
+            return
+        task_id = _post_pdf(f"{args.url}/upload_and_process_pdf/?ocr={ocr}", doc["path"], args.timeout)["task_id"]
+        deadline = time.time() + args.timeout
+        while time.time() < deadline:
+            task = _request(f"{args.url}/tasks/{task_id}", timeout=30)
+            if task["status"] == "completed":
+                return
+            if task["status"] == "failed":
+                raise RuntimeError(task.get("error"))
+            time.sleep(args.poll_interval)
+        raise TimeoutError(f"Task {task_id} not finished in {args.timeout}s")
+
+    try:
+        for doc in warmup:
+            process(doc)
+        report = run_load(corpus, args.concurrency, process)
+    finally:
+        peak_rss = sampler.stop() if sampler else None
+        if server:
+            server.terminate()
+            server.wait(timeout=30)
+    report["endpoint"] = args.endpoint
+    report["peak_rss_mb"] = peak_rss / (1024 * 1024) if peak_rss is not None else None
+    return report
+
+
+# ---------------------------------------------------------------- 报告
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(APP_DIR), timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]):
+    """打印与基线结果的相对变化"""
+    rows = [
+        ("docs_per_sec", lambda r: r.get("docs_per_sec")),
+        ("pages_per_sec", lambda r: r.get("pages_per_sec")),
+        ("latency_p50", lambda r: r["latency_seconds"].get("p50")),
+        ("latency_p95", lambda r: r["latency_seconds"].get("p95")),
+        ("latency_p99", lambda r: r["latency_seconds"].get("p99")),
+        ("peak_rss_mb", lambda r: r.get("peak_rss_mb")),
+    ]
+    print(f"对比基线 {baseline.get('commit')} -> {report.get('commit')}", file=sys.stderr)
+    for name, getter in rows:
+        old, new = getter(baseline), getter(report)
+        if old and new is not None:
+            print(f"  {name:14s} {old:10.3f} -> {new:10.3f} ({(new - old) / old * 100:+.1f}%)", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MinerU 基准测试与压测")
+    parser.add_argument("--mode", choices=["pipeline", "http"], default="pipeline")
+    parser.add_argument("--docs", type=int, default=8, help="语料文档数")
+    parser.add_argument("--pages", type=int, default=4, help="每个文档的页数")
+    parser.add_argument("--kind", choices=["text", "scanned", "both"], default="both",
+                        help="text 为带文字层的 PDF，scanned 为纯图片扫描件")
+    parser.add_argument("--concurrency", type=int, default=2,
+                        help="并发客户端数；pipeline 模式下同时也是工作进程数")
+    parser.add_argument("--force-ocr", action="store_true", help="文字型 PDF 也使用 OCR 模式")
+    parser.add_argument("--device", choices=["cpu", "config"], default="cpu",
+                        help="cpu 强制 CPU 推理；config 使用 magic-pdf.json 中的设置")
+    parser.add_argument("--warmup", type=int, default=1, help="正式计时前预跑的文档数")
+    parser.add_argument("--timeout", type=float, default=1800, help="单个文档的超时（秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None, help="语料与结果目录，默认临时目录")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="http 模式的服务地址")
+    parser.add_argument("--endpoint", choices=["sync", "async"], default="sync")
+    parser.add_argument("--serve", action="store_true", help="http 模式下在本机启动服务")
+    parser.add_argument("--port", type=int, default=18000, help="--serve 使用的端口")
+    parser.add_argument("--server-pid", type=int, default=None, help="统计该进程树的峰值 RSS")
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("-o", "--output", default=None, help="结果 JSON 输出文件")
+    parser.add_argument("--baseline", default=None, help="与之前的结果 JSON 对比")
+    args = parser.parse_args(argv)
+
+    if args.device == "cpu":
+        use_cpu()
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="mineru-bench-")
+    kinds = ["text", "scanned"] if args.kind == "both" else [args.kind]
+    corpus = build_corpus(args.workdir, args.docs + args.warmup, args.pages, kinds, args.seed)
+    # 预跑文档不计入统计
+    warmup, measured = corpus[:args.warmup], corpus[args.warmup:]
+
+    bench = bench_pipeline if args.mode == "pipeline" else bench_http
+    report = bench(warmup, measured, args)
+
+    report.update({
+        "commit": git_commit(),
+        "mode": args.mode,
+        "device": args.device,
+        "concurrency": args.concurrency,
+        "corpus": {"docs": len(measured), "pages_per_doc": args.pages, "kinds": kinds},
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    })
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,13 @@
+# 文件名: tests/conftest.py
+"""单元测试直接导入 app 下的模块（容器内 tests 挂载在 /app/tests，模块在 /app）"""
+import os
+import sys
+
+_here = os.path.dirname(os.path.abspath(__file__))
+for _path in (os.path.join(_here, "..", "app"), os.path.join(_here, "..")):
+    if os.path.exists(os.path.join(_path, "job_queue.py")):
+        sys.path.insert(0, os.path.abspath(_path))
+        break
+
+# 脚本式的模型检查，需要 magic_pdf 与 GPU 环境，不作为单元测试收集
+collect_ignore = ["test_config.py"]
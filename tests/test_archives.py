@@ -0,0 +1,54 @@
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+import archives
+from archives import ArchiveTooLarge, extract_pdfs
+
+
+def write_zip(path, entries):
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in entries.items():
+            archive.writestr(name, data)
+
+
+def test_extract_pdfs_flattens_and_skips_other_files(tmp_path):
+    archive_path = tmp_path / "docs.zip"
+    write_zip(archive_path, {"a/doc.pdf": b"%PDF-1", "b/doc.PDF": b"%PDF-2", "notes.txt": b"x"})
+    target = tmp_path / "out"
+    target.mkdir()
+
+    paths = extract_pdfs(str(archive_path), str(target))
+    assert [open(path, "rb").read() for path in paths] == [b"%PDF-1", b"%PDF-2"]
+    assert sorted(p.name for p in target.iterdir()) == ["doc.PDF", "doc.pdf"]
+
+
+def test_extract_pdfs_rejects_total_over_limit(tmp_path):
+    # 高压缩比的内容：压缩包很小，解出后超过总量上限
+    archive_path = tmp_path / "bomb.zip"
+    write_zip(archive_path, {f"{i}.pdf": b"\0" * 1000 for i in range(5)})
+    target = tmp_path / "out"
+    target.mkdir()
+
+    with pytest.raises(ArchiveTooLarge):
+        extract_pdfs(str(archive_path), str(target), max_total=2500)
+    # 超限的文件已删除，之前解出的由调用方清理
+    assert sorted(p.name for p in target.iterdir()) == ["0.pdf", "1.pdf"]
+
+
+def test_extract_pdfs_rejects_entry_over_file_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(archives, "MAX_FILE_BYTES", 100)
+    archive_path = tmp_path / "docs.tar.gz"
+    data = b"\0" * 1000
+    with tarfile.open(archive_path, "w:gz") as archive:
+        info = tarfile.TarInfo("big.pdf")
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    target = tmp_path / "out"
+    target.mkdir()
+
+    with pytest.raises(ArchiveTooLarge):
+        extract_pdfs(str(archive_path), str(target), max_total=0)
+    assert list(target.iterdir()) == []
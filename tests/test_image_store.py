@@ -0,0 +1,42 @@
+import os
+import time
+
+from image_store import ImageWriter, prune_store
+
+JPEG = b"\xff\xd8\xff\xe0fake-jpeg"
+NAME = "a" * 64 + ".jpg"
+
+
+def test_original_images_are_deduplicated(tmp_path):
+    first = ImageWriter(str(tmp_path / "doc1" / "images"), store_dir=str(tmp_path / "store"))
+    second = ImageWriter(str(tmp_path / "doc2" / "images"), store_dir=str(tmp_path / "store"))
+    first.write(f"images/{NAME}", JPEG)
+    second.write(f"images/{NAME}", JPEG)
+
+    filename = first.mapping[NAME]
+    assert second.mapping[NAME] == filename
+    stat = os.stat(tmp_path / "doc1" / "images" / filename)
+    assert stat.st_ino == os.stat(tmp_path / "doc2" / "images" / filename).st_ino
+    assert stat.st_nlink == 3
+
+
+def test_write_recovers_when_store_file_is_pruned(tmp_path, monkeypatch):
+    writer = ImageWriter(str(tmp_path / "doc" / "images"), store_dir=str(tmp_path / "store"))
+    stored_path = writer._stored_path
+    stored_path(JPEG)
+
+    def pruned(data):
+        # 模拟 prune_store 在存在检查与 os.link 之间删除了共享文件
+        path = stored_path(data)
+        os.utime(path, (0, 0))
+        assert prune_store(1, str(tmp_path / "store")) == 1
+        monkeypatch.setattr(writer, "_stored_path", stored_path)
+        return path
+
+    monkeypatch.setattr(writer, "_stored_path", pruned)
+    writer.write(f"images/{NAME}", JPEG)
+
+    target = tmp_path / "doc" / "images" / writer.mapping[NAME]
+    assert target.read_bytes() == JPEG
+    assert os.stat(target).st_nlink == 2
+    assert os.stat(target).st_mtime > time.time() - 60
@@ -0,0 +1,79 @@
+from concurrent.futures import Future
+
+import pytest
+
+from job_queue import JobQueue, QueuedJob, QueueFull, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+def make_entry(name, priority=PRIORITY_BULK, group="default", job_id=None):
+    return QueuedJob({"name": name}, None, Future(), priority, group, job_id)
+
+
+def drain(queue):
+    names = []
+    while len(queue):
+        names.append(queue.get().job["name"])
+    return names
+
+
+def test_interactive_weight_interleaves_bulk():
+    queue = JobQueue(interactive_weight=2)
+    queue.put_many([make_entry(f"b{i}") for i in range(2)])
+    queue.put_many([make_entry(f"i{i}", PRIORITY_INTERACTIVE) for i in range(5)])
+    assert drain(queue) == ["i0", "i1", "b0", "i2", "i3", "b1", "i4"]
+
+
+def test_round_robin_across_groups():
+    queue = JobQueue()
+    queue.put_many([make_entry(f"a{i}", group="a") for i in range(3)])
+    queue.put_many([make_entry(f"b{i}", group="b") for i in range(2)])
+    queue.put(make_entry("c0", group="c"))
+    assert drain(queue) == ["a0", "b0", "c0", "a1", "b1", "a2"]
+
+
+def test_put_many_is_all_or_nothing():
+    queue = JobQueue(max_depth=2)
+    queue.put(make_entry("a"))
+    with pytest.raises(QueueFull):
+        queue.put_many([make_entry("b"), make_entry("c")])
+    assert len(queue) == 1
+
+
+def test_get_more_puts_rejected_entry_back_at_head():
+    queue = JobQueue()
+    queue.put_many([make_entry("a0", group="a"), make_entry("a1", group="a"), make_entry("b0", group="b")])
+    assert queue.get_more(lambda entry: False, 0) is None
+    assert len(queue) == 3
+    assert drain(queue) == ["a0", "b0", "a1"]
+
+
+def test_get_more_accepts_and_times_out():
+    queue = JobQueue()
+    assert queue.get_more(lambda entry: True, 0.01) is None
+    queue.put(make_entry("a"))
+    assert queue.get_more(lambda entry: True, 0.01).job["name"] == "a"
+    assert len(queue) == 0
+
+
+def test_get_more_rejection_keeps_interactive_streak():
+    queue = JobQueue(interactive_weight=1)
+    queue.put(make_entry("b0"))
+    queue.put_many([make_entry("i0", PRIORITY_INTERACTIVE), make_entry("i1", PRIORITY_INTERACTIVE)])
+    assert queue.get().job["name"] == "i0"
+    assert queue.get_more(lambda entry: False, 0) is None
+    assert drain(queue) == ["b0", "i1"]
+
+
+def test_cancel_removes_and_cancels_job_entries():
+    queue = JobQueue()
+    shards = [make_entry(f"s{i}", job_id="doc") for i in range(2)]
+    other = make_entry("other", group="b", job_id="other")
+    queue.put_many(shards)
+    queue.put(other)
+    assert queue.position("doc") == 1
+    assert queue.cancel("doc") == 2
+    assert all(entry.future.cancelled() for entry in shards)
+    assert queue.position("doc") is None
+    assert len(queue) == 1
+    assert queue.stats()["bulk"] == 1
+    assert drain(queue) == ["other"]
@@ -0,0 +1,69 @@
+from lru_index import LRUIndex, scan_entries
+
+
+def test_add_evicts_least_recently_used():
+    index = LRUIndex(max_bytes=100)
+    assert index.add("a", 40) == []
+    assert index.add("b", 40) == []
+    index.touch("a", lambda: 0)
+
+    # b 最久未用，先被淘汰
+    assert index.add("c", 40) == ["b"]
+    assert index.total_bytes == 80
+    assert len(index) == 2
+    assert index.stats()["evictions"] == 1
+
+
+def test_add_overwrite_replaces_size():
+    index = LRUIndex(max_bytes=100)
+    index.add("a", 30)
+    index.add("a", 50)
+    assert index.total_bytes == 50
+    index.remove("a")
+    index.remove("missing")
+    assert index.total_bytes == 0
+    assert len(index) == 0
+
+
+def test_single_oversized_entry_is_kept():
+    index = LRUIndex(max_bytes=10)
+    assert index.add("big", 50) == []
+    assert index.add("next", 5) == ["big"]
+    assert index.total_bytes == 5
+
+
+def test_touch_adds_unknown_entry():
+    index = LRUIndex(max_bytes=100)
+    index.touch("other", lambda: 25)
+    index.touch("other", lambda: 999)
+    assert index.total_bytes == 25
+
+
+def test_load_restores_mtime_order(tmp_path):
+    for mtime, key, size in ((3.0, "aa11", 10), (1.0, "bb22", 20), (2.0, "aa33", 30)):
+        prefix = tmp_path / key[:2]
+        prefix.mkdir(exist_ok=True)
+        (prefix / key).write_bytes(b"x" * size)
+    (tmp_path / "aa" / ".tmp").write_bytes(b"partial")
+    mtimes = {"aa11": 3.0, "bb22": 1.0, "aa33": 2.0}
+
+    found = scan_entries(str(tmp_path), lambda prefix_dir, name: (mtimes[name], name, 10))
+    assert sorted(key for _, key, _ in found) == ["aa11", "aa33", "bb22"]
+
+    index = LRUIndex(max_bytes=25)
+    index.load(found)
+    assert index.total_bytes == 30
+    # 按 mtime 恢复后，最早的 bb22 最先淘汰
+    assert index.add("cc44", 0) == ["bb22"]
+
+
+def test_stats_hit_rate():
+    index = LRUIndex(max_bytes=100)
+    assert index.stats()["hit_rate"] == 0.0
+    index.hit()
+    index.hit()
+    index.hit()
+    index.miss()
+    stats = index.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (3, 1, 0.75)
+    assert stats["max_bytes"] == 100
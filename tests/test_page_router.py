@@ -0,0 +1,20 @@
+from page_router import plan_routes
+
+
+def test_plan_routes_merges_consecutive_pages():
+    assert plan_routes([False, False, True, True, False]) == [((0, 1), False), ((2, 3), True), ((4, 4), False)]
+
+
+def test_plan_routes_absorbs_short_text_run_between_ocr_pages():
+    decisions = [True, False, True, False, False, False, True]
+    assert plan_routes(decisions, min_txt_run=3) == [((0, 2), True), ((3, 5), False), ((6, 6), True)]
+
+
+def test_plan_routes_keeps_short_text_run_at_edges():
+    assert plan_routes([False, True, True, False], min_txt_run=3) == [((0, 0), False), ((1, 2), True),
+                                                                       ((3, 3), False)]
+
+
+def test_plan_routes_single_mode():
+    assert plan_routes([True] * 3) == [((0, 2), True)]
+    assert plan_routes([]) == []
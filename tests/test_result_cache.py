@@ -0,0 +1,76 @@
+import os
+
+from result_cache import ResultCache
+
+
+def write_result(directory, name="doc"):
+    """写出一次解析结果（含一张图片），返回 pipeline.parse_pdf 形式的路径字典"""
+    (directory / "images").mkdir(parents=True)
+    (directory / "images" / "a.jpg").write_bytes(b"jpeg")
+    (directory / f"{name}.md").write_text("# doc\n![](images/a.jpg)\n", encoding="utf-8")
+    (directory / f"{name}_content_list.json").write_text("[]", encoding="utf-8")
+    (directory / f"{name}_middle.json").write_text('{"pdf_info": []}', encoding="utf-8")
+    return {
+        "markdown_path": str(directory / f"{name}.md"),
+        "content_list_path": str(directory / f"{name}_content_list.json"),
+        "middle_json_path": str(directory / f"{name}_middle.json"),
+    }
+
+
+def test_put_hardlinks_and_materialize(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    source = write_result(tmp_path / "first")
+    key = cache.make_key("sha", ocr=False)
+    cache.put(key, source)
+
+    entry_dir = tmp_path / "cache" / key[:2] / key
+    # 缓存条目与结果文件共用 inode，不额外占用空间
+    assert os.stat(entry_dir / "result.md").st_ino == os.stat(source["markdown_path"]).st_ino
+    assert os.stat(entry_dir / "images" / "a.jpg").st_ino == os.stat(tmp_path / "first" / "images" / "a.jpg").st_ino
+
+    output_dir = tmp_path / "second"
+    paths = cache.materialize(key, str(output_dir), "other")
+    assert paths["markdown_path"] == str(output_dir / "other.md")
+    with open(paths["content_list_path"], encoding="utf-8") as f:
+        assert f.read() == "[]"
+    assert (output_dir / "images" / "a.jpg").read_bytes() == b"jpeg"
+
+    assert cache.get(key)["middle_json"] == '{"pdf_info": []}'
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 0, 1)
+
+
+def test_missing_entry_is_miss(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("sha", ocr=True)
+    assert cache.get(key) is None
+    assert cache.materialize(key, str(tmp_path / "out"), "doc") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_entry_without_images_dir_is_miss(tmp_path):
+    cache = ResultCache(cache_dir=str(tmp_path / "cache"), max_bytes=1024 * 1024)
+    key = cache.make_key("sha", ocr=False)
+    cache.put(key, write_result(tmp_path / "first"))
+    (tmp_path / "cache" / key[:2] / key / "images" / "a.jpg").unlink()
+    os.rmdir(tmp_path / "cache" / key[:2] / key / "images")
+
+    assert cache.materialize(key, str(tmp_path / "out"), "doc") is None
+    assert not (tmp_path / "cache" / key[:2] / key).exists()
+
+
+def test_put_evicts_and_reload_keeps_entries(tmp_path):
+    first = write_result(tmp_path / "first")
+    size = sum(os.path.getsize(path) for path in first.values()) + 4
+    cache = ResultCache(cache_dir=str(tmp_path / "cache"), max_bytes=size)
+    old_key = cache.make_key("old", ocr=False)
+    new_key = cache.make_key("new", ocr=False)
+    cache.put(old_key, first)
+    cache.put(new_key, write_result(tmp_path / "second"))
+
+    assert cache.get(old_key) is None
+    assert cache.stats()["evictions"] == 1
+
+    reloaded = ResultCache(cache_dir=str(tmp_path / "cache"), max_bytes=size)
+    assert reloaded.stats()["entries"] == 1
+    assert reloaded.stats()["size_bytes"] == size
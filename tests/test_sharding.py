@@ -0,0 +1,52 @@
+import json
+
+from sharding import merge_results, plan_shards
+
+
+def write_shard(directory, start, pages):
+    """写出一个分片的解析结果，页码从 0 开始（与工作进程输出一致）"""
+    directory.mkdir(parents=True)
+    markdown = directory / "doc.md"
+    markdown.write_text(f"shard {start}\n", encoding="utf-8")
+    content_list = directory / "doc_content_list.json"
+    content_list.write_text(json.dumps([{"type": "text", "text": f"p{i}", "page_idx": i} for i in range(pages)]))
+    middle = directory / "doc_middle.json"
+    middle.write_text(json.dumps({"_backend": "pipeline", "pdf_info": [{"page_idx": i} for i in range(pages)]}))
+    return {
+        "markdown_path": str(markdown),
+        "content_list_path": str(content_list),
+        "middle_json_path": str(middle),
+    }
+
+
+def test_plan_shards_covers_all_pages():
+    assert plan_shards(120, shard_size=50) == [(0, 49), (50, 99), (100, 119)]
+
+
+def test_merge_results_offsets_page_idx(tmp_path):
+    second = write_shard(tmp_path / "shards" / "1", 3, 2)
+    first = write_shard(tmp_path / "shards" / "0", 0, 3)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    # 分片完成顺序与页码顺序无关
+    paths = merge_results([((3, 4), second), ((0, 2), first)], str(output_dir), "doc")
+
+    with open(paths["content_list_path"], encoding="utf-8") as f:
+        assert [block["page_idx"] for block in json.load(f)] == [0, 1, 2, 3, 4]
+    with open(paths["middle_json_path"], encoding="utf-8") as f:
+        middle = json.load(f)
+    assert [page["page_idx"] for page in middle["pdf_info"]] == [0, 1, 2, 3, 4]
+    assert middle["_backend"] == "pipeline"
+    with open(paths["markdown_path"], encoding="utf-8") as f:
+        assert f.read() == "shard 0\n\nshard 3"
+
+
+def test_merge_results_only_requested_outputs(tmp_path):
+    first = write_shard(tmp_path / "0", 0, 1)
+    second = write_shard(tmp_path / "1", 1, 1)
+    second["middle_json_path"] = None
+    paths = merge_results([((0, 0), first), ((1, 1), second)], str(tmp_path), "doc",
+                          outputs=["markdown", "content_list", "middle_json"])
+    assert paths["middle_json_path"] is None
+    assert paths["content_list_path"] is not None
@@ -0,0 +1,63 @@
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException
+
+from streaming import _iter_envelope, json_envelope, parse_range
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-200", (800, 999)),
+    ("bytes=900-5000", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", [None, "", "items=0-1", "bytes=0-1,5-6", "bytes=a-b", "bytes=-0"])
+def test_parse_range_unsupported_returns_full_file(header):
+    assert parse_range(header, 1000) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-100"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(HTTPException) as excinfo:
+        parse_range(header, 1000)
+    assert excinfo.value.status_code == 416
+    assert excinfo.value.headers["Content-Range"] == "bytes */1000"
+
+
+def test_json_envelope_embeds_raw_json():
+    body = json_envelope({"status": "completed", "markdown": "# 标题"},
+                         {"content_list": b'[{"type": "text"}]', "middle_json": '{"pdf_info": []}'})
+    assert json.loads(body) == {
+        "status": "completed",
+        "markdown": "# 标题",
+        "content_list": [{"type": "text"}],
+        "middle_json": {"pdf_info": []},
+    }
+
+
+def test_json_envelope_empty_raw_json_keeps_types():
+    body = json_envelope({}, {"content_list": b"", "middle_json": b"\n", "other": ""})
+    assert json.loads(body) == {"content_list": [], "middle_json": {}, "other": None}
+
+
+def test_iter_envelope_streams_files(tmp_path):
+    content_list = tmp_path / "content_list.json"
+    content_list.write_bytes(b'[{"page_idx": 0}]')
+    middle = tmp_path / "middle.json"
+    middle.write_bytes(b"")
+
+    body = b"".join(_iter_envelope({"markdown": "x"}, {},
+                                   {"content_list": str(content_list), "middle_json": str(middle)}))
+    assert json.loads(body) == {"markdown": "x", "content_list": [{"page_idx": 0}], "middle_json": {}}
+
+    body = b"".join(_iter_envelope({}, {}, {"content_list": str(middle)}))
+    assert json.loads(body) == {"content_list": []}
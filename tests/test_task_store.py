@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from task_store import MemoryTaskStore, SQLiteTaskStore, decode_cursor, encode_cursor
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryTaskStore()
+    return SQLiteTaskStore(str(tmp_path / "tasks.db"))
+
+
+def populate(store, count=5):
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    for i in range(count):
+        status = "completed" if i % 2 == 0 else "failed"
+        store.create(f"task-{i}", status=status, filename=f"doc{i}.pdf", created_at=base + timedelta(minutes=i))
+    return base
+
+
+def test_list_page_follows_cursor_newest_first(store):
+    populate(store)
+    seen = []
+    cursor = None
+    while True:
+        tasks, cursor = store.list_page(cursor=cursor, limit=2)
+        seen.extend(task.task_id for task in tasks)
+        if cursor is None:
+            break
+    assert seen == [f"task-{i}" for i in range(4, -1, -1)]
+
+
+def test_list_page_last_page_has_no_cursor(store):
+    populate(store, 4)
+    tasks, cursor = store.list_page(limit=4)
+    assert len(tasks) == 4
+    assert cursor is None
+
+
+def test_list_page_filters(store):
+    base = populate(store)
+    tasks, _ = store.list_page(statuses=["failed"])
+    assert [task.task_id for task in tasks] == ["task-3", "task-1"]
+    tasks, _ = store.list_page(created_after=base + timedelta(minutes=2), created_before=base + timedelta(minutes=4))
+    assert [task.task_id for task in tasks] == ["task-3", "task-2"]
+    tasks, _ = store.list_page(filename="doc4")
+    assert [task.task_id for task in tasks] == ["task-4"]
+
+
+def test_cursor_round_trip_and_invalid_cursor(store):
+    populate(store, 1)
+    task = store.get("task-0")
+    assert decode_cursor(encode_cursor(task)) == (task.created_at, "task-0")
+    with pytest.raises(ValueError):
+        store.list_page(cursor="not-a-cursor")
+
+
+def test_list_page_accepts_timezone_aware_bounds(store):
+    base = populate(store)
+    after = (base + timedelta(minutes=2)).astimezone(timezone.utc)
+    before = (base + timedelta(minutes=4)).astimezone(timezone(timedelta(hours=9)))
+    tasks, _ = store.list_page(created_after=after, created_before=before)
+    assert [task.task_id for task in tasks] == ["task-3", "task-2"]
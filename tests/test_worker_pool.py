@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+pytest.importorskip("prometheus_client")
+
+from worker_pool import JobAborted, WorkerPool  # noqa: E402
+
+
+@pytest.fixture
+def pool():
+    # 不启动槽位线程与工作进程，测试中手动驱动槽位
+    pool = WorkerPool(size=1, batch_max_docs=1, warmup=False)
+    yield pool
+    pool._jobs.close()
+
+
+def fail_execute(*args, **kwargs):
+    raise AssertionError("aborted job must not be executed")
+
+
+def test_abort_between_get_and_execute(pool):
+    slot = pool._slots[0]
+    slot._execute = fail_execute
+    future = pool.submit({"file_path": "doc.pdf"}, job_id="task-1")
+
+    entry = pool._jobs.get(on_take=slot._claim)
+    # 已出队、尚未执行：既不在队列中，也必须能被找到并中止
+    assert pool.is_active("task-1")
+    assert pool.abort("task-1")
+
+    slot._handle(entry)
+    assert isinstance(future.exception(timeout=0), JobAborted)
+    assert not pool.is_active("task-1")
+
+
+def test_abort_from_start_callback_skips_execution(pool):
+    slot = pool._slots[0]
+    slot._execute = fail_execute
+    aborted = []
+    future = pool.submit({"file_path": "doc.pdf"}, job_id="task-2",
+                         on_start=lambda: aborted.append(pool.abort("task-2")))
+
+    slot._handle(pool._jobs.get(on_take=slot._claim))
+    assert aborted == [True]
+    assert isinstance(future.exception(timeout=0), JobAborted)
+
+
+def test_batch_rerun_uses_remaining_budget(pool):
+    slot = pool._slots[0]
+    slot._ensure_process = lambda: None
+    budgets = []
+
+    def execute(job, timeout, on_progress=None, job_ids=None):
+        if "documents" in job:
+            time.sleep(0.05)
+            raise TimeoutError("batch timeout")
+        budgets.append((job["name"], timeout))
+        return {"markdown_path": job["name"]}
+
+    slot._execute = execute
+    futures = pool.submit_many([{"name": "a"}, {"name": "b"}], timeouts=[0.01, 10])
+    entries = [pool._jobs.get(on_take=slot._claim) for _ in futures]
+    for entry in entries:
+        entry.future.set_running_or_notify_cancel()
+
+    slot._execute_batch(entries)
+    # a 的预算在合并推理中已经用完，不再重跑；b 只得到剩余的预算
+    assert isinstance(futures[0].exception(timeout=0), TimeoutError)
+    assert futures[1].result(timeout=0) == {"markdown_path": "b"}
+    assert [name for name, _ in budgets] == ["b"]
+    assert budgets[0][1] < 10